@@ -1,14 +1,46 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import math
+from itertools import islice
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
 from datetime import datetime, timezone
+from googleapiclient.errors import HttpError
 
-from auth import get_google_credentials, initiate_oauth_flow, handle_oauth_callback
-from google_calendar import create_calendar_event, get_user_calendars
-from notes import create_keep_note
-from db import get_user_tokens, save_user_tokens, delete_user_tokens, init_db
+from auth import get_google_credentials, initiate_oauth_flow, handle_oauth_callback, refresh_counters
+from google_calendar import (
+    create_calendar_events_batch, get_user_calendars,
+    iter_upcoming_events, iter_user_calendars, update_calendar_event,
+)
+from notes import batch_note_operations, iter_keep_notes, note_backend_registry, update_keep_note
+from calendar_sync import event_response, is_stale, mirror_events, needs_rebuild, synced_at, sync_counters as calendar_sync_counters, sync_user_calendar
+from db import (
+    get_async_db_connection, get_calendar_sync_state_async, get_job_async, get_job_counts_async,
+    get_mirrored_event_async, get_mirrored_note_async, get_notes_sync_state_async,
+    get_recent_events_async, get_recent_notes_async, get_upcoming_events_async,
+    get_user_notes_async, get_user_tokens_async, mark_notes_active_async, release_idempotency_key_async,
+    reserve_idempotency_key_async, search_user_notes_async, store_idempotent_response_async,
+    save_user_tokens, delete_user_tokens, init_db,
+)
+from db_pool import close_async_pool, close_pool, pool_stats
+from credentials_cache import credentials_cache
+from executor import ExecutorSaturated, executor
+from google_services import preload as preload_google_services
+from idempotency import (
+    IDEMPOTENCY_PENDING_TIMEOUT, IDEMPOTENCY_TTL, MAX_KEY_LENGTH, purge_expired_keys, request_fingerprint,
+)
+from job_handlers import new_event_id
+from job_queue import job_worker, purge_old_jobs
+from partitions import PARTITION_MAINTENANCE_INTERVAL, maintain_partitions
+from rate_limiter import is_rate_limit_error, rate_limiter
+from scheduler import scheduler
+from write_behind import write_behind
+from telegram_webhook import router as telegram_webhook_router, start_webhook, stop_webhook
+from notes_sync import NOTES_SYNC_INTERVAL, mirror_notes, note_response, search_terms, sync_active_users, sync_counters as notes_sync_counters, sync_user_notes
+from token_refresher import REFRESH_INTERVAL, refresh_expiring_tokens
 
 app = FastAPI(title="Telegram Bot Backend")
 
@@ -21,10 +53,186 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(telegram_webhook_router)
+
 # ---------------- Startup ----------------
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    # Blocking (migrations, file I/O); keep the event loop free meanwhile
+    await asyncio.to_thread(init_db)
+    await asyncio.to_thread(preload_google_services)
+    scheduler.add('token-refresh', REFRESH_INTERVAL, refresh_expiring_tokens)
+    scheduler.add('notes-sync', NOTES_SYNC_INTERVAL, sync_active_users)
+    scheduler.add('job-purge', 3600, purge_old_jobs)
+    scheduler.add('idempotency-purge', 3600, purge_expired_keys)
+    scheduler.add('partition-maintenance', PARTITION_MAINTENANCE_INTERVAL, maintain_partitions)
+    scheduler.start()
+    write_behind.start()
+    job_worker.start()
+    await start_webhook()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_webhook()
+    await scheduler.stop()
+    await job_worker.stop()
+    await asyncio.to_thread(write_behind.close)
+    executor.shutdown()
+    await close_async_pool()
+    close_pool()
+
+# ---------------- Blocking calls ----------------
+# Retry-After sent when Google itself reported the rate limit
+GOOGLE_RETRY_AFTER = 10
+# Retry-After sent while a request with the same Idempotency-Key is running
+INLINE_RETRY_AFTER = 5
+
+async def run_blocking(fn, *args, user_id: Optional[int] = None, **kwargs):
+    """
+    Run a blocking call on the executor
+
+    503 + Retry-After when the executor is saturated, 429 + Retry-After when
+    Google quota is exhausted even after backing off.
+    """
+    try:
+        return await executor.run(fn, *args, user_id=user_id, **kwargs)
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, please retry",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        if not is_rate_limit_error(e):
+            raise
+        retry_after = getattr(e, 'retry_after', None) or GOOGLE_RETRY_AFTER
+        raise HTTPException(
+            status_code=429,
+            detail="Google API rate limit reached, please retry",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+_background_tasks = {}
+
+def run_in_background(key: str, fn, *args, user_id: Optional[int] = None):
+    """Fire-and-forget a blocking call on the executor, at most one per key"""
+    if key in _background_tasks:
+        return
+
+    async def runner():
+        try:
+            await executor.run(fn, *args, user_id=user_id)
+        except Exception as e:
+            print(f"Background task {key} failed: {e}")
+        finally:
+            _background_tasks.pop(key, None)
+
+    _background_tasks[key] = asyncio.create_task(runner())
+
+# ---------------- Streaming ----------------
+NDJSON_CHUNK = 100
+
+def _take(iterator, count: int) -> list:
+    return list(islice(iterator, count))
+
+def ndjson_response(iterator, user_id: int, limit: Optional[int] = None) -> StreamingResponse:
+    """
+    Stream a blocking iterator (e.g. iter_upcoming_events) as NDJSON
+
+    Items are pulled on the executor a chunk at a time, so pages are fetched
+    from Google only as fast as the client reads. An error after the first
+    byte can no longer change the status code; it is sent as a final
+    {"error": ...} line instead.
+    """
+    if limit is not None:
+        iterator = islice(iterator, limit)
+
+    async def body():
+        try:
+            while True:
+                items = await executor.run(_take, iterator, NDJSON_CHUNK, user_id=user_id)
+                if not items:
+                    break
+                yield ''.join(json.dumps(item, ensure_ascii=False, default=str) + '\n' for item in items)
+        except Exception as e:
+            print(f"Error streaming results for {user_id}: {e}")
+            yield json.dumps({"error": str(e)}) + '\n'
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+async def require_credentials(user_id: int):
+    creds = await run_blocking(get_google_credentials, user_id, user_id=user_id)
+    if not creds:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+    return creds
+
+def check_idempotency_key(idempotency_key: str):
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+
+async def reserve_inline(endpoint: str, data: BaseModel, idempotency_key: str) -> Optional[JSONResponse]:
+    """
+    Reserve an Idempotency-Key for work done inside the request
+
+    The reservation commits before the work starts, so a retry that arrives
+    meanwhile gets 409 + Retry-After instead of doing the work again; a
+    reservation older than IDEMPOTENCY_PENDING_TIMEOUT is taken over. Returns
+    the stored response to replay, or None once the key is ours; follow up
+    with finish_inline.
+    """
+    check_idempotency_key(idempotency_key)
+    fingerprint = request_fingerprint(data.model_dump())
+    async with get_async_db_connection() as conn:
+        stored = await reserve_idempotency_key_async(
+            conn, data.user_id, endpoint, idempotency_key, fingerprint, IDEMPOTENCY_TTL,
+            pending_timeout=IDEMPOTENCY_PENDING_TIMEOUT
+        )
+    if stored is None:
+        return None
+    if stored['request_hash'] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was used for a different request")
+    if stored['response'] is None:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still in progress",
+            headers={"Retry-After": str(INLINE_RETRY_AFTER)}
+        )
+    return JSONResponse(stored['response'], headers={"Idempotent-Replayed": "true"})
+
+async def finish_inline(endpoint: str, user_id: int, idempotency_key: str, response: Optional[Dict]):
+    """Store the response for the reserved key, or release it (response None) so a retry can redo the work"""
+    async with get_async_db_connection() as conn:
+        if response is None:
+            await release_idempotency_key_async(conn, user_id, endpoint, idempotency_key)
+        else:
+            await store_idempotent_response_async(conn, user_id, endpoint, idempotency_key, response)
+
+async def enqueue_create(kind: str, data: BaseModel, payload: Dict, idempotency_key: Optional[str]):
+    """
+    Queue a create job, at most once per Idempotency-Key
+
+    The key is reserved in the same transaction that inserts the job, so a
+    retry either finds the stored response or (if it raced the original)
+    waits for it to commit. Reusing a key for a different request is a 422.
+    """
+    if not idempotency_key:
+        return {"status": "queued", "job_id": await job_worker.enqueue(data.user_id, kind, payload)}
+    check_idempotency_key(idempotency_key)
+
+    fingerprint = request_fingerprint(data.model_dump())
+    async with get_async_db_connection() as conn:
+        stored = await reserve_idempotency_key_async(
+            conn, data.user_id, kind, idempotency_key, fingerprint, IDEMPOTENCY_TTL
+        )
+        if stored is not None:
+            if stored['request_hash'] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was used for a different request")
+            return JSONResponse(stored['response'], status_code=202, headers={"Idempotent-Replayed": "true"})
+
+        response = {"status": "queued", "job_id": await job_worker.enqueue(data.user_id, kind, payload, conn=conn)}
+        await store_idempotent_response_async(conn, data.user_id, kind, idempotency_key, response)
+    job_worker.notify()
+    return response
 
 # ---------------- Models ----------------
 class OAuthInitiate(BaseModel):
@@ -40,6 +248,38 @@ class CalendarEventCreate(BaseModel):
     datetime: str  # ISO format
     description: Optional[str] = ""
 
+class CalendarBatchItem(BaseModel):
+    title: str
+    datetime: str  # ISO format
+    description: Optional[str] = ""
+
+class CalendarBatchCreate(BaseModel):
+    user_id: int
+    events: List[CalendarBatchItem] = Field(..., min_length=1, max_length=200)
+
+class CalendarEventUpdate(BaseModel):
+    user_id: int
+    title: Optional[str] = None
+    datetime: Optional[str] = None  # ISO format
+    description: Optional[str] = None
+    etag: Optional[str] = None  # defaults to the mirrored etag
+
+class NoteUpdate(BaseModel):
+    user_id: int
+    title: Optional[str] = None
+    content: Optional[str] = None
+    etag: Optional[str] = None  # defaults to the mirrored etag
+
+class NoteOperation(BaseModel):
+    op: Literal['create', 'update', 'complete', 'delete']
+    note_id: Optional[str] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+
+class NoteBatch(BaseModel):
+    user_id: int
+    operations: List[NoteOperation] = Field(..., min_length=1, max_length=200)
+
 class NoteCreate(BaseModel):
     user_id: int
     title: str
@@ -76,8 +316,10 @@ async def initiate_auth(data: OAuthInitiate):
 async def auth_callback(data: OAuthCallback):
     """Handle OAuth callback (POST)"""
     try:
-        result = handle_oauth_callback(data.code, data.user_id)
+        result = await run_blocking(handle_oauth_callback, data.code, data.user_id, user_id=data.user_id)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -87,7 +329,7 @@ async def oauth_callback(code: str, state: str):
     """Handle OAuth callback (GET)"""
     try:
         user_id = int(state)
-        result = handle_oauth_callback(code, user_id)
+        result = await run_blocking(handle_oauth_callback, code, user_id, user_id=user_id)
 
         # Pretty success HTML
         return HTMLResponse(content=f"""
@@ -134,6 +376,8 @@ async def oauth_callback(code: str, state: str):
             </body>
         </html>
         """)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -141,7 +385,11 @@ async def oauth_callback(code: str, state: str):
 @app.get("/api/auth/status/{user_id}")
 async def auth_status(user_id: int):
     """Check if user is authenticated"""
-    tokens = get_user_tokens(user_id)
+    cached = credentials_cache.get_entry(user_id)
+    if cached:
+        return {"authenticated": True, "email": cached[1] or 'N/A'}
+
+    tokens = await get_user_tokens_async(user_id)
 
     if not tokens:
         return {"authenticated": False}
@@ -169,73 +417,428 @@ async def auth_status(user_id: int):
 async def revoke_auth(user_id: int):
     """Revoke user authentication"""
     try:
-        delete_user_tokens(user_id)
+        await run_blocking(delete_user_tokens, user_id, user_id=user_id)
         return {"status": "revoked"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------------- CALENDAR ----------------
-@app.post("/api/calendar/create")
-async def create_event(data: CalendarEventCreate):
-    """Create a Google Calendar event"""
+@app.post("/api/calendar/create", status_code=202)
+async def create_event(
+    data: CalendarEventCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Queue creation of a Google Calendar event; poll /api/jobs/{job_id} for the result"""
+    try:
+        # Same check the synchronous path made: expired, revoked or
+        # under-scoped tokens are a 401 now, not a dead job later
+        await require_credentials(data.user_id)
+
+        try:
+            datetime.fromisoformat(data.datetime)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        return await enqueue_create('calendar.create', data, {
+            'title': data.title,
+            'datetime': data.datetime,
+            'description': data.description,
+            # Fixed up front so a retried job can't create a second event
+            'event_id': new_event_id(),
+        }, idempotency_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/calendar/batch")
+async def create_events_batch(
+    data: CalendarBatchCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Create several Google Calendar events with batched API calls
+
+    With an Idempotency-Key, a retry replays the first response instead of
+    creating the events again (409 while the first is still running).
+    """
+    try:
+        creds = await require_credentials(data.user_id)
+        if idempotency_key:
+            replay = await reserve_inline('calendar.batch', data, idempotency_key)
+            if replay is not None:
+                return replay
+
+        response = None
+        try:
+            response = await create_batch_events(creds, data)
+        finally:
+            if idempotency_key:
+                await finish_inline('calendar.batch', data.user_id, idempotency_key, response)
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def create_batch_events(creds, data: CalendarBatchCreate) -> Dict:
+    results = [None] * len(data.events)
+    valid, positions = [], []
+    for index, item in enumerate(data.events):
+        try:
+            start_time = datetime.fromisoformat(item.datetime)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "error": str(e)}
+            continue
+        valid.append({'title': item.title, 'start_time': start_time, 'description': item.description})
+        positions.append(index)
+
+    if valid:
+        created = await run_blocking(create_calendar_events_batch, creds, valid, user_id=data.user_id)
+        write_behind.record_events(
+            data.user_id,
+            [result['event'] for result in created if result['status'] == 'created']
+        )
+        for index, result in zip(positions, created):
+            if result['status'] == 'created':
+                results[index] = {
+                    "index": index,
+                    "status": "created",
+                    "event_id": result['event'].get('id'),
+                    "link": result['event'].get('htmlLink')
+                }
+            else:
+                results[index] = {"index": index, "status": "error", "error": result['error']}
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return {
+        "status": "completed",
+        "created": len(results) - failed,
+        "failed": failed,
+        "results": results
+    }
+
+
+def is_precondition_failed(error: Exception) -> bool:
+    return isinstance(error, HttpError) and error.resp.status == 412
+
+
+@app.patch("/api/calendar/events/{event_id}")
+async def update_event(event_id: str, data: CalendarEventUpdate):
+    """Partially update a Google Calendar event (409 if it changed meanwhile)"""
     try:
-        creds = get_google_credentials(data.user_id)
+        start_time = None
+        if data.datetime:
+            try:
+                start_time = datetime.fromisoformat(data.datetime)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+        creds = await run_blocking(get_google_credentials, data.user_id, user_id=data.user_id)
         if not creds:
             raise HTTPException(status_code=401, detail="User not authenticated")
 
-        event_datetime = datetime.fromisoformat(data.datetime)
+        mirrored = await get_mirrored_event_async(data.user_id, event_id)
+        duration = None
+        if mirrored and mirrored['start_time'] and mirrored['end_time'] and not mirrored['all_day']:
+            duration = mirrored['end_time'] - mirrored['start_time']
 
-        event = create_calendar_event(
+        event = await run_blocking(
+            update_calendar_event,
             creds,
+            event_id,
             title=data.title,
-            start_time=event_datetime,
-            description=data.description
+            start_time=start_time,
+            description=data.description,
+            duration=duration,
+            etag=data.etag or (mirrored['etag'] if mirrored else None),
+            user_id=data.user_id
         )
+        await run_blocking(mirror_events, data.user_id, [event], user_id=data.user_id)
 
         return {
-            "status": "created",
+            "status": "updated",
             "event_id": event.get('id'),
+            "etag": event.get('etag'),
             "link": event.get('htmlLink')
         }
+    except HTTPException:
+        raise
     except Exception as e:
+        if is_precondition_failed(e):
+            run_in_background(f"calendar-sync:{data.user_id}", sync_user_calendar, data.user_id, user_id=data.user_id)
+            raise HTTPException(status_code=409, detail="Event was changed elsewhere; reload and retry")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/calendar/upcoming/{user_id}")
+async def upcoming_events(user_id: int, limit: int = Query(10, ge=1, le=250)):
+    """Upcoming events served from the local calendar mirror"""
+    try:
+        state = await get_calendar_sync_state_async(user_id)
+        if needs_rebuild(state):
+            # No mirror yet, or retention expired part of it: build it before answering
+            result = await run_blocking(sync_user_calendar, user_id, user_id=user_id)
+            if result['status'] == 'unauthenticated':
+                raise HTTPException(status_code=401, detail="User not authenticated")
+            state = await get_calendar_sync_state_async(user_id)
+        elif is_stale(state):
+            run_in_background(f"calendar-sync:{user_id}", sync_user_calendar, user_id, user_id=user_id)
+
+        rows = await get_upcoming_events_async(user_id, datetime.utcnow(), limit)
+        return {
+            "events": [event_response(row) for row in rows],
+            "synced_at": synced_at(state)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/calendar/list/{user_id}/stream")
+async def stream_calendars(user_id: int):
+    """Stream the user's calendars as NDJSON, one per line"""
+    creds = await require_credentials(user_id)
+    return ndjson_response(iter_user_calendars(creds), user_id)
+
+
+@app.get("/api/calendar/events/{user_id}/stream")
+async def stream_upcoming_events(user_id: int, limit: Optional[int] = Query(None, ge=1)):
+    """Stream upcoming events live from Google as NDJSON, in start order"""
+    creds = await require_credentials(user_id)
+    return ndjson_response(iter_upcoming_events(creds), user_id, limit)
+
+
 @app.get("/api/calendar/list/{user_id}")
 async def list_calendars(user_id: int):
     """List user's calendars"""
     try:
-        creds = get_google_credentials(user_id)
+        creds = await run_blocking(get_google_credentials, user_id, user_id=user_id)
         if not creds:
             raise HTTPException(status_code=401, detail="User not authenticated")
 
-        calendars = get_user_calendars(creds)
+        calendars = await run_blocking(get_user_calendars, creds, user_id=user_id)
         return {"calendars": calendars}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ---------------- NOTES ----------------
-@app.post("/api/notes/create")
-async def create_note(data: NoteCreate):
-    """Create Google Keep note"""
+@app.post("/api/notes/create", status_code=202)
+async def create_note(
+    data: NoteCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Queue creation of a note; poll /api/jobs/{job_id} for the result"""
     try:
-        creds = get_google_credentials(data.user_id)
+        # Same check the synchronous path made: expired, revoked or
+        # under-scoped tokens are a 401 now, not a dead job later
+        await require_credentials(data.user_id)
+
+        await mark_notes_active_async(data.user_id)
+        return await enqueue_create('notes.create', data, {
+            'title': data.title,
+            'content': data.content,
+        }, idempotency_key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.patch("/api/notes/{note_id}")
+async def update_note(note_id: str, data: NoteUpdate):
+    """Partially update a note (409 if it changed meanwhile)"""
+    try:
+        creds = await run_blocking(get_google_credentials, data.user_id, user_id=data.user_id)
         if not creds:
             raise HTTPException(status_code=401, detail="User not authenticated")
 
-        note = create_keep_note(
+        etag = data.etag
+        if etag is None:
+            mirrored = await get_mirrored_note_async(data.user_id, note_id)
+            etag = mirrored['etag'] if mirrored else None
+
+        note = await run_blocking(
+            update_keep_note,
             creds,
+            note_id,
             title=data.title,
-            content=data.content
+            content=data.content,
+            etag=etag,
+            user_id=data.user_id
         )
+        await run_blocking(mirror_notes, data.user_id, [note], user_id=data.user_id)
 
         return {
-            "status": "created",
-            "note_id": note.get('name')
+            "status": "updated",
+            "note_id": note['id'],
+            "etag": note.get('etag')
         }
+    except HTTPException:
+        raise
     except Exception as e:
+        if is_precondition_failed(e):
+            run_in_background(f"notes-sync:{data.user_id}", sync_user_notes, data.user_id, user_id=data.user_id)
+            raise HTTPException(status_code=409, detail="Note was changed elsewhere; reload and retry")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/api/notes/batch")
+async def notes_batch(data: NoteBatch):
+    """Create, update, complete or delete many notes in batched API calls"""
+    try:
+        creds = await run_blocking(get_google_credentials, data.user_id, user_id=data.user_id)
+        if not creds:
+            raise HTTPException(status_code=401, detail="User not authenticated")
+
+        await mark_notes_active_async(data.user_id)
+        results = await run_blocking(
+            batch_note_operations,
+            creds,
+            [operation.model_dump() for operation in data.operations],
+            user_id=data.user_id
+        )
+
+        succeeded = [result for result in results if result['status'] == 'ok']
+        write_behind.record_notes(data.user_id, [result['note'] for result in succeeded if result['op'] == 'create'])
+        await run_blocking(
+            mirror_notes,
+            data.user_id,
+            [result['note'] for result in succeeded if result['op'] in ('update', 'complete')],
+            [result['note_id'] for result in succeeded if result['op'] == 'delete'],
+            user_id=data.user_id
+        )
+
+        failed = len(results) - len(succeeded)
+        return {
+            "status": "completed",
+            "succeeded": len(succeeded),
+            "failed": failed,
+            "results": [{"index": index, **result} for index, result in enumerate(results)]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/notes/list/{user_id}/stream")
+async def stream_notes(user_id: int, limit: Optional[int] = Query(None, ge=1)):
+    """Stream notes live from Google as NDJSON, one per line"""
+    creds = await require_credentials(user_id)
+    return ndjson_response(iter_keep_notes(creds), user_id, limit)
+
+
+async def ensure_notes_mirror(user_id: int):
+    """Mark user_id active and build their notes mirror on first use"""
+    await mark_notes_active_async(user_id)
+    state = await get_notes_sync_state_async(user_id)
+    if state is None or state['full_synced_at'] is None:
+        result = await run_blocking(sync_user_notes, user_id, user_id=user_id)
+        if result['status'] == 'unauthenticated':
+            raise HTTPException(status_code=401, detail="User not authenticated")
+
+
+@app.get("/api/notes/list/{user_id}")
+async def list_notes(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """List notes from the local mirror, most recently updated first"""
+    try:
+        await ensure_notes_mirror(user_id)
+        rows = await get_user_notes_async(user_id, limit, offset)
+        return {"notes": [note_response(row) for row in rows]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/notes/search/{user_id}")
+async def search_notes(
+    user_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Search note titles and contents in the local mirror"""
+    try:
+        words = search_terms(q)
+        if not words:
+            return {"notes": []}
+        await ensure_notes_mirror(user_id)
+        rows = await search_user_notes_async(user_id, words, limit)
+        return {"notes": [note_response(row) for row in rows]}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ---------------- HISTORY ----------------
+@app.get("/api/history/{user_id}")
+async def history(user_id: int, limit: int = Query(20, ge=1, le=100)):
+    """Recently created or mirrored events and notes, from the local tables only"""
+    try:
+        events, notes = await asyncio.gather(
+            get_recent_events_async(user_id, limit),
+            get_recent_notes_async(user_id, limit)
+        )
+        return {
+            "events": [event_response(row) for row in events],
+            "notes": [note_response(row) for row in notes]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ---------------- JOBS ----------------
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: int, user_id: int):
+    """Status of a queued create; result holds the old synchronous response once succeeded"""
+    try:
+        job = await get_job_async(job_id)
+        if job is None or job['user_id'] != user_id:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        return {
+            "job_id": job['id'],
+            "kind": job['kind'],
+            "status": job['status'],
+            "attempts": job['attempts'],
+            "result": job['result'],
+            "error": job['last_error'] if job['status'] == 'dead' else None,
+            "error_code": (job['result'] or {}).get('error_code') if job['status'] == 'dead' else None
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ---------------- METRICS ----------------
+@app.get("/api/metrics")
+async def metrics():
+    """Runtime counters for monitoring"""
+    return {
+        "jobs": {**job_worker.stats(), "by_status": await get_job_counts_async()},
+        "db_pool": pool_stats(),
+        "executor": executor.stats(),
+        "credentials_cache": credentials_cache.stats(),
+        "token_refresh": refresh_counters,
+        "calendar_sync": calendar_sync_counters,
+        "notes_sync": notes_sync_counters,
+        "note_backends": note_backend_registry.stats(),
+        "google_rate_limiter": rate_limiter.stats(),
+        "write_behind": write_behind.stats(),
+        "background_tasks": len(_background_tasks),
+        "scheduler": scheduler.stats()
+    }
+
 # ---------------- INFO PAGES ----------------
 @app.get("/privacy-policy", response_class=HTMLResponse)
 async def privacy_policy():
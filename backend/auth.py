@@ -1,8 +1,14 @@
 import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from google.auth.transport.requests import Request
-from db import get_user_tokens, save_user_tokens
+from credentials_cache import credentials_cache
+from db import get_user_tokens, save_user_tokens, user_refresh_lock
+from google_services import get_service
 
 # OAuth 2.0 scopes
 SCOPES = [
@@ -72,8 +78,7 @@ def handle_oauth_callback(code: str, user_id: int) -> dict:
     }
 
     # Get user email & profile info
-    from googleapiclient.discovery import build
-    service = build('oauth2', 'v2', credentials=credentials)
+    service = get_service('oauth2', 'v2', credentials)
     user_info = service.userinfo().get().execute()
     tokens['email'] = user_info.get('email')
 
@@ -85,10 +90,122 @@ def handle_oauth_callback(code: str, user_id: int) -> dict:
     }
 
 
+def parse_expiry(value: Optional[str]) -> Optional[datetime]:
+    """Parse a stored expiry into the naive-UTC datetime google-auth expects"""
+    if not value:
+        return None
+    try:
+        expiry = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+    return expiry
+
+
+class _KeyedLocks:
+    """One threading.Lock per key, dropped once nobody holds or waits for it"""
+
+    def __init__(self):
+        self._locks: Dict[int, list] = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: int):
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+_refresh_locks = _KeyedLocks()
+
+# How often access tokens get refreshed, and where. With the background
+# refresher running, 'request_path' should stay close to zero.
+refresh_counters = {'request_path': 0, 'background': 0, 'background_failed': 0}
+
+
+def credentials_from_tokens(tokens: Dict) -> Credentials:
+    return Credentials(
+        token=tokens.get('token'),
+        refresh_token=tokens.get('refresh_token'),
+        token_uri=tokens.get('token_uri'),
+        client_id=tokens.get('client_id'),
+        client_secret=tokens.get('client_secret'),
+        scopes=tokens.get('scopes'),
+        expiry=parse_expiry(tokens.get('expiry'))
+    )
+
+
+def _fresh(creds: Optional[Credentials], fresh_until: Optional[datetime]) -> bool:
+    if creds is None or not creds.valid:
+        return False
+    return fresh_until is None or (creds.expiry is not None and creds.expiry >= fresh_until)
+
+
+def refresh_user_credentials(
+    user_id: int,
+    tokens: Dict,
+    fresh_until: Optional[datetime] = None,
+    counter: str = 'request_path'
+) -> Credentials:
+    """
+    Single-flight refresh of a user's access token
+
+    Threads in this process queue on a per-user lock and other processes on a
+    Postgres advisory lock. Whoever gets the lock second finds the token
+    already refreshed (cache or database) and reuses it instead of calling
+    Google again.
+
+    Args:
+        user_id: Telegram user ID
+        tokens: Stored tokens, used if the database has none
+        fresh_until: Also refresh tokens that are still valid but expire
+            before this naive-UTC time (the background refresher's window)
+        counter: refresh_counters key counting actual calls to Google
+    """
+    with _refresh_locks.hold(user_id):
+        creds = credentials_cache.get(user_id)
+        if _fresh(creds, fresh_until):
+            return creds
+
+        with user_refresh_lock(user_id) as conn:
+            tokens = get_user_tokens(user_id, conn=conn) or tokens
+            creds = credentials_from_tokens(tokens)
+            if _fresh(creds, fresh_until):
+                return creds
+
+            creds.refresh(Request())
+            refresh_counters[counter] += 1
+            # Update tokens in database
+            tokens['token'] = creds.token
+            tokens['expiry'] = creds.expiry.isoformat() if creds.expiry else None
+            tokens.pop('next_refresh_at', None)
+            save_user_tokens(user_id, tokens, conn=conn)
+
+        return creds
+
+
 def get_google_credentials(user_id: int) -> Credentials:
     """
     Get Google credentials for user, refresh if needed
+
+    Served from the in-process credentials cache while the access token is
+    still valid, so the common path does no database round trip.
     """
+    creds = credentials_cache.get(user_id)
+    if creds is not None:
+        return creds
+
     tokens = get_user_tokens(user_id)
 
     if not tokens:
@@ -101,26 +218,18 @@ def get_google_credentials(user_id: int) -> Credentials:
         print("⚠️ Scope mismatch, user must re-authenticate.")
         return None
 
-    creds = Credentials(
-        token=tokens.get('token'),
-        refresh_token=tokens.get('refresh_token'),
-        token_uri=tokens.get('token_uri'),
-        client_id=tokens.get('client_id'),
-        client_secret=tokens.get('client_secret'),
-        scopes=tokens.get('scopes')
-    )
+    creds = credentials_from_tokens(tokens)
 
     # Refresh token if expired
     if creds.refresh_token:
         try:
             if creds.expired or not creds.valid:
-                creds.refresh(Request())
-                # Update tokens in database
-                tokens['token'] = creds.token
-                tokens['expiry'] = creds.expiry.isoformat() if creds.expiry else None
-                save_user_tokens(user_id, tokens)
+                creds = refresh_user_credentials(user_id, tokens)
         except Exception as e:
             print(f"Token refresh error: {e}")
             return None
 
+    if creds.valid:
+        credentials_cache.put(user_id, creds, tokens.get('email'))
+
     return creds
@@ -0,0 +1,201 @@
+"""
+Incremental mirror of each user's primary Google Calendar into the events table.
+
+The first sync lists events from SYNC_WINDOW_DAYS ago onwards and stores the
+nextSyncToken Google returns. Later syncs send that token and receive only what
+changed since (including cancellations). When Google answers 410 Gone the token
+has expired: the mirror is dropped and rebuilt with a full sync.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from auth import get_google_credentials
+from db import apply_event_changes, get_calendar_sync_state, save_calendar_sync_state, user_sync_lock
+from google_services import get_service
+
+# How far back the initial (full) sync reaches
+SYNC_WINDOW_DAYS = int(os.getenv('CALENDAR_SYNC_WINDOW_DAYS', '30'))
+# A mirror older than this is refreshed in the background when read
+SYNC_STALE_AFTER = int(os.getenv('CALENDAR_SYNC_STALE_AFTER', '300'))
+SYNC_PAGE_SIZE = 250
+SYNC_FIELDS = (
+    'nextPageToken,nextSyncToken,'
+    'items(id,summary,description,start,end,status,htmlLink,etag,updated)'
+)
+CALENDAR_ID = 'primary'
+
+sync_counters = {'full': 0, 'incremental': 0, 'resets': 0, 'skipped': 0}
+
+
+def utc_naive(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _event_time(value: Optional[Dict]) -> Tuple[Optional[datetime], bool]:
+    """Return (naive UTC start/end, all_day) for a Google start/end object"""
+    if not value:
+        return None, False
+    if 'dateTime' in value:
+        return utc_naive(value['dateTime']), False
+    if 'date' in value:
+        return datetime.fromisoformat(value['date']), True
+    return None, False
+
+
+def event_row(event: Dict) -> Dict:
+    """Map a Google Calendar event to an events table row"""
+    start_time, all_day = _event_time(event.get('start'))
+    end_time, _ = _event_time(event.get('end'))
+    return {
+        'event_id': event['id'],
+        'title': event.get('summary', ''),
+        'description': event.get('description', ''),
+        'start_time': start_time,
+        'end_time': end_time,
+        'all_day': all_day,
+        'status': event.get('status'),
+        'html_link': event.get('htmlLink'),
+        'etag': event.get('etag'),
+        'updated': utc_naive(event['updated']) if event.get('updated') else None,
+    }
+
+
+def _fetch_changes(service, sync_token: Optional[str]) -> Tuple[List[Dict], str]:
+    """Page through events.list and return (items, nextSyncToken)"""
+    params = {
+        'calendarId': CALENDAR_ID,
+        'singleEvents': True,
+        'maxResults': SYNC_PAGE_SIZE,
+        'fields': SYNC_FIELDS,
+    }
+    if sync_token:
+        params['syncToken'] = sync_token
+    else:
+        time_min = datetime.utcnow() - timedelta(days=SYNC_WINDOW_DAYS)
+        params['timeMin'] = time_min.isoformat() + 'Z'
+
+    items = []
+    while True:
+        page = service.events().list(**params).execute()
+        items.extend(page.get('items', []))
+        if 'nextPageToken' not in page:
+            return items, page.get('nextSyncToken')
+        params['pageToken'] = page['nextPageToken']
+
+
+def _apply(user_id: int, items: List[Dict], started_from: Optional[str], next_token: str, full: bool) -> bool:
+    rows, removed_ids = [], []
+    for event in items:
+        if event.get('status') == 'cancelled':
+            removed_ids.append(event['id'])
+        elif event.get('start'):
+            rows.append(event_row(event))
+
+    with user_sync_lock(user_id, 'calendar') as conn:
+        # A concurrent sync that finished first has already moved the token on;
+        # writing our (older) view over it could resurrect stale data
+        state = get_calendar_sync_state(user_id, conn=conn)
+        current = state['sync_token'] if state else None
+        if current != started_from:
+            sync_counters['skipped'] += 1
+            return False
+
+        apply_event_changes(user_id, rows, removed_ids, conn, full=full)
+        save_calendar_sync_state(user_id, next_token, full, conn)
+    return True
+
+
+def mirror_events(user_id: int, events: List[Dict]):
+    """
+    Put events the backend just created or updated into the mirror right away
+
+    The next incremental sync delivers them again, which is harmless. Users
+    without a mirror yet are left alone; their first full sync includes them.
+    """
+    try:
+        with user_sync_lock(user_id, 'calendar') as conn:
+            if get_calendar_sync_state(user_id, conn=conn) is None:
+                return
+            apply_event_changes(user_id, [event_row(event) for event in events], [], conn)
+    except Exception as e:
+        # The mirror catches up on the next sync; never fail the write for this
+        print(f"Error mirroring created events for {user_id}: {e}")
+
+
+def sync_user_calendar(user_id: int, credentials=None) -> Dict:
+    """
+    Bring user_id's events mirror up to date with Google Calendar
+
+    Returns:
+        Summary dict with the sync mode and number of changes received
+    """
+    credentials = credentials or get_google_credentials(user_id)
+    if not credentials:
+        return {'status': 'unauthenticated'}
+
+    service = get_service('calendar', 'v3', credentials)
+    state = get_calendar_sync_state(user_id)
+    sync_token = state['sync_token'] if state else None
+
+    full = sync_token is None
+    try:
+        items, next_token = _fetch_changes(service, sync_token)
+    except HttpError as e:
+        if e.resp.status != 410 or full:
+            raise
+        # Sync token expired or invalidated by Google: rebuild from scratch
+        sync_counters['resets'] += 1
+        full = True
+        items, next_token = _fetch_changes(service, None)
+
+    mode = 'full' if full else 'incremental'
+    applied = _apply(user_id, items, sync_token, next_token, full)
+    if applied:
+        sync_counters[mode] += 1
+    return {'status': 'synced' if applied else 'superseded', 'mode': mode, 'changes': len(items)}
+
+
+def event_response(row: Dict) -> Dict:
+    """Shape a mirrored row for API responses (UTC times, dates for all-day events)"""
+    def fmt(value: Optional[datetime]) -> Optional[str]:
+        if value is None:
+            return None
+        return value.date().isoformat() if row['all_day'] else value.isoformat() + 'Z'
+
+    return {
+        'id': row['event_id'],
+        'summary': row['title'],
+        'description': row['description'],
+        'start': fmt(row['start_time']),
+        'end': fmt(row['end_time']),
+        'all_day': row['all_day'],
+        'htmlLink': row['html_link'],
+        'etag': row['etag'],
+    }
+
+
+def needs_rebuild(state: Optional[Dict]) -> bool:
+    """
+    True when there is no usable mirror yet: never synced, or reset by
+    partitions.py after retention dropped some of its rows
+    """
+    return state is None or state['sync_token'] is None
+
+
+def synced_at(state: Optional[Dict]) -> Optional[str]:
+    if not state or not state['synced_at']:
+        return None
+    return state['synced_at'].isoformat() + 'Z'
+
+
+def is_stale(state: Optional[Dict], now: Optional[datetime] = None) -> bool:
+    if not state or not state.get('synced_at'):
+        return True
+    now = now or datetime.utcnow()
+    return (now - state['synced_at']).total_seconds() > SYNC_STALE_AFTER
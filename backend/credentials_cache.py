@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from google.oauth2.credentials import Credentials
+
+CACHE_MAX_SIZE = int(os.getenv('CREDENTIALS_CACHE_SIZE', '10000'))
+# Entries expire this many seconds before the access token does
+CACHE_EXPIRY_SKEW = int(os.getenv('CREDENTIALS_CACHE_SKEW', '60'))
+# Upper bound on entry lifetime; bounds staleness on other workers after a revoke
+CACHE_MAX_TTL = int(os.getenv('CREDENTIALS_CACHE_MAX_TTL', '900'))
+
+
+class CredentialsCache:
+    """
+    LRU cache of live Google credentials keyed by user_id.
+
+    An entry lives until shortly before its access token expires (or
+    CACHE_MAX_TTL, whichever is first). db.save_user_tokens and
+    db.delete_user_tokens invalidate entries in this process.
+    """
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[Credentials, Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get_entry(self, user_id: int) -> Optional[Tuple[Credentials, Optional[str]]]:
+        """Return (credentials, email) for user_id, or None if absent or stale"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[2] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self._counters['hits'] += 1
+            return entry[0], entry[1]
+
+    def get(self, user_id: int) -> Optional[Credentials]:
+        entry = self.get_entry(user_id)
+        return entry[0] if entry else None
+
+    def put(self, user_id: int, credentials: Credentials, email: Optional[str] = None):
+        ttl = CACHE_MAX_TTL
+        if credentials.expiry is not None:
+            ttl = min(ttl, (credentials.expiry - datetime.utcnow()).total_seconds() - CACHE_EXPIRY_SKEW)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[user_id] = (credentials, email, time.monotonic() + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': self.max_size, **self._counters}
+
+
+credentials_cache = CredentialsCache()
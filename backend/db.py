@@ -1,74 +1,111 @@
-import os
 import json
 import psycopg
-from typing import Dict, Optional
-from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 
-DB_URL = os.getenv('DB_PATH')
+from credentials_cache import credentials_cache
+from db_pool import get_async_pool, get_pool
+from migrations import migrate
 
 @contextmanager
 def get_db_connection():
-    """Context manager for PostgreSQL connections"""
-    with psycopg.connect(DB_URL, sslmode="require") as conn:
-        try:
-            yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
+    """Borrow a pooled PostgreSQL connection (commit on success, rollback on error)"""
+    with get_pool().connection() as conn:
+        yield conn
 
-def init_db():
-    """Initialize database tables"""
+@asynccontextmanager
+async def get_async_db_connection():
+    """Async variant of get_db_connection for code running on the event loop"""
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+def _connection(conn=None):
+    """Reuse conn when the caller already holds one, otherwise borrow from the pool"""
+    return nullcontext(conn) if conn is not None else get_db_connection()
+
+def _async_connection(conn=None):
+    """Async variant of _connection"""
+    return nullcontext(conn) if conn is not None else get_async_db_connection()
+
+@contextmanager
+def user_refresh_lock(user_id: int):
+    """
+    Serialize token refreshes for user_id across processes.
+
+    Holds a transaction-scoped advisory lock and yields the connection, which
+    can be passed to get_user_tokens/save_user_tokens inside the block.
+    """
     with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    email TEXT,
-                    tokens JSONB,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        conn.execute(
+            'SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))',
+            (f'token-refresh:{user_id}',)
+        )
+        yield conn
 
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS events (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    event_id TEXT,
-                    title TEXT,
-                    start_time TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-                )
-            ''')
+@contextmanager
+def user_sync_lock(user_id: int, scope: str):
+    """
+    Serialize mirror writes of one kind (scope, e.g. 'calendar') for user_id.
 
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notes (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    note_id TEXT,
-                    title TEXT,
-                    content TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-                )
-            ''')
+    Same pattern as user_refresh_lock: the advisory lock is released when the
+    yielded connection's transaction ends.
+    """
+    with get_db_connection() as conn:
+        _lock_user_sync(conn, user_id, scope)
+        yield conn
 
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS preferences (
-                    user_id BIGINT PRIMARY KEY,
-                    language TEXT DEFAULT 'uz',
-                    timezone TEXT DEFAULT 'Asia/Tashkent',
-                    notifications BOOLEAN DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+def _lock_user_sync(conn, user_id: int, scope: str):
+    conn.execute(
+        'SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))',
+        (f'{scope}-sync:{user_id}',)
+    )
+
+def _copy_missing_rows(table: str, key: str, columns: Tuple[str, ...], rows: List[Dict], scope: str) -> int:
+    """
+    Bulk-load rows with COPY and add those whose (user_id, key) is not in
+    table yet; the mirror sync stays authoritative for rows it already has.
+    Rows of users that no longer exist are skipped.
+
+    Takes every affected user's sync lock (in a fixed order, so concurrent
+    flushes can't deadlock) so a sync can't insert the same rows meanwhile.
+
+    Returns:
+        Number of rows inserted
+    """
+    column_list = ', '.join(columns)
+    with get_db_connection() as conn:
+        for user_id in sorted({row['user_id'] for row in rows}):
+            _lock_user_sync(conn, user_id, scope)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE staged_{table} ON COMMIT DROP AS '
+                f'SELECT {column_list} FROM {table} WITH NO DATA'
+            )
+            with cursor.copy(f'COPY staged_{table} ({column_list}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row([row[column] for column in columns])
+            cursor.execute(f'''
+                INSERT INTO {table} ({column_list})
+                SELECT DISTINCT ON (user_id, {key}) {column_list} FROM staged_{table} staged
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} existing
+                    WHERE existing.user_id = staged.user_id AND existing.{key} = staged.{key}
                 )
+                  -- Users who logged out since the rows were buffered
+                  AND EXISTS (SELECT 1 FROM users WHERE users.user_id = staged.user_id)
             ''')
+            return cursor.rowcount
 
-            print("Database initialized successfully")
+def init_db():
+    """Apply pending schema migrations (no DDL when the schema is current)"""
+    applied = migrate()
+    if applied:
+        print("Database initialized successfully")
 
-def save_user_tokens(user_id: int, tokens: Dict):
-    with get_db_connection() as conn:
+def save_user_tokens(user_id: int, tokens: Dict, conn=None):
+    with _connection(conn) as conn:
         with conn.cursor() as cursor:
             email = tokens.get('email', '')
             tokens_json = json.dumps(tokens)
@@ -80,9 +117,50 @@ def save_user_tokens(user_id: int, tokens: Dict):
                     tokens = EXCLUDED.tokens,
                     updated_at = CURRENT_TIMESTAMP
             ''', (user_id, email, tokens_json))
+    credentials_cache.invalidate(user_id)
+
+def claim_expiring_tokens(expires_before: str, now: str, claim_until: str, limit: int) -> List[Tuple[int, Dict]]:
+    """
+    Claim users whose access token expires before expires_before
+
+    All arguments are naive-UTC ISO strings (the format tokens['expiry'] is
+    stored in). Claimed users get next_refresh_at = claim_until, so other
+    refreshers skip them until then; the claim is committed before returning,
+    so no lock is held while their tokens are refreshed.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                UPDATE users SET tokens = jsonb_set(tokens, '{next_refresh_at}', to_jsonb(%s::text))
+                WHERE user_id IN (
+                    SELECT user_id FROM users
+                    WHERE (tokens->>'expiry') COLLATE "C" < %s
+                      AND tokens->>'refresh_token' IS NOT NULL
+                      AND COALESCE(tokens->>'next_refresh_at', '') COLLATE "C" < %s
+                    ORDER BY (tokens->>'expiry') COLLATE "C"
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING user_id, tokens
+            ''', (claim_until, expires_before, now, limit))
+            return [
+                (user_id, tokens if isinstance(tokens, dict) else json.loads(tokens))
+                for user_id, tokens in cursor.fetchall()
+            ]
 
-def get_user_tokens(user_id: int) -> Optional[Dict]:
+def defer_token_refresh(user_ids: List[int], retry_at: str):
+    """Skip user_ids in background refreshes until retry_at, in a single UPDATE"""
+    if not user_ids:
+        return
     with get_db_connection() as conn:
+        conn.execute(
+            "UPDATE users SET tokens = jsonb_set(tokens, '{next_refresh_at}', to_jsonb(%s::text)) "
+            "WHERE user_id = ANY(%s)",
+            (retry_at, list(user_ids))
+        )
+
+def get_user_tokens(user_id: int, conn=None) -> Optional[Dict]:
+    with _connection(conn) as conn:
         with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
             cursor.execute('SELECT tokens FROM users WHERE user_id = %s', (user_id,))
             row = cursor.fetchone()
@@ -90,21 +168,36 @@ def get_user_tokens(user_id: int) -> Optional[Dict]:
                 return row['tokens'] if isinstance(row['tokens'], dict) else json.loads(row['tokens'])
             return None
 
+async def get_user_tokens_async(user_id: int) -> Optional[Dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('SELECT tokens FROM users WHERE user_id = %s', (user_id,))
+            row = await cursor.fetchone()
+            if row and row['tokens']:
+                return row['tokens'] if isinstance(row['tokens'], dict) else json.loads(row['tokens'])
+            return None
+
 def delete_user_tokens(user_id: int):
     with get_db_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute('DELETE FROM preferences WHERE user_id = %s', (user_id,))
             cursor.execute('DELETE FROM notes WHERE user_id = %s', (user_id,))
             cursor.execute('DELETE FROM events WHERE user_id = %s', (user_id,))
+            cursor.execute('DELETE FROM calendar_sync_state WHERE user_id = %s', (user_id,))
+            cursor.execute('DELETE FROM notes_sync_state WHERE user_id = %s', (user_id,))
+            cursor.execute('DELETE FROM jobs WHERE user_id = %s', (user_id,))
+            cursor.execute('DELETE FROM idempotency_keys WHERE user_id = %s', (user_id,))
             cursor.execute('DELETE FROM users WHERE user_id = %s', (user_id,))
+    credentials_cache.invalidate(user_id)
 
-def save_event(user_id: int, event_id: str, title: str, start_time: str):
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute('''
-                INSERT INTO events (user_id, event_id, title, start_time)
-                VALUES (%s, %s, %s, %s)
-            ''', (user_id, event_id, title, start_time))
+EVENT_COLUMNS = (
+    'user_id', 'event_id', 'title', 'description', 'start_time', 'end_time',
+    'all_day', 'status', 'html_link', 'etag', 'updated',
+)
+
+def save_events(rows: List[Dict]) -> int:
+    """Record created events (user_id plus calendar_sync.event_row fields) in one COPY"""
+    return _copy_missing_rows('events', 'event_id', EVENT_COLUMNS, rows, 'calendar')
 
 def get_user_events(user_id: int, limit: int = 10) -> list:
     with get_db_connection() as conn:
@@ -117,13 +210,102 @@ def get_user_events(user_id: int, limit: int = 10) -> list:
             ''', (user_id, limit))
             return cursor.fetchall()
 
-def save_note(user_id: int, note_id: str, title: str, content: str):
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute('''
-                INSERT INTO notes (user_id, note_id, title, content)
-                VALUES (%s, %s, %s, %s)
-            ''', (user_id, note_id, title, content))
+def apply_event_changes(user_id: int, rows: List[Dict], removed_ids: List[str], conn, full: bool = False):
+    """
+    Write a batch of Google Calendar changes into the events mirror
+
+    Changed events are deleted and re-inserted by event_id, so applying the
+    same batch twice is harmless. A full sync first drops everything the user had.
+    """
+    with conn.cursor() as cursor:
+        if full:
+            cursor.execute('DELETE FROM events WHERE user_id = %s', (user_id,))
+        else:
+            event_ids = removed_ids + [row['event_id'] for row in rows]
+            if event_ids:
+                cursor.execute(
+                    'DELETE FROM events WHERE user_id = %s AND event_id = ANY(%s)',
+                    (user_id, event_ids)
+                )
+        if rows:
+            cursor.executemany('''
+                INSERT INTO events (
+                    user_id, event_id, title, description, start_time, end_time,
+                    all_day, status, html_link, etag, updated
+                )
+                VALUES (
+                    %(user_id)s, %(event_id)s, %(title)s, %(description)s, %(start_time)s, %(end_time)s,
+                    %(all_day)s, %(status)s, %(html_link)s, %(etag)s, %(updated)s
+                )
+            ''', [{**row, 'user_id': user_id} for row in rows])
+
+def get_calendar_sync_state(user_id: int, conn=None) -> Optional[Dict]:
+    with _connection(conn) as conn:
+        with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            cursor.execute('SELECT * FROM calendar_sync_state WHERE user_id = %s', (user_id,))
+            return cursor.fetchone()
+
+async def get_calendar_sync_state_async(user_id: int) -> Optional[Dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('SELECT * FROM calendar_sync_state WHERE user_id = %s', (user_id,))
+            return await cursor.fetchone()
+
+def save_calendar_sync_state(user_id: int, sync_token: Optional[str], full: bool, conn):
+    synced_at = datetime.utcnow()
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            INSERT INTO calendar_sync_state (user_id, sync_token, synced_at, full_synced_at)
+            VALUES (%s, %s, %s, CASE WHEN %s THEN %s END)
+            ON CONFLICT (user_id) DO UPDATE SET
+                sync_token = EXCLUDED.sync_token,
+                synced_at = EXCLUDED.synced_at,
+                full_synced_at = COALESCE(EXCLUDED.full_synced_at, calendar_sync_state.full_synced_at)
+        ''', (user_id, sync_token, synced_at, full, synced_at))
+
+async def get_upcoming_events_async(user_id: int, now: datetime, limit: int = 10) -> List[Dict]:
+    """Upcoming events from the local mirror (start times are naive UTC)"""
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT event_id, title, description, start_time, end_time,
+                       all_day, status, html_link, etag, updated
+                FROM events
+                WHERE user_id = %s AND start_time >= %s
+                ORDER BY start_time
+                LIMIT %s
+            ''', (user_id, now, limit))
+            return await cursor.fetchall()
+
+async def get_recent_events_async(user_id: int, limit: int = 20) -> List[Dict]:
+    """Most recently recorded events, created here or mirrored"""
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT event_id, title, description, start_time, end_time,
+                       all_day, status, html_link, etag, updated
+                FROM events
+                WHERE user_id = %s
+                ORDER BY created_at DESC
+                LIMIT %s
+            ''', (user_id, limit))
+            return await cursor.fetchall()
+
+async def get_mirrored_event_async(user_id: int, event_id: str) -> Optional[Dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT event_id, start_time, end_time, all_day, etag FROM events
+                WHERE user_id = %s AND event_id = %s
+                LIMIT 1
+            ''', (user_id, event_id))
+            return await cursor.fetchone()
+
+NOTE_COLUMNS = ('user_id', 'note_id', 'title', 'content', 'status', 'due', 'etag', 'updated')
+
+def save_notes(rows: List[Dict]) -> int:
+    """Record created notes (user_id plus notes_sync.note_row fields) in one COPY"""
+    return _copy_missing_rows('notes', 'note_id', NOTE_COLUMNS, rows, 'notes')
 
 def get_user_notes(user_id: int, limit: int = 10) -> list:
     with get_db_connection() as conn:
@@ -136,6 +318,327 @@ def get_user_notes(user_id: int, limit: int = 10) -> list:
             ''', (user_id, limit))
             return cursor.fetchall()
 
+def apply_note_changes(user_id: int, rows: List[Dict], removed_ids: List[str], conn, full: bool = False):
+    """Write a batch of Google Tasks changes into the notes mirror (see apply_event_changes)"""
+    with conn.cursor() as cursor:
+        if full:
+            cursor.execute('DELETE FROM notes WHERE user_id = %s', (user_id,))
+        else:
+            note_ids = removed_ids + [row['note_id'] for row in rows]
+            if note_ids:
+                cursor.execute(
+                    'DELETE FROM notes WHERE user_id = %s AND note_id = ANY(%s)',
+                    (user_id, note_ids)
+                )
+        if rows:
+            cursor.executemany('''
+                INSERT INTO notes (user_id, note_id, title, content, status, due, etag, updated)
+                VALUES (
+                    %(user_id)s, %(note_id)s, %(title)s, %(content)s,
+                    %(status)s, %(due)s, %(etag)s, %(updated)s
+                )
+            ''', [{**row, 'user_id': user_id} for row in rows])
+
+def get_notes_sync_state(user_id: int, conn=None) -> Optional[Dict]:
+    with _connection(conn) as conn:
+        with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            cursor.execute('SELECT * FROM notes_sync_state WHERE user_id = %s', (user_id,))
+            return cursor.fetchone()
+
+async def get_notes_sync_state_async(user_id: int) -> Optional[Dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('SELECT * FROM notes_sync_state WHERE user_id = %s', (user_id,))
+            return await cursor.fetchone()
+
+def save_notes_sync_state(user_id: int, updated_min: Optional[str], full: bool, conn):
+    synced_at = datetime.utcnow()
+    with conn.cursor() as cursor:
+        cursor.execute('''
+            INSERT INTO notes_sync_state (user_id, updated_min, synced_at, full_synced_at)
+            VALUES (%s, %s, %s, CASE WHEN %s THEN %s END)
+            ON CONFLICT (user_id) DO UPDATE SET
+                updated_min = EXCLUDED.updated_min,
+                synced_at = EXCLUDED.synced_at,
+                full_synced_at = COALESCE(EXCLUDED.full_synced_at, notes_sync_state.full_synced_at)
+        ''', (user_id, updated_min, synced_at, full, synced_at))
+
+async def mark_notes_active_async(user_id: int):
+    """Record that user_id used notes, so the background sync keeps their mirror fresh"""
+    async with get_async_db_connection() as conn:
+        await conn.execute('''
+            INSERT INTO notes_sync_state (user_id, active_at)
+            SELECT %s, %s WHERE EXISTS (SELECT 1 FROM users WHERE user_id = %s)
+            ON CONFLICT (user_id) DO UPDATE SET active_at = EXCLUDED.active_at
+        ''', (user_id, datetime.utcnow(), user_id))
+
+def get_notes_sync_candidates(active_since: datetime, synced_before: datetime, limit: int) -> List[int]:
+    """Recently active users whose notes mirror is older than synced_before, stalest first"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT user_id FROM notes_sync_state
+                WHERE active_at >= %s
+                  AND (synced_at IS NULL OR synced_at < %s)
+                ORDER BY synced_at NULLS FIRST
+                LIMIT %s
+            ''', (active_since, synced_before, limit))
+            return [row[0] for row in cursor.fetchall()]
+
+async def get_user_notes_async(user_id: int, limit: int = 20, offset: int = 0) -> List[Dict]:
+    """Notes from the local mirror, most recently updated first"""
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT note_id, title, content, status, due, etag, updated
+                FROM notes
+                WHERE user_id = %s
+                ORDER BY updated DESC NULLS LAST
+                LIMIT %s OFFSET %s
+            ''', (user_id, limit, offset))
+            return await cursor.fetchall()
+
+async def get_recent_notes_async(user_id: int, limit: int = 20) -> List[Dict]:
+    """Most recently recorded notes, created here or mirrored"""
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT note_id, title, content, status, due, etag, updated
+                FROM notes
+                WHERE user_id = %s
+                ORDER BY created_at DESC
+                LIMIT %s
+            ''', (user_id, limit))
+            return await cursor.fetchall()
+
+async def get_mirrored_note_async(user_id: int, note_id: str) -> Optional[Dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT note_id, etag, updated FROM notes
+                WHERE user_id = %s AND note_id = %s
+                LIMIT 1
+            ''', (user_id, note_id))
+            return await cursor.fetchone()
+
+async def search_user_notes_async(user_id: int, words: List[str], limit: int = 20) -> List[Dict]:
+    """Notes whose title or content contain every word as a prefix"""
+    query = ' & '.join(f"'{word}':*" for word in words)
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT note_id, title, content, status, due, etag, updated
+                FROM notes
+                WHERE user_id = %s
+                  AND to_tsvector('simple', COALESCE(title, '') || ' ' || COALESCE(content, ''))
+                      @@ to_tsquery('simple', %s)
+                ORDER BY updated DESC NULLS LAST
+                LIMIT %s
+            ''', (user_id, query, limit))
+            return await cursor.fetchall()
+
+async def enqueue_job_async(user_id: int, kind: str, payload: Dict, max_attempts: int, conn=None) -> int:
+    now = datetime.utcnow()
+    async with _async_connection(conn) as conn:
+        cursor = await conn.execute('''
+            INSERT INTO jobs (user_id, kind, payload, max_attempts, run_at, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        ''', (user_id, kind, json.dumps(payload), max_attempts, now, now, now))
+        return (await cursor.fetchone())[0]
+
+async def claim_jobs_async(limit: int, lease_seconds: int) -> List[Dict]:
+    """
+    Lease up to limit runnable jobs to this worker
+
+    Claimed jobs are marked running until now + lease_seconds; a job whose
+    worker died is picked up again once its lease has expired, unless that
+    was its last attempt: then it is dead-lettered (error_code
+    'lease_expired'), so a job that keeps killing or hanging its worker can't
+    be reclaimed forever. Rows claimed by another worker at the same moment
+    are skipped, not waited for.
+    """
+    now = datetime.utcnow()
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                UPDATE jobs SET
+                    status = 'dead',
+                    last_error = %(error)s,
+                    result = %(result)s,
+                    locked_until = NULL,
+                    updated_at = %(now)s
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE status = 'running' AND locked_until < %(now)s AND attempts >= max_attempts
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+            ''', {
+                'error': 'Lease expired on the last attempt (worker died or hung)',
+                'result': json.dumps({'error_code': 'lease_expired'}),
+                'now': now,
+            })
+            expired = await cursor.fetchall()
+            if expired:
+                print(f"Dead-lettered jobs whose last attempt lost its lease: {[row['id'] for row in expired]}")
+
+            await cursor.execute('''
+                UPDATE jobs SET
+                    status = 'running',
+                    attempts = attempts + 1,
+                    locked_until = %(locked_until)s,
+                    updated_at = %(now)s
+                WHERE id IN (
+                    SELECT id FROM jobs
+                    WHERE (status = 'queued' AND run_at <= %(now)s)
+                       OR (status = 'running' AND locked_until < %(now)s AND attempts < max_attempts)
+                    ORDER BY run_at
+                    LIMIT %(limit)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, user_id, kind, payload, attempts, max_attempts, created_at
+            ''', {
+                'now': now,
+                'locked_until': now + timedelta(seconds=lease_seconds),
+                'limit': limit,
+            })
+            return await cursor.fetchall()
+
+# complete/fail/extend only touch the job while this attempt still holds it:
+# a worker whose lease expired must not overwrite the attempt that took over.
+
+async def extend_job_lease_async(job_id: int, attempts: int, lease_seconds: int) -> bool:
+    now = datetime.utcnow()
+    async with get_async_db_connection() as conn:
+        cursor = await conn.execute('''
+            UPDATE jobs SET locked_until = %s, updated_at = %s
+            WHERE id = %s AND attempts = %s AND status = 'running'
+        ''', (now + timedelta(seconds=lease_seconds), now, job_id, attempts))
+        return cursor.rowcount == 1
+
+async def complete_job_async(job_id: int, attempts: int, result: Dict) -> bool:
+    async with get_async_db_connection() as conn:
+        cursor = await conn.execute('''
+            UPDATE jobs SET status = 'succeeded', result = %s, locked_until = NULL, updated_at = %s
+            WHERE id = %s AND attempts = %s AND status = 'running'
+        ''', (json.dumps(result), datetime.utcnow(), job_id, attempts))
+        return cursor.rowcount == 1
+
+async def fail_job_async(
+    job_id: int, attempts: int, error: str, retry_at: Optional[datetime], error_code: Optional[str] = None
+) -> bool:
+    """
+    Requeue the job for retry_at, or move it to the dead state when retry_at
+    is None; error_code (e.g. 'unauthenticated') is kept in result for clients
+    """
+    async with get_async_db_connection() as conn:
+        cursor = await conn.execute('''
+            UPDATE jobs SET
+                status = CASE WHEN %(retry_at)s::timestamp IS NULL THEN 'dead' ELSE 'queued' END,
+                run_at = COALESCE(%(retry_at)s::timestamp, run_at),
+                last_error = %(error)s,
+                result = %(result)s,
+                locked_until = NULL,
+                updated_at = %(now)s
+            WHERE id = %(id)s AND attempts = %(attempts)s AND status = 'running'
+        ''', {
+            'retry_at': retry_at,
+            'error': error,
+            'result': json.dumps({'error_code': error_code}) if error_code else None,
+            'now': datetime.utcnow(),
+            'id': job_id,
+            'attempts': attempts,
+        })
+        return cursor.rowcount == 1
+
+async def get_job_async(job_id: int) -> Optional[Dict]:
+    async with get_async_db_connection() as conn:
+        async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+            await cursor.execute('''
+                SELECT id, user_id, kind, status, attempts, result, last_error, created_at, updated_at
+                FROM jobs WHERE id = %s
+            ''', (job_id,))
+            return await cursor.fetchone()
+
+async def get_job_counts_async() -> Dict[str, int]:
+    async with get_async_db_connection() as conn:
+        cursor = await conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status')
+        return dict(await cursor.fetchall())
+
+def purge_finished_jobs(before: datetime) -> int:
+    """Delete succeeded and dead jobs last touched before `before`"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                DELETE FROM jobs
+                WHERE status IN ('succeeded', 'dead') AND updated_at < %s
+            ''', (before,))
+            return cursor.rowcount
+
+async def reserve_idempotency_key_async(
+    conn, user_id: int, endpoint: str, key: str, request_hash: str, ttl: timedelta,
+    pending_timeout: Optional[timedelta] = None
+) -> Optional[Dict]:
+    """
+    Claim an idempotency key inside conn's transaction
+
+    An entry with no response yet is taken over once it is older than
+    pending_timeout (for reservations committed before the work is done,
+    whose owner may have died).
+
+    Returns:
+        None when the key is now ours (new, or the old entry had expired);
+        otherwise the stored entry. A concurrent request with the same key
+        waits on the primary key until our transaction ends.
+    """
+    now = datetime.utcnow()
+    stale_before = now - pending_timeout if pending_timeout is not None else None
+    async with conn.cursor(row_factory=psycopg.rows.dict_row) as cursor:
+        await cursor.execute('''
+            INSERT INTO idempotency_keys (user_id, endpoint, key, request_hash, created_at, expires_at)
+            VALUES (%(user_id)s, %(endpoint)s, %(key)s, %(request_hash)s, %(now)s, %(expires_at)s)
+            ON CONFLICT (user_id, endpoint, key) DO UPDATE SET
+                request_hash = EXCLUDED.request_hash,
+                response = NULL,
+                created_at = EXCLUDED.created_at,
+                expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < %(now)s
+               OR (idempotency_keys.response IS NULL AND idempotency_keys.created_at < %(stale_before)s)
+            RETURNING key
+        ''', {
+            'user_id': user_id, 'endpoint': endpoint, 'key': key,
+            'request_hash': request_hash, 'now': now, 'expires_at': now + ttl,
+            'stale_before': stale_before,
+        })
+        if await cursor.fetchone():
+            return None
+
+        await cursor.execute('''
+            SELECT request_hash, response FROM idempotency_keys
+            WHERE user_id = %s AND endpoint = %s AND key = %s
+        ''', (user_id, endpoint, key))
+        return await cursor.fetchone()
+
+async def store_idempotent_response_async(conn, user_id: int, endpoint: str, key: str, response: Dict):
+    await conn.execute('''
+        UPDATE idempotency_keys SET response = %s
+        WHERE user_id = %s AND endpoint = %s AND key = %s
+    ''', (json.dumps(response), user_id, endpoint, key))
+
+async def release_idempotency_key_async(conn, user_id: int, endpoint: str, key: str):
+    """Drop a reservation whose work failed, so a retry can run it again"""
+    await conn.execute('''
+        DELETE FROM idempotency_keys
+        WHERE user_id = %s AND endpoint = %s AND key = %s AND response IS NULL
+    ''', (user_id, endpoint, key))
+
+def purge_expired_idempotency_keys(now: datetime) -> int:
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('DELETE FROM idempotency_keys WHERE expires_at < %s', (now,))
+            return cursor.rowcount
+
 def save_user_preference(user_id: int, key: str, value: str):
     allowed_keys = {'language', 'timezone', 'notifications'}
     if key not in allowed_keys:
@@ -162,17 +665,6 @@ def get_all_users() -> list:
             cursor.execute('SELECT user_id, email FROM users')
             return cursor.fetchall()
 
-def cleanup_old_cache(days: int = 30):
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute('''
-                DELETE FROM events WHERE created_at < NOW() - INTERVAL '%s days'
-            ''', (days,))
-            cursor.execute('''
-                DELETE FROM notes WHERE created_at < NOW() - INTERVAL '%s days'
-            ''', (days,))
-            print(f"Cleaned up cache older than {days} days")
-
 if __name__ == '__main__':
     init_db()
     print("Database setup complete!")
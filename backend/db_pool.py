@@ -0,0 +1,92 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+DB_URL = os.getenv('DB_PATH')
+
+# Pool sizing and recycling (see .env.example)
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '3600'))
+
+CONNECTION_KWARGS = {"sslmode": "require"}
+
+_pool: Optional[ConnectionPool] = None
+_async_pool: Optional[AsyncConnectionPool] = None
+_lock = threading.Lock()
+
+
+def _pool_options() -> Dict:
+    return {
+        'conninfo': DB_URL,
+        'kwargs': CONNECTION_KWARGS,
+        'min_size': POOL_MIN_SIZE,
+        'max_size': POOL_MAX_SIZE,
+        'timeout': POOL_TIMEOUT,
+        'max_idle': POOL_MAX_IDLE,
+        'max_lifetime': POOL_MAX_LIFETIME,
+    }
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide sync pool, opening it on first use"""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                pool = ConnectionPool(
+                    name='backend',
+                    check=ConnectionPool.check_connection,
+                    open=False,
+                    **_pool_options()
+                )
+                pool.open(wait=True, timeout=POOL_TIMEOUT)
+                _pool = pool
+    return _pool
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    """Return the process-wide async pool, opening it on first use"""
+    global _async_pool
+    if _async_pool is None:
+        pool = AsyncConnectionPool(
+            name='backend-async',
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+            **_pool_options()
+        )
+        await pool.open(wait=True, timeout=POOL_TIMEOUT)
+        if _async_pool is None:
+            _async_pool = pool
+        else:
+            await pool.close()
+    return _async_pool
+
+
+def pool_stats() -> Dict:
+    """Snapshot of pool counters (connections, waiting clients, errors, ...)"""
+    stats = {}
+    if _pool is not None:
+        stats['sync'] = _pool.get_stats()
+    if _async_pool is not None:
+        stats['async'] = _async_pool.get_stats()
+    return stats
+
+
+def close_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        pool, _async_pool = _async_pool, None
+        await pool.close()
@@ -0,0 +1,125 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# Sizing (see .env.example)
+EXECUTOR_WORKERS = int(os.getenv('EXECUTOR_WORKERS', '16'))
+EXECUTOR_MAX_QUEUE = int(os.getenv('EXECUTOR_MAX_QUEUE', '64'))
+EXECUTOR_RETRY_AFTER = int(os.getenv('EXECUTOR_RETRY_AFTER', '2'))
+
+# User the blocking call is running for, visible inside the worker thread
+current_user_id: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    'current_user_id', default=None
+)
+
+
+class ExecutorSaturated(Exception):
+    """Raised when the executor has no room for another blocking call"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Executor saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BlockingExecutor:
+    """
+    Runs blocking calls (Google API, psycopg) off the event loop.
+
+    At most ``workers`` calls run at once and at most ``max_queue`` more may
+    wait; anything beyond that is rejected immediately with ExecutorSaturated.
+    Calls tagged with the same user_id run one at a time, in arrival order.
+    """
+
+    def __init__(self, workers: int = EXECUTOR_WORKERS, max_queue: int = EXECUTOR_MAX_QUEUE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='blocking')
+        self._pending = 0
+        self._running = 0
+        self._running_lock = threading.Lock()
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._user_waiters: Dict[int, int] = {}
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+        }
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    async def run(self, fn: Callable, *args, user_id: Optional[int] = None, **kwargs):
+        """Run fn(*args, **kwargs) on a worker thread and return its result"""
+        if self._pending >= self.workers + self.max_queue:
+            self._counters['rejected'] += 1
+            raise ExecutorSaturated(EXECUTOR_RETRY_AFTER)
+
+        self._pending += 1
+        self._counters['submitted'] += 1
+        try:
+            if user_id is None:
+                return await self._submit(fn, args, kwargs, user_id)
+
+            lock = self._user_locks.get(user_id)
+            if lock is None:
+                lock = self._user_locks[user_id] = asyncio.Lock()
+            self._user_waiters[user_id] = self._user_waiters.get(user_id, 0) + 1
+            try:
+                async with lock:
+                    return await self._submit(fn, args, kwargs, user_id)
+            finally:
+                self._user_waiters[user_id] -= 1
+                if not self._user_waiters[user_id]:
+                    del self._user_waiters[user_id]
+                    del self._user_locks[user_id]
+        finally:
+            self._pending -= 1
+
+    async def _submit(self, fn: Callable, args: tuple, kwargs: dict, user_id: Optional[int]):
+        enqueued = time.monotonic()
+
+        def call():
+            started = time.monotonic()
+            with self._running_lock:
+                self._running += 1
+                self._wait_seconds += started - enqueued
+            current_user_id.set(user_id)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._running_lock:
+                    self._running -= 1
+                    self._run_seconds += time.monotonic() - started
+
+        ctx = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._pool, ctx.run, call)
+        except Exception:
+            self._counters['failed'] += 1
+            raise
+        self._counters['completed'] += 1
+        return result
+
+    def stats(self) -> Dict:
+        finished = self._counters['completed'] + self._counters['failed']
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'running': self._running,
+            'queue_depth': max(self._pending - self._running, 0),
+            'users_in_flight': len(self._user_locks),
+            **self._counters,
+            'avg_wait_ms': round(self._wait_seconds / finished * 1000, 2) if finished else 0.0,
+            'avg_run_ms': round(self._run_seconds / finished * 1000, 2) if finished else 0.0,
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+executor = BlockingExecutor()
@@ -1,7 +1,39 @@
-from googleapiclient.discovery import build
+from google_services import execute_batch, get_service, iter_items
 from google.oauth2.credentials import Credentials
 from datetime import datetime, timedelta
-from typing import List, Dict
+from itertools import islice
+from typing import Dict, Iterator, List
+
+# Partial-response masks: only what the bot and API responses display
+CALENDAR_LIST_FIELDS = 'nextPageToken,items(id,summary,primary,accessRole)'
+EVENT_LIST_FIELDS = 'nextPageToken,items(id,summary,description,start,end,status,htmlLink,etag)'
+
+def _event_body(
+    title: str,
+    start_time: datetime,
+    description: str = "",
+    duration_minutes: int = 60
+) -> Dict:
+    end_time = start_time + timedelta(minutes=duration_minutes)
+    return {
+        'summary': title,
+        'description': description,
+        'start': {
+            'dateTime': start_time.isoformat(),
+            'timeZone': 'Asia/Tashkent',
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': 'Asia/Tashkent',
+        },
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'popup', 'minutes': 30},
+                {'method': 'popup', 'minutes': 10},
+            ],
+        },
+    }
 
 def create_calendar_event(
     credentials: Credentials,
@@ -9,7 +41,8 @@ def create_calendar_event(
     start_time: datetime,
     description: str = "",
     duration_minutes: int = 60,
-    calendar_id: str = 'primary'
+    calendar_id: str = 'primary',
+    event_id: str = None
 ) -> Dict:
     """
     Create a calendar event
@@ -21,36 +54,18 @@ def create_calendar_event(
         description: Event description
         duration_minutes: Event duration in minutes
         calendar_id: Calendar ID (default: 'primary')
+        event_id: Optional client-chosen ID (base32hex); creating the same ID
+            again fails with HTTP 409 instead of making a duplicate
     
     Returns:
         Created event dictionary
     """
     try:
-        service = build('calendar', 'v3', credentials=credentials)
-        
-        # Calculate end time
-        end_time = start_time + timedelta(minutes=duration_minutes)
-        
-        # Event body
-        event = {
-            'summary': title,
-            'description': description,
-            'start': {
-                'dateTime': start_time.isoformat(),
-                'timeZone': 'Asia/Tashkent',
-            },
-            'end': {
-                'dateTime': end_time.isoformat(),
-                'timeZone': 'Asia/Tashkent',
-            },
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'popup', 'minutes': 30},
-                    {'method': 'popup', 'minutes': 10},
-                ],
-            },
-        }
+        service = get_service('calendar', 'v3', credentials)
+        
+        event = _event_body(title, start_time, description, duration_minutes)
+        if event_id:
+            event['id'] = event_id
         
         # Create event
         event = service.events().insert(calendarId=calendar_id, body=event).execute()
@@ -61,36 +76,147 @@ def create_calendar_event(
         print(f"Error creating calendar event: {e}")
         raise
 
-def get_user_calendars(credentials: Credentials) -> List[Dict]:
+def get_calendar_event(
+    credentials: Credentials,
+    event_id: str,
+    calendar_id: str = 'primary'
+) -> Dict:
     """
-    Get list of user's calendars
+    Get a single calendar event
     
     Args:
         credentials: Google OAuth credentials
+        event_id: Event ID
+        calendar_id: Calendar ID (default: 'primary')
     
     Returns:
-        List of calendar dictionaries
+        Event dictionary
     """
     try:
-        service = build('calendar', 'v3', credentials=credentials)
+        service = get_service('calendar', 'v3', credentials)
         
-        calendar_list = service.calendarList().list().execute()
+        return service.events().get(calendarId=calendar_id, eventId=event_id).execute()
         
-        calendars = []
-        for calendar in calendar_list.get('items', []):
-            calendars.append({
-                'id': calendar['id'],
-                'summary': calendar['summary'],
-                'primary': calendar.get('primary', False),
-                'accessRole': calendar.get('accessRole')
-            })
+    except Exception as e:
+        print(f"Error fetching event: {e}")
+        raise
+
+def create_calendar_events_batch(
+    credentials: Credentials,
+    events: List[Dict],
+    calendar_id: str = 'primary'
+) -> List[Dict]:
+    """
+    Create many calendar events using Google batch requests
+    
+    Args:
+        credentials: Google OAuth credentials
+        events: Dicts with 'title', 'start_time' (datetime) and optional
+            'description' and 'duration_minutes'
+        calendar_id: Calendar ID (default: 'primary')
+    
+    Returns:
+        One result per input event, in order: {'status': 'created', 'event': ...}
+        or {'status': 'error', 'error': ...}
+    """
+    try:
+        service = get_service('calendar', 'v3', credentials)
+        requests = [
+            service.events().insert(
+                calendarId=calendar_id,
+                body=_event_body(
+                    item['title'],
+                    item['start_time'],
+                    item.get('description', ''),
+                    item.get('duration_minutes', 60)
+                )
+            )
+            for item in events
+        ]
+        
+        return [
+            {'status': 'error', 'error': str(error)} if error is not None
+            else {'status': 'created', 'event': response}
+            for response, error in execute_batch(service, requests)
+        ]
         
-        return calendars
+    except Exception as e:
+        print(f"Error creating calendar events batch: {e}")
+        raise
+
+def iter_user_calendars(credentials: Credentials, page_size: int = 100) -> Iterator[Dict]:
+    """
+    Lazily iterate over the user's calendars, following nextPageToken
+    
+    Args:
+        credentials: Google OAuth credentials
+        page_size: Calendars per API page
+    
+    Yields:
+        Calendar dictionaries
+    """
+    service = get_service('calendar', 'v3', credentials)
+    
+    for calendar in iter_items(
+        service.calendarList().list,
+        CALENDAR_LIST_FIELDS,
+        maxResults=page_size
+    ):
+        yield {
+            'id': calendar['id'],
+            'summary': calendar['summary'],
+            'primary': calendar.get('primary', False),
+            'accessRole': calendar.get('accessRole')
+        }
+
+def get_user_calendars(credentials: Credentials) -> List[Dict]:
+    """
+    Get list of user's calendars
+    
+    Args:
+        credentials: Google OAuth credentials
+    
+    Returns:
+        List of calendar dictionaries
+    """
+    try:
+        return list(iter_user_calendars(credentials))
         
     except Exception as e:
         print(f"Error fetching calendars: {e}")
         raise
 
+def iter_upcoming_events(
+    credentials: Credentials,
+    calendar_id: str = 'primary',
+    page_size: int = 250
+) -> Iterator[Dict]:
+    """
+    Lazily iterate over upcoming events in start order, following nextPageToken
+    
+    Args:
+        credentials: Google OAuth credentials
+        calendar_id: Calendar ID (default: 'primary')
+        page_size: Events per API page
+    
+    Yields:
+        Event dictionaries (only the fields in EVENT_LIST_FIELDS)
+    """
+    service = get_service('calendar', 'v3', credentials)
+    
+    # Get current time in RFC3339 format
+    now = datetime.utcnow().isoformat() + 'Z'
+    
+    yield from iter_items(
+        service.events().list,
+        EVENT_LIST_FIELDS,
+        calendarId=calendar_id,
+        timeMin=now,
+        maxResults=page_size,
+        singleEvents=True,
+        orderBy='startTime'
+    )
+
 def get_upcoming_events(
     credentials: Credentials,
     max_results: int = 10,
@@ -108,22 +234,8 @@ def get_upcoming_events(
         List of event dictionaries
     """
     try:
-        service = build('calendar', 'v3', credentials=credentials)
-        
-        # Get current time in RFC3339 format
-        now = datetime.utcnow().isoformat() + 'Z'
-        
-        events_result = service.events().list(
-            calendarId=calendar_id,
-            timeMin=now,
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        
-        return events
+        events = iter_upcoming_events(credentials, calendar_id, page_size=min(max_results, 250))
+        return list(islice(events, max_results))
         
     except Exception as e:
         print(f"Error fetching events: {e}")
@@ -135,10 +247,12 @@ def update_calendar_event(
     title: str = None,
     start_time: datetime = None,
     description: str = None,
-    calendar_id: str = 'primary'
+    calendar_id: str = 'primary',
+    duration: timedelta = None,
+    etag: str = None
 ) -> Dict:
     """
-    Update an existing calendar event
+    Update an existing calendar event, sending only the changed fields
     
     Args:
         credentials: Google OAuth credentials
@@ -147,38 +261,42 @@ def update_calendar_event(
         start_time: New start time (optional)
         description: New description (optional)
         calendar_id: Calendar ID (default: 'primary')
+        duration: Event length to keep when moving it; fetched from Google
+            when not given (pass the mirrored value to save a round trip)
+        etag: Last known etag; the update fails with HTTP 412 if the event
+            has changed since
     
     Returns:
         Updated event dictionary
     """
     try:
-        service = build('calendar', 'v3', credentials=credentials)
-        
-        # Get existing event
-        event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+        service = get_service('calendar', 'v3', credentials)
         
-        # Update fields if provided
+        body = {}
         if title:
-            event['summary'] = title
+            body['summary'] = title
         
         if description is not None:
-            event['description'] = description
+            body['description'] = description
         
         if start_time:
-            duration = datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00')) - \
-                      datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00'))
+            if duration is None:
+                event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+                duration = datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00')) - \
+                          datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00'))
             
-            event['start']['dateTime'] = start_time.isoformat()
-            event['end']['dateTime'] = (start_time + duration).isoformat()
+            body['start'] = {'dateTime': start_time.isoformat(), 'timeZone': 'Asia/Tashkent'}
+            body['end'] = {'dateTime': (start_time + duration).isoformat(), 'timeZone': 'Asia/Tashkent'}
         
-        # Update event
-        updated_event = service.events().update(
+        request = service.events().patch(
             calendarId=calendar_id,
             eventId=event_id,
-            body=event
-        ).execute()
+            body=body
+        )
+        if etag:
+            request.headers['If-Match'] = etag
         
-        return updated_event
+        return request.execute()
         
     except Exception as e:
         print(f"Error updating event: {e}")
@@ -201,7 +319,7 @@ def delete_calendar_event(
         True if successful
     """
     try:
-        service = build('calendar', 'v3', credentials=credentials)
+        service = get_service('calendar', 'v3', credentials)
         
         service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
         
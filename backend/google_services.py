@@ -0,0 +1,164 @@
+import copy
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import Resource, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import UnknownApiNameOrVersion
+from googleapiclient.http import build_http
+
+from rate_limiter import MAX_RETRIES, RateLimitedHttp, is_rate_limit_error, rate_limiter, retry_after
+
+# Google accepts at most 50 calls per batch request
+BATCH_LIMIT = 50
+
+# Optional directory of pinned discovery documents ("<api>.<version>.json").
+# When a document is not found here, the copy bundled with
+# google-api-python-client is used; the network is never consulted.
+DISCOVERY_DIR = os.getenv(
+    'GOOGLE_DISCOVERY_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'discovery')
+)
+
+_documents: Dict[Tuple[str, str], Dict] = {}
+_templates: Dict[Tuple[str, str], Resource] = {}
+_lock = threading.Lock()
+
+
+def load_discovery_document(api: str, version: str) -> Dict:
+    """
+    Load and parse a discovery document once per process
+
+    Args:
+        api: API name, e.g. 'calendar'
+        version: API version, e.g. 'v3'
+
+    Returns:
+        Parsed discovery document
+    """
+    key = (api, version)
+    document = _documents.get(key)
+    if document is not None:
+        return document
+
+    path = os.path.join(DISCOVERY_DIR, f'{api}.{version}.json')
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            content = f.read()
+    else:
+        content = get_static_doc(api, version)
+    if content is None:
+        raise UnknownApiNameOrVersion(f"name: {api}  version: {version}")
+
+    document = json.loads(content)
+    _documents[key] = document
+    return document
+
+
+def _template(api: str, version: str) -> Resource:
+    key = (api, version)
+    template = _templates.get(key)
+    if template is None:
+        with _lock:
+            template = _templates.get(key)
+            if template is None:
+                template = build_from_document(
+                    load_discovery_document(api, version),
+                    http=build_http()
+                )
+                _templates[key] = template
+    return template
+
+
+def get_service(api: str, version: str, credentials: Credentials) -> Resource:
+    """
+    Drop-in replacement for googleapiclient.discovery.build()
+
+    The resource tree for (api, version) is built once; each call returns a
+    shallow copy bound to its own authorized HTTP object, so per-request
+    credentials never leak between users or threads.
+
+    Args:
+        api: API name, e.g. 'calendar'
+        version: API version, e.g. 'v3'
+        credentials: Google OAuth credentials to bind
+
+    Returns:
+        Service resource ready for requests
+    """
+    service = copy.copy(_template(api, version))
+    service._http = AuthorizedHttp(credentials, http=RateLimitedHttp(build_http()))
+    return service
+
+
+def preload(apis=(('calendar', 'v3'), ('tasks', 'v1'), ('oauth2', 'v2'))):
+    """Build the service templates up front so the first request doesn't pay for it"""
+    for api, version in apis:
+        _template(api, version)
+
+
+def execute_batch(service: Resource, requests: List) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+    """
+    Send requests built from service as Google batch calls
+
+    Each batch holds at most BATCH_LIMIT calls, and no more than the rate
+    limiter can admit at once (every call in a batch counts against quota).
+    Calls that come back rate limited are sent again in a later batch, with
+    the same backoff as single calls, up to GOOGLE_API_MAX_RETRIES times.
+
+    Returns:
+        (response, error) for every request, in the order given
+    """
+    results: List = [None] * len(requests)
+
+    def callback(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+
+    pending = list(range(len(requests)))
+    attempt = 0
+    while True:
+        size = min(BATCH_LIMIT, rate_limiter.max_batch())
+        for offset in range(0, len(pending), size):
+            chunk = pending[offset:offset + size]
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            # The transport charges the batch request itself as one call
+            if len(chunk) > 1:
+                rate_limiter.acquire(len(chunk) - 1)
+            batch.execute()
+
+        pending = [index for index in pending if is_rate_limit_error(results[index][1])]
+        if not pending:
+            return results
+        if attempt >= MAX_RETRIES:
+            rate_limiter.counters['exhausted'] += 1
+            return results
+
+        rate_limiter.counters['retries'] += 1
+        waits = [retry_after(results[index][1].resp) for index in pending]
+        time.sleep(rate_limiter.backoff_delay(attempt, max((w for w in waits if w), default=None)))
+        attempt += 1
+
+
+def iter_items(list_method: Callable, fields: str, **params) -> Iterator[Dict]:
+    """
+    Lazily yield the items of a paginated list call, one page at a time
+
+    Args:
+        list_method: Bound list method, e.g. service.events().list
+        fields: Partial-response mask; must include nextPageToken
+        **params: Arguments for list_method
+    """
+    while True:
+        page = list_method(fields=fields, **params).execute()
+        yield from page.get('items', [])
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+        params['pageToken'] = page_token
@@ -0,0 +1,35 @@
+"""
+Idempotency keys for the create endpoints.
+
+A client sends the same Idempotency-Key header when it retries a create (the
+bot derives it from chat_id:message_id, so redelivered Telegram updates reuse
+it). The first request stores its response under the key; repeats within
+IDEMPOTENCY_TTL get that response back without queueing another job.
+
+/api/calendar/batch creates its events inside the request instead, so its
+key is reserved (and committed) before the work starts and answered with 409
+while it runs. A failed request releases the key. A reservation left behind
+by a crashed process is taken over after IDEMPOTENCY_PENDING_TIMEOUT.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict
+
+from db import purge_expired_idempotency_keys
+
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24')))
+# A reservation still without a response after this long is presumed dead
+IDEMPOTENCY_PENDING_TIMEOUT = timedelta(minutes=5)
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(body: Dict) -> str:
+    """Stable hash of a request body, to catch a key reused for a different request"""
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def purge_expired_keys() -> int:
+    """Scheduler entry point"""
+    return purge_expired_idempotency_keys(datetime.utcnow())
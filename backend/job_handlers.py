@@ -0,0 +1,85 @@
+"""
+Job handlers for the create endpoints (see job_queue.py).
+
+Each handler runs on the blocking executor and returns the same response body
+the endpoint used to return synchronously. Created items are recorded in the
+local tables through the write-behind buffer.
+"""
+import base64
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict
+
+from googleapiclient.errors import HttpError
+
+from auth import get_google_credentials
+from google_calendar import create_calendar_event, get_calendar_event
+from job_queue import PermanentJobError, current_job, register
+from notes import create_keep_note, find_recent_note
+from write_behind import write_behind
+
+
+# Allowance for clock skew between us and Google when matching retried creates
+RETRY_MATCH_SKEW = timedelta(minutes=1)
+
+
+def new_event_id() -> str:
+    """Random Google Calendar event ID (base32hex, as the API requires)"""
+    return base64.b32hexencode(uuid.uuid4().bytes).decode().rstrip('=').lower()
+
+
+def _credentials(user_id: int):
+    creds = get_google_credentials(user_id)
+    if not creds:
+        # Expired, revoked or under-scoped tokens; the bot asks the user to log in again
+        raise PermanentJobError("User not authenticated", code='unauthenticated')
+    return creds
+
+
+@register('calendar.create')
+def create_calendar_event_job(user_id: int, payload: Dict) -> Dict:
+    creds = _credentials(user_id)
+    try:
+        event = create_calendar_event(
+            creds,
+            title=payload['title'],
+            start_time=datetime.fromisoformat(payload['datetime']),
+            description=payload.get('description', ''),
+            event_id=payload['event_id']
+        )
+    except HttpError as e:
+        if e.resp.status != 409:
+            raise
+        # An earlier attempt created it before failing to record the result
+        event = get_calendar_event(creds, payload['event_id'])
+
+    write_behind.record_events(user_id, [event])
+    return {
+        "status": "created",
+        "event_id": event.get('id'),
+        "link": event.get('htmlLink')
+    }
+
+
+@register('notes.create')
+def create_note_job(user_id: int, payload: Dict) -> Dict:
+    creds = _credentials(user_id)
+    job = current_job.get()
+    note = None
+    if job and job['attempts'] > 1:
+        # An earlier attempt may have created it before its lease ran out
+        note = find_recent_note(
+            creds, payload['title'], payload.get('content', ''), job['created_at'] - RETRY_MATCH_SKEW
+        )
+    if note is None:
+        note = create_keep_note(creds, title=payload['title'], content=payload.get('content', ''))
+    write_behind.record_notes(user_id, [{
+        'id': note.get('name'),
+        'title': payload['title'],
+        'content': payload.get('content', ''),
+        'status': note.get('status'),
+    }])
+    return {
+        "status": "created",
+        "note_id": note.get('name')
+    }
@@ -0,0 +1,216 @@
+"""
+Durable job queue on the Postgres ``jobs`` table.
+
+Endpoints enqueue work and return a job id at once; JobWorker (one per
+backend process) leases runnable jobs with FOR UPDATE SKIP LOCKED, so any
+number of replicas can share the queue. A job runs its registered handler on
+the blocking executor. Transient failures are retried with exponential
+backoff up to the job's max_attempts; permanent failures and exhausted
+retries end in the 'dead' state with the last error kept for inspection.
+
+While a job runs (including time spent queued on the executor or waiting on
+the rate limiter) its lease is renewed every JOB_LEASE_SECONDS / 3, and its
+outcome is only recorded if this attempt still holds it. A job can still run
+twice if its worker stalls for longer than a lease, so handlers must be
+idempotent; current_job tells them which attempt they are.
+"""
+import asyncio
+import contextvars
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set
+
+from googleapiclient.errors import HttpError
+
+from db import (
+    claim_jobs_async, complete_job_async, enqueue_job_async, extend_job_lease_async, fail_job_async,
+    purge_finished_jobs,
+)
+from executor import ExecutorSaturated, executor
+from rate_limiter import RateLimited, is_rate_limit_error
+
+# Jobs run at once by this process (0 = this replica only enqueues)
+JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', '8'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+# A running job whose worker disappears (stops renewing its lease) is retried
+# after this many seconds
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '120'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE = float(os.getenv('JOB_RETRY_BASE', '5'))
+JOB_RETRY_MAX = float(os.getenv('JOB_RETRY_MAX', '300'))
+# Finished (succeeded/dead) jobs are purged after this many days
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+# How long shutdown waits for running jobs before leaving them to the lease
+JOB_SHUTDOWN_GRACE = 10
+
+
+# The job (id, attempts, created_at, ...) a handler is running for
+current_job: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar('current_job', default=None)
+
+
+class PermanentJobError(Exception):
+    """
+    A failure that retrying cannot fix (e.g. the user revoked access)
+
+    code, if given, is exposed to clients as the dead job's error_code.
+    """
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.code = code
+
+
+_handlers: Dict[str, Callable[[int, Dict], Dict]] = {}
+
+
+def register(kind: str):
+    """Decorator registering a blocking handler(user_id, payload) -> result dict"""
+    def decorator(fn: Callable[[int, Dict], Dict]):
+        _handlers[kind] = fn
+        return fn
+    return decorator
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, PermanentJobError):
+        return False
+    if isinstance(error, (RateLimited, ExecutorSaturated)) or is_rate_limit_error(error):
+        return True
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500 or error.resp.status == 408
+    return not isinstance(error, (ValueError, KeyError, TypeError))
+
+
+def retry_delay(attempts: int) -> float:
+    return min(JOB_RETRY_MAX, JOB_RETRY_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+
+class JobWorker:
+    def __init__(self, concurrency: int = JOB_CONCURRENCY):
+        self.concurrency = concurrency
+        self._running: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.counters = {'claimed': 0, 'succeeded': 0, 'retried': 0, 'dead': 0, 'superseded': 0}
+
+    async def enqueue(self, user_id: int, kind: str, payload: Dict,
+                      max_attempts: int = JOB_MAX_ATTEMPTS, conn=None) -> int:
+        """
+        Add a job; with conn, inside the caller's transaction (call notify()
+        after it commits)
+        """
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = await enqueue_job_async(user_id, kind, payload, max_attempts, conn=conn)
+        if conn is None:
+            self.notify()
+        return job_id
+
+    def notify(self):
+        """Start new jobs here right away instead of at the next poll"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        if self.concurrency > 0 and self._loop_task is None:
+            self._wake = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._loop(), name='job-worker')
+
+    async def stop(self):
+        if self._loop_task is None:
+            return
+        self._loop_task.cancel()
+        try:
+            await self._loop_task
+        except asyncio.CancelledError:
+            pass
+        self._loop_task = None
+        if self._running:
+            # Unfinished jobs stay 'running' and are re-leased once their lease expires
+            await asyncio.wait(self._running, timeout=JOB_SHUTDOWN_GRACE)
+
+    async def _loop(self):
+        while True:
+            free = self.concurrency - len(self._running)
+            jobs = []
+            if free > 0:
+                try:
+                    jobs = await claim_jobs_async(free, JOB_LEASE_SECONDS)
+                except Exception as e:
+                    print(f"Claiming jobs failed: {e}")
+
+            self.counters['claimed'] += len(jobs)
+            for job in jobs:
+                task = asyncio.create_task(self._run(job))
+                self._running.add(task)
+                task.add_done_callback(self._job_done)
+
+            if free > 0 and len(jobs) == free:
+                continue  # more may be waiting
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _job_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if self._wake is not None:
+            self._wake.set()  # a slot is free
+
+    async def _heartbeat(self, job: Dict):
+        """Keep renewing job's lease until cancelled or another attempt took it"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                if not await extend_job_lease_async(job['id'], job['attempts'], JOB_LEASE_SECONDS):
+                    print(f"Job {job['id']} attempt {job['attempts']} lost its lease")
+                    return
+            except Exception as e:
+                print(f"Renewing lease of job {job['id']} failed: {e}")
+
+    async def _run(self, job: Dict):
+        user_id = job['user_id']
+        current_job.set(job)  # copied into the executor thread with the context
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            handler = _handlers.get(job['kind'])
+            if handler is None:
+                raise PermanentJobError(f"Unknown job kind: {job['kind']}")
+            result = await executor.run(handler, user_id, job['payload'], user_id=user_id)
+        except Exception as e:
+            retry = is_transient(e) and job['attempts'] < job['max_attempts']
+            retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(job['attempts'])) if retry else None
+            print(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}: {e}")
+            try:
+                recorded = await fail_job_async(
+                    job['id'], job['attempts'], str(e), retry_at, getattr(e, 'code', None)
+                )
+                self.counters[('retried' if retry else 'dead') if recorded else 'superseded'] += 1
+            except Exception as db_error:
+                print(f"Recording failure of job {job['id']} failed: {db_error}")
+            return
+        finally:
+            heartbeat.cancel()
+
+        try:
+            recorded = await complete_job_async(job['id'], job['attempts'], result)
+            self.counters['succeeded' if recorded else 'superseded'] += 1
+        except Exception as e:
+            print(f"Recording result of job {job['id']} failed: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            'concurrency': self.concurrency,
+            'running': len(self._running),
+            **self.counters,
+        }
+
+
+def purge_old_jobs() -> int:
+    """Scheduler entry point: delete finished jobs older than JOB_RETENTION_DAYS"""
+    return purge_finished_jobs(datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS))
+
+
+job_worker = JobWorker()
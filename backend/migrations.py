@@ -0,0 +1,240 @@
+"""
+Versioned schema migrations.
+
+Each migration is applied once and recorded in ``schema_migrations``. When the
+database is already at the latest version, ``migrate()`` costs two small queries
+and runs no DDL, so it is cheap to call on every startup.
+"""
+from typing import Callable, List, Tuple, Union
+
+from db_pool import get_pool
+from partitions import partition_if_empty
+
+# Arbitrary constant used with pg_advisory_xact_lock so that only one
+# replica applies migrations at a time.
+MIGRATION_LOCK_ID = 7_315_202_501
+
+# Indexes serving the hot read paths in db.py:
+#   get_user_events  -> WHERE user_id ORDER BY start_time DESC
+#   get_user_notes   -> WHERE user_id ORDER BY created_at DESC
+#   partitions.delete_expired_rows -> WHERE created_at < ... (unpartitioned installs)
+HOT_PATH_INDEXES = [
+    ('idx_events_user_start', 'events', 'user_id, start_time DESC'),
+    ('idx_events_created', 'events', 'created_at'),
+    ('idx_notes_user_created', 'notes', 'user_id, created_at DESC'),
+    ('idx_notes_created', 'notes', 'created_at'),
+]
+
+
+def index_ddl(name: str, table: str, columns: str) -> str:
+    return f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})'
+
+
+MIGRATIONS: List[Tuple[int, str, List[Union[str, Callable]]]] = [
+    (1, 'base tables', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            email TEXT,
+            tokens JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS events (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            event_id TEXT,
+            title TEXT,
+            start_time TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notes (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            note_id TEXT,
+            title TEXT,
+            content TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS preferences (
+            user_id BIGINT PRIMARY KEY,
+            language TEXT DEFAULT 'uz',
+            timezone TEXT DEFAULT 'Asia/Tashkent',
+            notifications BOOLEAN DEFAULT TRUE,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        ''',
+    ]),
+    (2, 'hot-path indexes on events and notes', [
+        index_ddl(*index) for index in HOT_PATH_INDEXES
+    ]),
+    (3, 'token expiry index for the background refresher', [
+        # Expiry is stored as a naive-UTC ISO string, so C-collated text order is time order
+        index_ddl('idx_users_token_expiry', 'users', "(tokens->>'expiry') COLLATE \"C\""),
+    ]),
+    (4, 'calendar mirror columns and sync state', [
+        '''
+        ALTER TABLE events
+            ADD COLUMN IF NOT EXISTS description TEXT,
+            ADD COLUMN IF NOT EXISTS end_time TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS all_day BOOLEAN DEFAULT FALSE,
+            ADD COLUMN IF NOT EXISTS status TEXT,
+            ADD COLUMN IF NOT EXISTS html_link TEXT,
+            ADD COLUMN IF NOT EXISTS etag TEXT,
+            ADD COLUMN IF NOT EXISTS updated TIMESTAMP
+        ''',
+        # Incremental sync deletes and re-inserts changed events by id
+        index_ddl('idx_events_user_event', 'events', 'user_id, event_id'),
+        '''
+        CREATE TABLE IF NOT EXISTS calendar_sync_state (
+            user_id BIGINT PRIMARY KEY,
+            sync_token TEXT,
+            synced_at TIMESTAMP,
+            full_synced_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        ''',
+    ]),
+    (5, 'notes mirror columns and sync state', [
+        '''
+        ALTER TABLE notes
+            ADD COLUMN IF NOT EXISTS status TEXT,
+            ADD COLUMN IF NOT EXISTS due TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS etag TEXT,
+            ADD COLUMN IF NOT EXISTS updated TIMESTAMP
+        ''',
+        index_ddl('idx_notes_user_note', 'notes', 'user_id, note_id'),
+        index_ddl('idx_notes_user_updated', 'notes', 'user_id, updated DESC'),
+        # Word-prefix search over title and content (see db.search_user_notes_async)
+        '''
+        CREATE INDEX IF NOT EXISTS idx_notes_search ON notes
+        USING GIN (to_tsvector('simple', COALESCE(title, '') || ' ' || COALESCE(content, '')))
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notes_sync_state (
+            user_id BIGINT PRIMARY KEY,
+            updated_min TEXT,
+            synced_at TIMESTAMP,
+            full_synced_at TIMESTAMP,
+            active_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        ''',
+        index_ddl('idx_notes_sync_active', 'notes_sync_state', 'active_at'),
+    ]),
+    (6, 'durable job queue', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            user_id BIGINT,
+            kind TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at TIMESTAMP NOT NULL,
+            locked_until TIMESTAMP,
+            result JSONB,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+        ''',
+        # db.claim_jobs: ready jobs, and running jobs whose worker lease expired
+        "CREATE INDEX IF NOT EXISTS idx_jobs_queued ON jobs (run_at) WHERE status = 'queued'",
+        "CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs (locked_until) WHERE status = 'running'",
+        # db.purge_finished_jobs
+        index_ddl('idx_jobs_updated', 'jobs', 'updated_at'),
+    ]),
+    (7, 'idempotency keys for create endpoints', [
+        '''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            user_id BIGINT NOT NULL,
+            endpoint TEXT NOT NULL,
+            key TEXT NOT NULL,
+            request_hash TEXT NOT NULL,
+            response JSONB,
+            created_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (user_id, endpoint, key)
+        )
+        ''',
+        # db.purge_expired_idempotency_keys
+        index_ddl('idx_idempotency_expires', 'idempotency_keys', 'expires_at'),
+    ]),
+    (8, 'recently created events', [
+        # db.get_recent_events_async (notes use idx_notes_user_created)
+        index_ddl('idx_events_user_created', 'events', 'user_id, created_at DESC'),
+    ]),
+    (9, 'monthly partitions for events and notes (empty tables only)', [
+        partition_if_empty('events'),
+        partition_if_empty('notes'),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor) -> int:
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_migrations')
+    return cursor.fetchone()[0]
+
+
+def migrate() -> int:
+    """
+    Bring the schema up to LATEST_VERSION
+
+    Returns:
+        Number of migrations applied (0 when the schema was already current)
+    """
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            if current_version(cursor) >= LATEST_VERSION:
+                return 0
+
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Another replica may have migrated while we waited for the lock
+            version = current_version(cursor)
+
+            applied = 0
+            for number, description, statements in MIGRATIONS:
+                if number <= version:
+                    continue
+                for statement in statements:
+                    # Steps that need to inspect the database are callables
+                    if callable(statement):
+                        statement(cursor)
+                    else:
+                        cursor.execute(statement)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version, description) VALUES (%s, %s)',
+                    (number, description)
+                )
+                print(f"Applied migration {number}: {description}")
+                applied += 1
+
+            return applied
+
+
+if __name__ == '__main__':
+    count = migrate()
+    print(f"Schema at version {LATEST_VERSION} ({count} migrations applied)")
@@ -0,0 +1,177 @@
+"""
+Routing of note creation to whichever note backend actually works.
+
+Backends are tried in NOTES_BACKENDS order, skipping any whose supports()
+check rejects the caller's credentials (e.g. Keep without the Keep scope).
+Whether a backend works at all is learned from real calls: one failing with
+an "unsupported" error (API not enabled, unknown API) marks the backend
+unavailable, and it is skipped until NOTES_BACKEND_REPROBE_INTERVAL seconds
+later, when the next call re-probes it. Neither API offers a
+credential-free check that would tell more than a call does.
+
+Outages (as told by the backend's is_outage: 5xx, timeouts, connection
+errors) feed a per-backend circuit breaker, which stops routing to a backend after
+NOTES_BREAKER_THRESHOLD consecutive failures and lets a single trial call
+through once NOTES_BREAKER_COOLDOWN has passed. Anything else (a revoked
+token, the user's rate limit, a bad request) is about this one call, so it is
+raised to the caller at once and leaves the breaker alone; the breaker is
+shared by all users.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+NOTES_BACKENDS = [
+    name.strip() for name in os.getenv('NOTES_BACKENDS', 'tasks').split(',') if name.strip()
+]
+REPROBE_INTERVAL = int(os.getenv('NOTES_BACKEND_REPROBE_INTERVAL', '3600'))
+BREAKER_THRESHOLD = int(os.getenv('NOTES_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = int(os.getenv('NOTES_BREAKER_COOLDOWN', '60'))
+
+
+class NoBackendAvailable(Exception):
+    """Raised when every configured note backend is unavailable or tripped"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half-open -> closed)"""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'  # exactly one trial call goes through
+                return True
+            return False
+
+    def reset(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def release_trial(self):
+        """The trial call ended without telling whether the backend is up; allow another"""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'  # opened_at is past the cooldown, so the next call is a trial
+
+    def record_success(self):
+        self.reset()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {'breaker': self.state, 'consecutive_failures': self.failures}
+
+
+class NoteBackend:
+    def __init__(
+        self,
+        name: str,
+        create: Callable,
+        is_unsupported: Callable[[Exception], bool] = lambda e: False,
+        supports: Callable[[Any], bool] = lambda credentials: True,
+        is_outage: Callable[[Exception], bool] = lambda e: True
+    ):
+        self.name = name
+        self.create = create
+        self.is_unsupported = is_unsupported
+        self.supports = supports
+        self.is_outage = is_outage
+        self.breaker = CircuitBreaker()
+        # None = not called yet; otherwise whether the last call found it supported
+        self.available: Optional[bool] = None
+        self.checked_at = 0.0
+        self.counters = {'calls': 0, 'failures': 0, 'skipped': 0}
+
+
+class BackendRegistry:
+    """Capability registry that routes each call straight to a working backend"""
+
+    def __init__(self, order: List[str] = NOTES_BACKENDS, reprobe_interval: float = REPROBE_INTERVAL):
+        self.order = order
+        self.reprobe_interval = reprobe_interval
+        self._backends: Dict[str, NoteBackend] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, create: Callable,
+                 is_unsupported: Callable[[Exception], bool] = lambda e: False,
+                 supports: Callable[[Any], bool] = lambda credentials: True,
+                 is_outage: Callable[[Exception], bool] = lambda e: True):
+        self._backends[name] = NoteBackend(name, create, is_unsupported, supports, is_outage)
+
+    def _mark(self, backend: NoteBackend, available: bool):
+        with self._lock:
+            backend.available = available
+            backend.checked_at = time.monotonic()
+
+    def _usable(self, backend: NoteBackend) -> bool:
+        with self._lock:
+            if backend.available is False:
+                if time.monotonic() - backend.checked_at < self.reprobe_interval:
+                    return False
+                # Due for a re-probe: let this call try it, push the next retry out
+                backend.checked_at = time.monotonic()
+        return backend.breaker.allow()
+
+    def create(self, credentials, *args, **kwargs):
+        """Call create on the first usable backend, falling through on unsupported or outage errors"""
+        last_error: Optional[Exception] = None
+        for name in self.order:
+            backend = self._backends.get(name)
+            if backend is None:
+                continue
+            if not backend.supports(credentials) or not self._usable(backend):
+                backend.counters['skipped'] += 1
+                continue
+
+            backend.counters['calls'] += 1
+            try:
+                result = backend.create(credentials, *args, **kwargs)
+            except Exception as e:
+                backend.counters['failures'] += 1
+                last_error = e
+                if backend.is_unsupported(e):
+                    print(f"Note backend {name} unsupported, skipping it: {e}")
+                    self._mark(backend, False)
+                    backend.breaker.reset()  # availability, not the breaker, keeps it out now
+                elif backend.is_outage(e):
+                    backend.breaker.record_failure()
+                else:
+                    backend.breaker.release_trial()
+                    raise
+                continue
+
+            backend.breaker.record_success()
+            if backend.available is not True:
+                self._mark(backend, True)
+            return result
+
+        if last_error is not None:
+            raise last_error
+        raise NoBackendAvailable("No note backend is available")
+
+    def stats(self) -> Dict:
+        return {
+            name: {
+                'available': backend.available,
+                **backend.breaker.stats(),
+                **backend.counters,
+            }
+            for name, backend in self._backends.items()
+        }
@@ -1,6 +1,17 @@
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from typing import Dict, List
+from googleapiclient.errors import HttpError, UnknownApiNameOrVersion
+from httplib2 import HttpLib2Error
+from google_services import execute_batch, get_service, iter_items
+from note_backends import BackendRegistry
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterator, List, Optional
+
+# Workspace-only; not in auth.SCOPES, so add it there before enabling keep
+KEEP_SCOPE = 'https://www.googleapis.com/auth/keep'
+
+# Partial-response mask: only what the bot and API responses display
+NOTE_LIST_FIELDS = 'nextPageToken,items(id,title,notes,status,updated)'
 
 def create_keep_note(
     credentials: Credentials,
@@ -8,11 +19,11 @@ def create_keep_note(
     content: str = ""
 ) -> Dict:
     """
-    Create a Google Keep note
+    Create a note on the first working note backend
     
-    Note: Google Keep API is limited. This implementation uses the Keep Notes API
-    which may require additional setup. Alternatively, you can use gkeepapi library
-    for unofficial access.
+    Backends are tried in NOTES_BACKENDS order ("tasks" by default). Keep,
+    when configured, is only tried with credentials granted the Keep scope
+    and is skipped after its API rejects the project (see note_backends.py).
     
     Args:
         credentials: Google OAuth credentials
@@ -23,29 +34,55 @@ def create_keep_note(
         Created note dictionary
     """
     try:
-        # Using Google Keep API (if available)
-        # Note: Official Keep API is not publicly available yet
-        # This is a placeholder implementation
-        
-        service = build('keep', 'v1', credentials=credentials)
-        
-        note_body = {
-            'title': title,
-            'body': {
-                'text': {
-                    'text': content
-                }
+        return note_backend_registry.create(credentials, title, content)
+    except Exception as e:
+        print(f"Error creating note: {e}")
+        raise
+
+def create_keep_api_note(
+    credentials: Credentials,
+    title: str,
+    content: str
+) -> Dict:
+    """
+    Create a note with the Google Keep API (Workspace projects only)
+    
+    Args:
+        credentials: Google OAuth credentials
+        title: Note title
+        content: Note content
+    
+    Returns:
+        Created note dictionary
+    """
+    service = get_service('keep', 'v1', credentials)
+    
+    note_body = {
+        'title': title,
+        'body': {
+            'text': {
+                'text': content
             }
         }
-        
-        note = service.notes().create(body=note_body).execute()
-        
-        return note
-        
-    except Exception as e:
-        print(f"Error creating Keep note: {e}")
-        # Fallback: Create as a task or use alternative method
-        return create_keep_note_fallback(credentials, title, content)
+    }
+    
+    return service.notes().create(body=note_body).execute()
+
+def _has_keep_scope(credentials: Credentials) -> bool:
+    """Keep is only worth calling with tokens that were granted its scope"""
+    return KEEP_SCOPE in (credentials.scopes or ())
+
+def _is_outage(error: Exception) -> bool:
+    """Errors meaning the API itself is failing, not just this user's request"""
+    if isinstance(error, HttpError):
+        return error.resp.status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError, HttpLib2Error))
+
+def _keep_unsupported(error: Exception) -> bool:
+    """Errors meaning the Keep API can't be used by this project at all"""
+    if isinstance(error, UnknownApiNameOrVersion):
+        return True
+    return isinstance(error, HttpError) and error.resp.status in (403, 404)
 
 def create_keep_note_fallback(
     credentials: Credentials,
@@ -65,7 +102,7 @@ def create_keep_note_fallback(
         Created task dictionary
     """
     try:
-        service = build('tasks', 'v1', credentials=credentials)
+        service = get_service('tasks', 'v1', credentials)
         
         task_body = {
             'title': title,
@@ -89,6 +126,80 @@ def create_keep_note_fallback(
         print(f"Error creating task: {e}")
         raise
 
+note_backend_registry = BackendRegistry()
+note_backend_registry.register(
+    'keep',
+    create_keep_api_note,
+    is_unsupported=_keep_unsupported,
+    supports=_has_keep_scope,
+    is_outage=_is_outage
+)
+note_backend_registry.register('tasks', create_keep_note_fallback, is_outage=_is_outage)
+
+def iter_keep_notes(credentials: Credentials, page_size: int = 100) -> Iterator[Dict]:
+    """
+    Lazily iterate over Keep notes (tasks as fallback), following nextPageToken
+    
+    Args:
+        credentials: Google OAuth credentials
+        page_size: Notes per API page (at most 100)
+    
+    Yields:
+        Note dictionaries
+    """
+    service = get_service('tasks', 'v1', credentials)
+    
+    for task in iter_items(
+        service.tasks().list,
+        NOTE_LIST_FIELDS,
+        tasklist='@default',
+        maxResults=page_size
+    ):
+        yield {
+            'id': task['id'],
+            'title': task['title'],
+            'content': task.get('notes', ''),
+            'status': task.get('status'),
+            'updated': task.get('updated')
+        }
+
+def find_recent_note(credentials: Credentials, title: str, content: str, since: datetime) -> Optional[Dict]:
+    """
+    Find a task with this title and content updated since the given time
+    
+    Used when a create job is retried: an earlier attempt may have created
+    the note before losing its lease. Tasks carry no field for a client
+    token, so the match is by title, content and modification time.
+    
+    Args:
+        credentials: Google OAuth credentials
+        title: Note title
+        content: Note content
+        since: Naive UTC time before the first attempt started
+    
+    Returns:
+        Note dictionary shaped like create_keep_note_fallback's, or None
+    """
+    service = get_service('tasks', 'v1', credentials)
+    
+    for task in iter_items(
+        service.tasks().list,
+        NOTE_LIST_FIELDS,
+        tasklist='@default',
+        maxResults=100,
+        updatedMin=since.isoformat() + 'Z',
+        showCompleted=True,
+        showHidden=True
+    ):
+        if task.get('title') == title and task.get('notes', '') == content:
+            return {
+                'name': task['id'],
+                'title': task['title'],
+                'notes': task.get('notes', ''),
+                'status': task.get('status')
+            }
+    return None
+
 def list_keep_notes(credentials: Credentials, max_results: int = 10) -> List[Dict]:
     """
     List Keep notes (or tasks as fallback)
@@ -101,26 +212,8 @@ def list_keep_notes(credentials: Credentials, max_results: int = 10) -> List[Dic
         List of note dictionaries
     """
     try:
-        service = build('tasks', 'v1', credentials=credentials)
-        
-        results = service.tasks().list(
-            tasklist='@default',
-            maxResults=max_results
-        ).execute()
-        
-        tasks = results.get('items', [])
-        
-        notes = []
-        for task in tasks:
-            notes.append({
-                'id': task['id'],
-                'title': task['title'],
-                'content': task.get('notes', ''),
-                'status': task.get('status'),
-                'updated': task.get('updated')
-            })
-        
-        return notes
+        notes = iter_keep_notes(credentials, page_size=min(max_results, 100))
+        return list(islice(notes, max_results))
         
     except Exception as e:
         print(f"Error listing notes: {e}")
@@ -130,54 +223,130 @@ def update_keep_note(
     credentials: Credentials,
     note_id: str,
     title: str = None,
-    content: str = None
+    content: str = None,
+    etag: str = None
 ) -> Dict:
     """
-    Update a Keep note (or task as fallback)
+    Update a Keep note (or task as fallback), sending only the changed fields
     
     Args:
         credentials: Google OAuth credentials
         note_id: Note ID to update
         title: New title (optional)
         content: New content (optional)
+        etag: Last known etag; the update fails with HTTP 412 if the note
+            has changed since
     
     Returns:
         Updated note dictionary
     """
     try:
-        service = build('tasks', 'v1', credentials=credentials)
+        service = get_service('tasks', 'v1', credentials)
         
-        # Get existing task
-        task = service.tasks().get(
-            tasklist='@default',
-            task=note_id
-        ).execute()
-        
-        # Update fields if provided
+        body = {}
         if title:
-            task['title'] = title
+            body['title'] = title
         
         if content is not None:
-            task['notes'] = content
+            body['notes'] = content
         
-        # Update task
-        updated_task = service.tasks().update(
+        request = service.tasks().patch(
             tasklist='@default',
             task=note_id,
-            body=task
-        ).execute()
+            body=body
+        )
+        if etag:
+            request.headers['If-Match'] = etag
         
-        return {
-            'id': updated_task['id'],
-            'title': updated_task['title'],
-            'content': updated_task.get('notes', ''),
-            'status': updated_task.get('status')
-        }
+        return _note_dict(request.execute())
         
     except Exception as e:
         print(f"Error updating note: {e}")
         raise
 
+def _note_dict(task: Dict) -> Dict:
+    return {
+        'id': task['id'],
+        'title': task['title'],
+        'content': task.get('notes', ''),
+        'status': task.get('status'),
+        'etag': task.get('etag'),
+        'updated': task.get('updated')
+    }
+
+NOTE_OPERATIONS = ('create', 'update', 'complete', 'delete')
+
+def _operation_request(service, operation: Dict):
+    """Build the Tasks API request for one bulk operation (ValueError if invalid)"""
+    op = operation.get('op')
+    note_id = operation.get('note_id')
+    if op not in NOTE_OPERATIONS:
+        raise ValueError(f"Unknown operation: {op}")
+    if op != 'create' and not note_id:
+        raise ValueError(f"note_id is required for {op}")
+    
+    if op == 'create':
+        return service.tasks().insert(
+            tasklist='@default',
+            body={'title': operation.get('title') or '', 'notes': operation.get('content') or ''}
+        )
+    if op == 'delete':
+        return service.tasks().delete(tasklist='@default', task=note_id)
+    
+    if op == 'complete':
+        body = {'status': 'completed'}
+    else:
+        body = {}
+        if operation.get('title'):
+            body['title'] = operation['title']
+        if operation.get('content') is not None:
+            body['notes'] = operation['content']
+    return service.tasks().patch(tasklist='@default', task=note_id, body=body)
+
+def batch_note_operations(credentials: Credentials, operations: List[Dict]) -> List[Dict]:
+    """
+    Create, update, complete or delete many notes with Google batch requests
+    
+    Args:
+        credentials: Google OAuth credentials
+        operations: Dicts with 'op' (create/update/complete/delete) and, as
+            needed, 'note_id', 'title' and 'content'
+    
+    Returns:
+        One result per operation, in order: {'status': 'ok', 'op', 'note_id',
+        'note'} ('note' is None for deletes) or {'status': 'error', 'op', 'error'}
+    """
+    try:
+        service = get_service('tasks', 'v1', credentials)
+        
+        results: List[Dict] = [None] * len(operations)
+        requests, positions = [], []
+        for index, operation in enumerate(operations):
+            try:
+                requests.append(_operation_request(service, operation))
+                positions.append(index)
+            except ValueError as e:
+                results[index] = {'status': 'error', 'op': operation.get('op'), 'error': str(e)}
+        
+        for index, (response, error) in zip(positions, execute_batch(service, requests)):
+            op = operations[index]['op']
+            if error is not None:
+                results[index] = {'status': 'error', 'op': op, 'error': str(error)}
+            else:
+                note = _note_dict(response) if op != 'delete' else None
+                results[index] = {
+                    'status': 'ok',
+                    'op': op,
+                    'note_id': note['id'] if note else operations[index]['note_id'],
+                    'note': note
+                }
+        
+        return results
+        
+    except Exception as e:
+        print(f"Error running note batch: {e}")
+        raise
+
 def delete_keep_note(credentials: Credentials, note_id: str) -> bool:
     """
     Delete a Keep note (or task as fallback)
@@ -190,7 +359,7 @@ def delete_keep_note(credentials: Credentials, note_id: str) -> bool:
         True if successful
     """
     try:
-        service = build('tasks', 'v1', credentials=credentials)
+        service = get_service('tasks', 'v1', credentials)
         
         service.tasks().delete(
             tasklist='@default',
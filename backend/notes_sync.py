@@ -0,0 +1,167 @@
+"""
+Incremental mirror of each user's default Google Tasks list into the notes table.
+
+Notes created by the bot land in Google Tasks (see notes.create_keep_note_fallback).
+The first sync lists the whole task list; afterwards only tasks with
+``updated >= updated_min`` are fetched, with showDeleted/showHidden so deletions
+and cleared tasks come through too. ``updated_min`` is the newest ``updated``
+value Google has returned, so clock skew between us and Google doesn't matter.
+
+The scheduler only syncs users who touched notes within NOTES_SYNC_ACTIVE_WINDOW.
+"""
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from auth import get_google_credentials
+from calendar_sync import utc_naive
+from db import (
+    apply_note_changes,
+    get_notes_sync_candidates,
+    get_notes_sync_state,
+    save_notes_sync_state,
+    user_sync_lock,
+)
+from executor import current_user_id
+from google_services import get_service
+
+TASKLIST_ID = '@default'
+SYNC_PAGE_SIZE = 100
+SYNC_FIELDS = 'nextPageToken,items(id,title,notes,status,due,etag,updated,deleted)'
+# How often the scheduler refreshes active users (0 disables it)
+NOTES_SYNC_INTERVAL = int(os.getenv('NOTES_SYNC_INTERVAL', '120'))
+# Users who used notes within this many seconds count as active
+NOTES_SYNC_ACTIVE_WINDOW = int(os.getenv('NOTES_SYNC_ACTIVE_WINDOW', '86400'))
+NOTES_SYNC_BATCH_SIZE = int(os.getenv('NOTES_SYNC_BATCH_SIZE', '50'))
+
+sync_counters = {'full': 0, 'incremental': 0, 'skipped': 0, 'failed': 0}
+
+
+def note_row(task: Dict) -> Dict:
+    """Map a Google Tasks task to a notes table row"""
+    return {
+        'note_id': task['id'],
+        'title': task.get('title', ''),
+        'content': task.get('notes', ''),
+        'status': task.get('status'),
+        'due': utc_naive(task['due']) if task.get('due') else None,
+        'etag': task.get('etag'),
+        'updated': utc_naive(task['updated']) if task.get('updated') else None,
+    }
+
+
+def note_response(row: Dict) -> Dict:
+    """Shape a mirrored row like notes.list_keep_notes does"""
+    return {
+        'id': row['note_id'],
+        'title': row['title'],
+        'content': row['content'],
+        'status': row['status'],
+        'updated': row['updated'].isoformat() + 'Z' if row['updated'] else None,
+    }
+
+
+def mirror_notes(user_id: int, notes: List[Dict], removed_ids: List[str] = ()):
+    """
+    Write notes returned by notes.py (update_keep_note, batch_note_operations)
+    into the mirror right away, and drop removed_ids from it
+    """
+    rows = [note_row({**note, 'notes': note.get('content', '')}) for note in notes]
+    try:
+        with user_sync_lock(user_id, 'notes') as conn:
+            if get_notes_sync_state(user_id, conn=conn) is None:
+                return
+            apply_note_changes(user_id, rows, list(removed_ids), conn)
+    except Exception as e:
+        print(f"Error mirroring notes for {user_id}: {e}")
+
+
+def search_terms(query: str) -> List[str]:
+    """Split a search query into words the same way to_tsvector('simple') does"""
+    return re.findall(r'\w+', query.lower())
+
+
+def _fetch_changes(service, updated_min: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """Page through tasks.list and return (tasks, newest updated timestamp seen)"""
+    params = {
+        'tasklist': TASKLIST_ID,
+        'maxResults': SYNC_PAGE_SIZE,
+        'fields': SYNC_FIELDS,
+        'showCompleted': True,
+        'showHidden': True,
+    }
+    if updated_min:
+        params['updatedMin'] = updated_min
+        params['showDeleted'] = True
+
+    tasks, watermark = [], updated_min
+    while True:
+        page = service.tasks().list(**params).execute()
+        for task in page.get('items', []):
+            tasks.append(task)
+            # RFC 3339 timestamps from the same server compare correctly as text
+            if task.get('updated') and (watermark is None or task['updated'] > watermark):
+                watermark = task['updated']
+        if 'nextPageToken' not in page:
+            return tasks, watermark
+        params['pageToken'] = page['nextPageToken']
+
+
+def sync_user_notes(user_id: int, credentials=None) -> Dict:
+    """
+    Bring user_id's notes mirror up to date with Google Tasks
+
+    Returns:
+        Summary dict with the sync mode and number of changes received
+    """
+    credentials = credentials or get_google_credentials(user_id)
+    if not credentials:
+        return {'status': 'unauthenticated'}
+
+    service = get_service('tasks', 'v1', credentials)
+    state = get_notes_sync_state(user_id)
+    updated_min = state['updated_min'] if state else None
+    full = updated_min is None
+
+    tasks, watermark = _fetch_changes(service, updated_min)
+    rows, removed_ids = [], []
+    for task in tasks:
+        if task.get('deleted'):
+            removed_ids.append(task['id'])
+        else:
+            rows.append(note_row(task))
+
+    with user_sync_lock(user_id, 'notes') as conn:
+        # Same guard as calendar_sync: don't write over a newer concurrent sync
+        current = get_notes_sync_state(user_id, conn=conn)
+        if (current['updated_min'] if current else None) != updated_min:
+            sync_counters['skipped'] += 1
+            return {'status': 'superseded', 'mode': 'full' if full else 'incremental', 'changes': len(tasks)}
+
+        apply_note_changes(user_id, rows, removed_ids, conn, full=full)
+        save_notes_sync_state(user_id, watermark, full, conn)
+
+    mode = 'full' if full else 'incremental'
+    sync_counters[mode] += 1
+    return {'status': 'synced', 'mode': mode, 'changes': len(tasks)}
+
+
+def sync_active_users() -> int:
+    """Scheduler entry point: sync the stalest recently active users"""
+    now = datetime.utcnow()
+    user_ids = get_notes_sync_candidates(
+        active_since=now - timedelta(seconds=NOTES_SYNC_ACTIVE_WINDOW),
+        synced_before=now - timedelta(seconds=NOTES_SYNC_INTERVAL),
+        limit=NOTES_SYNC_BATCH_SIZE
+    )
+    for user_id in user_ids:
+        token = current_user_id.set(user_id)  # so the user's rate-limit bucket applies
+        try:
+            sync_user_notes(user_id)
+        except Exception as e:
+            sync_counters['failed'] += 1
+            print(f"Notes sync failed for {user_id}: {e}")
+        finally:
+            current_user_id.reset(token)
+    return len(user_ids)
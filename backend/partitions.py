@@ -0,0 +1,281 @@
+"""
+Monthly range partitions of the events and notes tables by created_at.
+
+Retention drops whole partitions (detach, then drop) instead of deleting rows,
+so expiring old cache takes a brief lock and leaves no bloat. Maintenance
+(scheduled from app.py) also creates the next PARTITION_PREMAKE_MONTHS
+partitions ahead of time; a DEFAULT partition catches anything outside them.
+
+Migration 9 partitions the tables while they are still empty (new installs).
+Populated tables stay as they are and fall back to deleting expired rows in
+CACHE_CLEANUP_CHUNK_SIZE batches, one short transaction each, until they are
+converted offline with:
+
+    python partitions.py convert
+
+Rows expire by created_at, which is when the row was written locally; users
+who lose rows get their mirror sync state reset so the next sync rebuilds it.
+"""
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from psycopg import sql
+
+from db_pool import get_pool
+
+PARTITIONED_TABLES = ('events', 'notes')
+# Rows older than this many days are dropped (0 keeps everything)
+CACHE_RETENTION_DAYS = int(os.getenv('CACHE_RETENTION_DAYS', '90'))
+PARTITION_PREMAKE_MONTHS = int(os.getenv('PARTITION_PREMAKE_MONTHS', '3'))
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '3600'))
+CACHE_CLEANUP_CHUNK_SIZE = int(os.getenv('CACHE_CLEANUP_CHUNK_SIZE', '5000'))
+# Give up on a partition DDL rather than queue every reader behind it
+DDL_LOCK_TIMEOUT = '5s'
+
+MONTH_SUFFIX = re.compile(r'_p(\d{4})_(\d{2})$')
+
+# Mirror state to reset when a user's rows in table are expired
+SYNC_STATE_RESETS = {
+    'events': 'UPDATE calendar_sync_state SET sync_token = NULL, synced_at = NULL WHERE user_id = ANY(%s)',
+    'notes': '''
+        UPDATE notes_sync_state SET updated_min = NULL, synced_at = NULL, full_synced_at = NULL
+        WHERE user_id = ANY(%s)
+    ''',
+}
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def monthly_partitions(cursor, table: str) -> Dict[datetime, str]:
+    """Month -> partition name, for partitions named by partition_name"""
+    cursor.execute('''
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+    ''', (table,))
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = MONTH_SUFFIX.search(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def _now(cursor) -> datetime:
+    """Database clock, the one created_at defaults to"""
+    cursor.execute('SELECT LOCALTIMESTAMP')
+    return cursor.fetchone()[0]
+
+
+def create_partition(cursor, table: str, month: datetime):
+    cursor.execute(sql.SQL(
+        'CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES FROM ({start}) TO ({end})'
+    ).format(
+        partition=sql.Identifier(partition_name(table, month)),
+        table=sql.Identifier(table),
+        start=sql.Literal(month.strftime('%Y-%m-%d')),
+        end=sql.Literal(add_months(month, 1).strftime('%Y-%m-%d')),
+    ))
+
+
+def _reset_sync_state(cursor, table: str, user_ids: Set[int]):
+    if user_ids:
+        cursor.execute(SYNC_STATE_RESETS[table], (list(user_ids),))
+
+
+def convert_table(cursor, table: str, only_if_empty: bool = False) -> bool:
+    """
+    Replace table with a partitioned copy holding the same rows, indexes,
+    sequence and foreign key, inside the caller's transaction
+
+    The table is locked exclusively while rows are copied, so run this on a
+    populated table only during a maintenance window.
+
+    Returns:
+        True if the table was converted
+    """
+    if is_partitioned(cursor, table):
+        return False
+    cursor.execute(sql.SQL('LOCK TABLE {} IN ACCESS EXCLUSIVE MODE').format(sql.Identifier(table)))
+    if only_if_empty:
+        cursor.execute(sql.SQL('SELECT EXISTS (SELECT 1 FROM {})').format(sql.Identifier(table)))
+        if cursor.fetchone()[0]:
+            print(f"{table} already has rows; run `python partitions.py convert` to partition it")
+            return False
+
+    cursor.execute('''
+        SELECT indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = %s AND indexname <> %s
+    ''', (table, f'{table}_pkey'))
+    index_definitions = [row[0] for row in cursor.fetchall()]
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', (table, 'id'))
+    sequence = cursor.fetchone()[0]
+
+    legacy = sql.Identifier(f'{table}_unpartitioned')
+    target = sql.Identifier(table)
+    cursor.execute(sql.SQL('ALTER TABLE {} RENAME TO {}').format(target, legacy))
+    cursor.execute(sql.SQL(
+        'CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+    ).format(target, legacy))
+    cursor.execute(sql.SQL('ALTER TABLE {} ALTER COLUMN created_at SET NOT NULL').format(target))
+    if sequence:
+        cursor.execute(sql.SQL('ALTER SEQUENCE {} OWNED BY {}.id').format(sql.SQL(sequence), target))
+
+    now = _now(cursor)
+    cursor.execute(sql.SQL('SELECT MIN(created_at) FROM {}').format(legacy))
+    month = month_start(cursor.fetchone()[0] or now)
+    last = add_months(month_start(now), PARTITION_PREMAKE_MONTHS)
+    while month <= last:
+        create_partition(cursor, table, month)
+        month = add_months(month, 1)
+    cursor.execute(sql.SQL('CREATE TABLE {} PARTITION OF {} DEFAULT').format(
+        sql.Identifier(f'{table}_default'), target
+    ))
+
+    cursor.execute(sql.SQL('UPDATE {} SET created_at = %s WHERE created_at IS NULL').format(legacy), (now,))
+    cursor.execute(sql.SQL('INSERT INTO {} SELECT * FROM {}').format(target, legacy))
+    cursor.execute(sql.SQL('DROP TABLE {}').format(legacy))
+    # Constraint and index names are free again now that the old table is gone;
+    # the index definitions name the table, which is the partitioned one again
+    cursor.execute(sql.SQL('ALTER TABLE {} ADD PRIMARY KEY (id, created_at)').format(target))
+    cursor.execute(sql.SQL(
+        'ALTER TABLE {} ADD FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE'
+    ).format(target))
+    for definition in index_definitions:
+        cursor.execute(definition)
+    print(f"Partitioned {table} by month")
+    return True
+
+
+def partition_if_empty(table: str):
+    """Migration step converting table when it has no rows yet"""
+    def step(cursor):
+        convert_table(cursor, table, only_if_empty=True)
+    return step
+
+
+def create_future_partitions(table: str) -> List[str]:
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            existing = monthly_partitions(cursor, table)
+            month = month_start(_now(cursor))
+    created = []
+    for _ in range(PARTITION_PREMAKE_MONTHS + 1):
+        if month not in existing:
+            try:
+                with get_pool().connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+                        create_partition(cursor, table, month)
+                created.append(partition_name(table, month))
+            except Exception as e:
+                # e.g. rows for that month already landed in the DEFAULT partition
+                print(f"Creating partition {partition_name(table, month)} failed: {e}")
+        month = add_months(month, 1)
+    return created
+
+
+def drop_expired_partitions(table: str, cutoff: datetime) -> List[str]:
+    """Detach and drop monthly partitions whose rows are all older than cutoff"""
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            expired = [
+                name for month, name in sorted(monthly_partitions(cursor, table).items())
+                if add_months(month, 1) <= cutoff
+            ]
+    dropped = []
+    for name in expired:
+        try:
+            with get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SET LOCAL lock_timeout = '{DDL_LOCK_TIMEOUT}'")
+                    cursor.execute(sql.SQL('SELECT DISTINCT user_id FROM {}').format(sql.Identifier(name)))
+                    user_ids = {row[0] for row in cursor.fetchall()}
+                    cursor.execute(sql.SQL('ALTER TABLE {} DETACH PARTITION {}').format(
+                        sql.Identifier(table), sql.Identifier(name)
+                    ))
+                    cursor.execute(sql.SQL('DROP TABLE {}').format(sql.Identifier(name)))
+                    _reset_sync_state(cursor, table, user_ids)
+            dropped.append(name)
+        except Exception as e:
+            print(f"Dropping partition {name} failed: {e}")
+    return dropped
+
+
+def delete_expired_rows(table: str, cutoff: datetime, chunk_size: int = CACHE_CLEANUP_CHUNK_SIZE) -> int:
+    """Fallback for unpartitioned tables: delete rows older than cutoff in small transactions"""
+    deleted = 0
+    while True:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql.SQL('''
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT id FROM {table} WHERE created_at < %s LIMIT %s
+                    )
+                    RETURNING user_id
+                ''').format(table=sql.Identifier(table)), (cutoff, chunk_size))
+                user_ids = {row[0] for row in cursor.fetchall()}
+                count = cursor.rowcount
+                _reset_sync_state(cursor, table, user_ids)
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+
+def maintain_partitions() -> Dict:
+    """Scheduler entry point: premake partitions and enforce CACHE_RETENTION_DAYS"""
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            now = _now(cursor)
+            partitioned = {table: is_partitioned(cursor, table) for table in PARTITIONED_TABLES}
+    cutoff: Optional[datetime] = now - timedelta(days=CACHE_RETENTION_DAYS) if CACHE_RETENTION_DAYS > 0 else None
+
+    summary = {}
+    for table in PARTITIONED_TABLES:
+        if partitioned[table]:
+            summary[table] = {
+                'mode': 'partitions',
+                'created': create_future_partitions(table),
+                'dropped': drop_expired_partitions(table, cutoff) if cutoff else [],
+            }
+        else:
+            summary[table] = {
+                'mode': 'chunked-delete',
+                'deleted': delete_expired_rows(table, cutoff) if cutoff else 0,
+            }
+    return summary
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'maintain'
+    if command == 'convert':
+        for table in PARTITIONED_TABLES:
+            with get_pool().connection() as conn:
+                with conn.cursor() as cursor:
+                    if not convert_table(cursor, table):
+                        print(f"{table} is already partitioned")
+    elif command == 'maintain':
+        print(maintain_partitions())
+    else:
+        sys.exit("usage: python partitions.py [convert|maintain]")
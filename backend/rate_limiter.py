@@ -0,0 +1,212 @@
+"""
+Quota-aware throttling and backoff for every Google API call.
+
+get_service() wraps each service's transport in RateLimitedHttp, so all calls
+(single requests, pages of list calls, batches) pass through here:
+
+* A global token bucket keeps the process under the project quota and a
+  per-user bucket (keyed by executor.current_user_id) under the per-user
+  quota. A call that would have to wait longer than GOOGLE_RATE_MAX_WAIT is
+  rejected with RateLimited instead of queueing.
+* 429 and 403 rateLimitExceeded/userRateLimitExceeded responses are retried
+  with exponential backoff and full jitter, never sooner than Retry-After.
+  google_services.execute_batch does the same for rate-limited parts of a
+  batch response, and sizes its batches with RateLimiter.max_batch.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from executor import current_user_id
+
+# Requests per second and burst size; a rate of 0 disables that bucket
+GLOBAL_RATE = float(os.getenv('GOOGLE_API_RATE', '50'))
+GLOBAL_BURST = float(os.getenv('GOOGLE_API_BURST', '100'))
+USER_RATE = float(os.getenv('GOOGLE_USER_RATE', '5'))
+USER_BURST = float(os.getenv('GOOGLE_USER_BURST', '10'))
+# Longest a call may queue for tokens before failing fast
+MAX_WAIT = float(os.getenv('GOOGLE_RATE_MAX_WAIT', '5'))
+MAX_RETRIES = int(os.getenv('GOOGLE_API_MAX_RETRIES', '4'))
+BACKOFF_BASE = float(os.getenv('GOOGLE_BACKOFF_BASE', '0.5'))
+BACKOFF_MAX = float(os.getenv('GOOGLE_BACKOFF_MAX', '16'))
+USER_BUCKETS_MAX = 10000
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+class RateLimited(Exception):
+    """Raised when a Google call can't get quota soon enough"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Google API rate limit reached, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, count: float = 1, max_wait: float = MAX_WAIT) -> Optional[float]:
+        """
+        Take count tokens, possibly going into debt so callers queue in order
+
+        Returns:
+            Seconds to wait before using the tokens, or None (nothing taken)
+            when that would exceed max_wait
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (count - self.tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self.tokens -= count
+            return wait
+
+    def refund(self, count: float = 1):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + count)
+
+
+class RateLimiter:
+    def __init__(self):
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_BURST) if GLOBAL_RATE > 0 else None
+        self._user_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            'calls': 0,
+            'throttled': 0,
+            'rejected': 0,
+            'retries': 0,
+            'exhausted': 0,
+        }
+        self.wait_seconds = 0.0
+
+    def _user_bucket(self, user_id: Optional[int]) -> Optional[TokenBucket]:
+        if user_id is None or USER_RATE <= 0:
+            return None
+        with self._lock:
+            bucket = self._user_buckets.get(user_id)
+            if bucket is None:
+                bucket = self._user_buckets[user_id] = TokenBucket(USER_RATE, USER_BURST)
+                while len(self._user_buckets) > USER_BUCKETS_MAX:
+                    self._user_buckets.popitem(last=False)
+            else:
+                self._user_buckets.move_to_end(user_id)
+            return bucket
+
+    def acquire(self, count: float = 1):
+        """Block until count calls fit in both quotas, or raise RateLimited"""
+        self.counters['calls'] += count
+        user_bucket = self._user_bucket(current_user_id.get())
+
+        waits = []
+        for bucket in (user_bucket, self.global_bucket):
+            if bucket is None:
+                continue
+            wait = bucket.reserve(count)
+            if wait is None:
+                if waits and user_bucket is not None:
+                    user_bucket.refund(count)
+                self.counters['rejected'] += 1
+                raise RateLimited(max(1.0, count / bucket.rate))
+            waits.append(wait)
+
+        wait = max(waits, default=0.0)
+        if wait > 0:
+            self.counters['throttled'] += 1
+            self.wait_seconds += wait
+            time.sleep(wait)
+
+    def max_batch(self) -> int:
+        """
+        Most calls one acquire() can charge without being rejected outright
+
+        A charge is admitted only if a full bucket covers it within MAX_WAIT,
+        so batch requests are split into chunks of at most this many calls.
+        """
+        limits = []
+        if self.global_bucket is not None:
+            limits.append(min(GLOBAL_BURST, GLOBAL_RATE * MAX_WAIT))
+        if USER_RATE > 0 and current_user_id.get() is not None:
+            limits.append(min(USER_BURST, USER_RATE * MAX_WAIT))
+        return max(1, int(min(limits))) if limits else sys.maxsize
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Exponential backoff with full jitter, never shorter than Retry-After"""
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def stats(self) -> Dict:
+        return {
+            **self.counters,
+            'wait_seconds': round(self.wait_seconds, 3),
+            'user_buckets': len(self._user_buckets),
+        }
+
+
+rate_limiter = RateLimiter()
+
+
+def retry_after(response) -> Optional[float]:
+    value = response.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
+
+def is_rate_limit_response(response, content) -> bool:
+    if response.status == 429:
+        return True
+    if response.status != 403:
+        return False
+    try:
+        error = json.loads(content)['error']
+        return any(item.get('reason') in RATE_LIMIT_REASONS for item in error.get('errors', []))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return False
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for RateLimited or a Google HttpError caused by quota"""
+    if isinstance(error, RateLimited):
+        return True
+    response = getattr(error, 'resp', None)
+    return response is not None and is_rate_limit_response(response, getattr(error, 'content', b''))
+
+
+class RateLimitedHttp:
+    """httplib2.Http wrapper that throttles and retries rate-limited calls"""
+
+    def __init__(self, http, limiter: RateLimiter = rate_limiter):
+        self.http = http
+        self.limiter = limiter
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+            if not is_rate_limit_response(response, content):
+                return response, content
+            if attempt >= MAX_RETRIES:
+                self.limiter.counters['exhausted'] += 1
+                return response, content  # googleapiclient raises the HttpError
+
+            self.limiter.counters['retries'] += 1
+            time.sleep(self.limiter.backoff_delay(attempt, retry_after(response)))
+            attempt += 1
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+
+class PeriodicTask:
+    """Runs a blocking function every ``interval`` seconds on the default thread pool"""
+
+    def __init__(self, name: str, interval: float, func: Callable):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self.last_duration_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = time.monotonic()
+            try:
+                self.last_result = await loop.run_in_executor(None, self.func)
+            except Exception as e:
+                self.failures += 1
+                print(f"Scheduled task {self.name} failed: {e}")
+            self.runs += 1
+            self.last_duration_ms = round((time.monotonic() - started) * 1000, 2)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(), name=f"scheduler:{self.name}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_result': self.last_result,
+            'last_duration_ms': self.last_duration_ms,
+        }
+
+
+class Scheduler:
+    """Background maintenance jobs started and stopped with the FastAPI app"""
+
+    def __init__(self):
+        self._tasks: List[PeriodicTask] = []
+
+    def add(self, name: str, interval: float, func: Callable):
+        """Register func to run every interval seconds (interval <= 0 disables it)"""
+        if interval > 0:
+            self._tasks.append(PeriodicTask(name, interval, func))
+
+    def start(self):
+        for task in self._tasks:
+            task.start()
+
+    async def stop(self):
+        for task in self._tasks:
+            await task.stop()
+
+    def stats(self) -> Dict:
+        return {task.name: task.stats() for task in self._tasks}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,90 @@
+"""
+Webhook ingestion for the Telegram bot, served by the backend.
+
+When TELEGRAM_WEBHOOK_SECRET is set, the PTB application from
+telegram-bot/bot.py runs inside the FastAPI process and Telegram pushes
+updates to /telegram/webhook/{secret}. Each update is handled by whichever
+replica receives it, so any number of replicas can sit behind a load balancer.
+"""
+import hmac
+import os
+import sys
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from telegram import Update
+from telegram.ext import Application
+
+BOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'telegram-bot')
+
+WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+# Public base URL of this backend, e.g. https://api.example.com
+WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL')
+# Set to "false" on all but one replica if you prefer to register the webhook once
+SET_WEBHOOK = os.getenv('TELEGRAM_SET_WEBHOOK', 'true').lower() == 'true'
+
+router = APIRouter()
+_application: Optional[Application] = None
+
+
+def webhook_enabled() -> bool:
+    return bool(WEBHOOK_SECRET and os.getenv('TELEGRAM_BOT_TOKEN'))
+
+
+async def start_webhook():
+    """Start the in-process bot and register the webhook with Telegram"""
+    global _application
+    if not webhook_enabled():
+        return
+
+    if BOT_DIR not in sys.path:
+        sys.path.insert(0, BOT_DIR)
+    from bot import build_application
+
+    application = build_application()
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    if WEBHOOK_URL and SET_WEBHOOK:
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}/telegram/webhook/{WEBHOOK_SECRET}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+
+    _application = application
+    print("Telegram webhook mode enabled")
+
+
+async def stop_webhook():
+    global _application
+    if _application is None:
+        return
+
+    application, _application = _application, None
+    await application.stop()
+    await application.shutdown()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def _is_secret(value: str) -> bool:
+    # Bytes, since compare_digest raises TypeError on non-ASCII str
+    return hmac.compare_digest(value.encode(), WEBHOOK_SECRET.encode())
+
+
+@router.post("/telegram/webhook/{secret}")
+async def telegram_webhook(secret: str, request: Request):
+    """Receive a Telegram update and hand it to the PTB application"""
+    if _application is None:
+        raise HTTPException(status_code=404, detail="Webhook mode disabled")
+
+    header = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not (_is_secret(secret) and _is_secret(header)):
+        raise HTTPException(status_code=403, detail="Invalid secret")
+
+    update = Update.de_json(await request.json(), _application.bot)
+    await _application.update_queue.put(update)
+    return {"ok": True}
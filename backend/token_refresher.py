@@ -0,0 +1,81 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from auth import refresh_counters, refresh_user_credentials
+from db import claim_expiring_tokens, defer_token_refresh
+
+# Refresh tokens expiring within this many seconds
+REFRESH_WINDOW = int(os.getenv('TOKEN_REFRESH_WINDOW', '600'))
+# How often the scheduler looks for expiring tokens (0 disables the refresher)
+REFRESH_INTERVAL = int(os.getenv('TOKEN_REFRESH_INTERVAL', '60'))
+REFRESH_BATCH_SIZE = int(os.getenv('TOKEN_REFRESH_BATCH_SIZE', '20'))
+# Maximum calls per second to Google's token endpoint
+REFRESH_RATE = float(os.getenv('TOKEN_REFRESH_RATE', '5'))
+# Wait this long before retrying a user whose refresh failed
+REFRESH_RETRY_DELAY = int(os.getenv('TOKEN_REFRESH_RETRY_DELAY', '3600'))
+# Claimed users are skipped by other refreshers for this long, so a refresher
+# that dies mid-batch only delays them
+CLAIM_SECONDS = 300
+# Batches per scheduler tick, so one tick can't run forever
+MAX_BATCHES_PER_RUN = 50
+
+
+def refresh_batch() -> int:
+    """
+    Refresh one batch of soon-to-expire tokens
+
+    Users are claimed in one short transaction, then refreshed one by one
+    through auth.refresh_user_credentials (so under the same per-user locks as
+    request-path refreshes, and without calling Google for a token someone
+    else just refreshed). Failures are deferred in a second short transaction.
+    No connection is held while waiting on Google or pacing.
+
+    Refreshed tokens are saved per user, not in one bulk UPDATE: the save has
+    to happen under that user's advisory lock, or a request-path refresh
+    waiting on the lock would find the old token in the database and call
+    Google again. Holding every user's lock until a bulk write at the end
+    would bring back the long transaction this avoids. The claim and the
+    failure deferral are still one statement per batch.
+
+    Returns:
+        Number of users processed (refreshed or failed)
+    """
+    now = datetime.utcnow()
+    expires_before = now + timedelta(seconds=REFRESH_WINDOW)
+    claim_until = now + timedelta(seconds=CLAIM_SECONDS)
+    min_interval = 1.0 / REFRESH_RATE if REFRESH_RATE > 0 else 0.0
+
+    rows = claim_expiring_tokens(
+        expires_before.isoformat(), now.isoformat(), claim_until.isoformat(), REFRESH_BATCH_SIZE
+    )
+
+    failed = []
+    for user_id, tokens in rows:
+        started = time.monotonic()
+        try:
+            refresh_user_credentials(user_id, tokens, fresh_until=expires_before, counter='background')
+        except Exception as e:
+            print(f"Background token refresh failed for {user_id}: {e}")
+            failed.append(user_id)
+            refresh_counters['background_failed'] += 1
+
+        elapsed = time.monotonic() - started
+        if elapsed < min_interval:
+            time.sleep(min_interval - elapsed)
+
+    retry_at = datetime.utcnow() + timedelta(seconds=REFRESH_RETRY_DELAY)
+    defer_token_refresh(failed, retry_at.isoformat())
+
+    return len(rows)
+
+
+def refresh_expiring_tokens() -> int:
+    """Scheduler entry point: refresh batches until no expiring tokens are left"""
+    total = 0
+    for _ in range(MAX_BATCHES_PER_RUN):
+        processed = refresh_batch()
+        total += processed
+        if processed < REFRESH_BATCH_SIZE:
+            break
+    return total
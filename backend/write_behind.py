@@ -0,0 +1,152 @@
+"""
+Write-behind buffer recording created events and notes in the local tables.
+
+Creates hand their Google responses to record_events/record_notes, which only
+append to memory. A flusher thread writes the buffer with one COPY per table
+(db.save_events/save_notes) once WRITE_BEHIND_BATCH_SIZE rows are waiting or
+WRITE_BEHIND_FLUSH_INTERVAL seconds have passed, and once more on shutdown.
+Rows the mirror sync already has are left alone. A failed flush keeps its rows
+for the next attempt, up to WRITE_BEHIND_MAX_ROWS; beyond that the oldest are
+dropped, since the mirror sync fetches them from Google anyway. When the
+database rejects the rows themselves (integrity or data errors), each user's
+rows are retried on their own and only the rejected ones are dropped, so one
+bad row can't block everyone else's.
+"""
+import os
+import threading
+import time
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Dict, List
+
+import psycopg
+
+from calendar_sync import event_row
+from db import save_events, save_notes
+from notes_sync import note_row
+
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '200'))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', '2'))
+WRITE_BEHIND_MAX_ROWS = int(os.getenv('WRITE_BEHIND_MAX_ROWS', '10000'))
+
+# Errors caused by the rows rather than the database being unavailable
+REJECTED_ROW_ERRORS = (psycopg.IntegrityError, psycopg.DataError)
+
+
+class WriteBehindBuffer:
+    def __init__(self):
+        self._pending: Dict[str, List[Dict]] = {'events': [], 'notes': []}
+        self._writers: Dict[str, Callable[[List[Dict]], int]] = {'events': save_events, 'notes': save_notes}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._failed = False
+        self._thread = None
+        self.counters = {'recorded': 0, 'flushes': 0, 'written': 0, 'failures': 0, 'dropped': 0, 'rejected': 0}
+
+    def record_events(self, user_id: int, events: List[Dict]):
+        """Buffer events returned by google_calendar (create_calendar_event etc.)"""
+        self._add('events', [{**event_row(event), 'user_id': user_id} for event in events])
+
+    def record_notes(self, user_id: int, notes: List[Dict]):
+        """Buffer notes shaped like notes.py returns them (id, title, content, status)"""
+        self._add('notes', [
+            {**note_row({**note, 'notes': note.get('content', '')}), 'user_id': user_id}
+            for note in notes
+        ])
+
+    def _add(self, table: str, rows: List[Dict]):
+        if not rows:
+            return
+        with self._lock:
+            self._pending[table].extend(rows)
+            self.counters['recorded'] += len(rows)
+            full = len(self._pending[table]) >= WRITE_BEHIND_BATCH_SIZE
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows inserted"""
+        with self._flush_lock:
+            written = 0
+            self._failed = False
+            for table, writer in self._writers.items():
+                with self._lock:
+                    rows, self._pending[table] = self._pending[table], []
+                if not rows:
+                    continue
+                try:
+                    written += writer(rows)
+                    self.counters['flushes'] += 1
+                except REJECTED_ROW_ERRORS as e:
+                    print(f"Write-behind flush of {len(rows)} {table} rejected, retrying per user: {e}")
+                    written += self._write_per_user(table, writer, rows)
+                except Exception as e:
+                    self.counters['failures'] += 1
+                    self._failed = True
+                    print(f"Write-behind flush of {len(rows)} {table} failed: {e}")
+                    self._requeue(table, rows)
+            self.counters['written'] += written
+            return written
+
+    def _write_per_user(self, table: str, writer: Callable[[List[Dict]], int], rows: List[Dict]) -> int:
+        """Write rows one user at a time, dropping users whose rows are rejected"""
+        written = 0
+        retry = []
+        for user_id, group in groupby(sorted(rows, key=itemgetter('user_id')), key=itemgetter('user_id')):
+            group = list(group)
+            try:
+                written += writer(group)
+                self.counters['flushes'] += 1
+            except REJECTED_ROW_ERRORS as e:
+                self.counters['rejected'] += len(group)
+                print(f"Write-behind dropped {len(group)} {table} of user {user_id}: {e}")
+            except Exception as e:
+                self.counters['failures'] += 1
+                self._failed = True
+                print(f"Write-behind flush of {len(group)} {table} failed: {e}")
+                retry.extend(group)
+        if retry:
+            self._requeue(table, retry)
+        return written
+
+    def _requeue(self, table: str, rows: List[Dict]):
+        with self._lock:
+            pending = rows + self._pending[table]
+            overflow = len(pending) - WRITE_BEHIND_MAX_ROWS
+            if overflow > 0:
+                self.counters['dropped'] += overflow
+                pending = pending[overflow:]
+            self._pending[table] = pending
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(WRITE_BEHIND_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            if self._failed and not self._stopping:
+                time.sleep(WRITE_BEHIND_FLUSH_INTERVAL)  # don't spin on a down database
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop the flusher and write what is left"""
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = {table: len(rows) for table, rows in self._pending.items()}
+        return {**self.counters, 'pending': pending}
+
+
+write_behind = WriteBehindBuffer()
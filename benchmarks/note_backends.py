@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Note-creation latency before and after the note backend registry.
+
+"before" is the old create_keep_note: every note first calls the Keep API,
+waits for it to be refused, then falls back to Tasks. "after" routes the
+same notes.py functions through backend/note_backends.BackendRegistry, once
+with NOTES_BACKENDS=keep,tasks (Keep is refused once, then skipped) and once
+with the default NOTES_BACKENDS=tasks. The real googleapiclient request path
+runs against a stubbed HTTP transport that answers after a fixed latency, so
+no credentials or network are needed.
+
+    python benchmarks/note_backends.py --notes 50 --keep-ms 150 --tasks-ms 120
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Measure only the stubbed latency; keep the rate limiter from pacing the calls
+os.environ.setdefault('GOOGLE_API_RATE', '0')
+os.environ.setdefault('GOOGLE_USER_RATE', '0')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import httplib2  # noqa: E402
+from google.oauth2.credentials import Credentials  # noqa: E402
+
+import google_services  # noqa: E402
+import notes  # noqa: E402
+from note_backends import BackendRegistry  # noqa: E402
+
+KEEP_REFUSED = {
+    'error': {
+        'code': 403,
+        'message': 'Google Keep API has not been used in project 0 before or it is disabled.',
+        'status': 'PERMISSION_DENIED',
+    }
+}
+
+
+class StubHttp:
+    """httplib2.Http stand-in: Keep refuses after keep_ms, Tasks creates after tasks_ms"""
+
+    def __init__(self, keep_ms: float, tasks_ms: float):
+        self.keep_ms = keep_ms
+        self.tasks_ms = tasks_ms
+        self.calls = {'keep': 0, 'tasks': 0}
+        self.timeout = None
+
+    def request(self, uri, method='GET', body=None, headers=None, *args, **kwargs):
+        if 'keep.googleapis.com' in uri:
+            self.calls['keep'] += 1
+            time.sleep(self.keep_ms / 1000)
+            return httplib2.Response({'status': 403}), json.dumps(KEEP_REFUSED).encode()
+
+        self.calls['tasks'] += 1
+        time.sleep(self.tasks_ms / 1000)
+        task = json.loads(body)
+        task.update({'id': f"task-{self.calls['tasks']}", 'status': 'needsAction'})
+        return httplib2.Response({'status': 200}), json.dumps(task).encode()
+
+
+def measure(create, notes_count: int) -> dict:
+    latencies = []
+    for i in range(notes_count):
+        started = time.perf_counter()
+        create(f"note {i}")
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'mean_ms': sum(latencies) / len(latencies),
+        'p50_ms': latencies[len(latencies) // 2],
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def registry(order):
+    """A registry wired like notes.note_backend_registry, with the given order"""
+    routed = BackendRegistry(order=order)
+    routed.register(
+        'keep',
+        notes.create_keep_api_note,
+        is_unsupported=notes._keep_unsupported,
+        supports=notes._has_keep_scope,
+        is_outage=notes._is_outage
+    )
+    routed.register('tasks', notes.create_keep_note_fallback, is_outage=notes._is_outage)
+    return routed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--notes', type=int, default=50)
+    parser.add_argument('--keep-ms', type=float, default=150, help='latency of the refused Keep call')
+    parser.add_argument('--tasks-ms', type=float, default=120, help='latency of the Tasks insert')
+    args = parser.parse_args()
+
+    stub = StubHttp(args.keep_ms, args.tasks_ms)
+    google_services.build_http = lambda: stub
+    # As if the Keep scope had been granted, so the Keep path is really taken
+    credentials = Credentials(token='dummy-token', scopes=[notes.KEEP_SCOPE])
+    google_services.preload((('keep', 'v1'), ('tasks', 'v1')))
+
+    def before(title):
+        try:
+            return notes.create_keep_api_note(credentials, title, '')
+        except Exception:
+            return notes.create_keep_note_fallback(credentials, title, '')
+
+    def after(order):
+        routed = registry(order)
+        return lambda title: routed.create(credentials, title, '')
+
+    paths = {
+        'before (keep, then tasks)': before,
+        'after (registry keep,tasks)': after(['keep', 'tasks']),
+        'after (registry tasks)': after(['tasks']),
+    }
+
+    print(f"{'path':<30}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'keep calls':>12}")
+    results = {}
+    for name, create in paths.items():
+        stub.calls = {'keep': 0, 'tasks': 0}
+        results[name] = r = measure(create, args.notes)
+        print(
+            f"{name:<30}{r['mean_ms']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+            f"{stub.calls['keep']:>12}"
+        )
+
+    baseline = results['before (keep, then tasks)']['mean_ms']
+    for name in list(paths)[1:]:
+        print(f"{name}: {baseline / results[name]['mean_ms']:.2f}x faster than before (mean)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Parser golden-corpus check and microbenchmark for telegram-bot/handlers.py
+
+1. Golden corpus: every message in parser_golden.json must still parse to the
+   stored result (relative dates are resolved against a fixed "now").
+2. Benchmark: a generated corpus of Uzbek (Latin and Cyrillic) and Russian
+   messages is run through parse_uzbek_russian_message, parse_date,
+   parse_time and is_note_intent; messages/second and p50/p99 latency are
+   reported and compared with parser_baseline.json.
+
+Exits with status 1 when a golden result changes or throughput drops more than
+--threshold below the baseline. Baselines are machine-specific: regenerate
+them on the machine that runs the check with --update-baseline.
+
+    python benchmarks/parser_bench.py
+    python benchmarks/parser_bench.py --update-golden --update-baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'telegram-bot'))
+
+from handlers import is_note_intent, parse_date, parse_time, parse_uzbek_russian_message  # noqa: E402
+
+GOLDEN_PATH = os.path.join(BENCH_DIR, 'parser_golden.json')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'parser_baseline.json')
+GOLDEN_NOW = datetime(2025, 10, 15, 12, 0, 0)
+
+# ---------------- Corpus ----------------
+UZ_DAYS = ['bugun', 'ertaga', 'indinga', 'dushanba', 'seshanba', 'chorshanba',
+           'payshanba', 'juma', 'shanba', 'yakshanba', 'Ertaga', 'Dushanba kuni']
+UZ_MONTHS = ['yanvar', 'fevral', 'mart', 'aprel', 'may', 'iyun', 'iyul', 'avgust',
+             'sentabr', 'oktabr', 'noyabr', 'dekabr']
+UZ_WHAT = ["doktor", "yig'ilish", "uchrashuv", "bozor", "dars", "futbol", "tug'ilgan kun",
+           "ota-onamga qo'ng'iroq", "mashinani ta'mirlash", "imtihon"]
+UZ_ITEMS = ["non va sut", "kitob o'qish", "dori", "go'sht", "sabzavotlar", "kir yuvish",
+            "hisobotni yuborish", "telefon to'lovi"]
+
+UZ_CYR_DAYS = ['бугун', 'эртага', 'индинга', 'душанба', 'сешанба', 'жума', 'шанба', 'якшанба']
+UZ_CYR_MONTHS = ['январ', 'феврал', 'март', 'апрел', 'май', 'июн', 'июл', 'август',
+                 'сентябр', 'октябр', 'ноябр', 'декабр']
+UZ_CYR_WHAT = ['доктор', 'йиғилиш', 'учрашув', 'бозор', 'дарс', 'имтиҳон']
+UZ_CYR_ITEMS = ['нон ва сут', 'китоб ўқиш', 'дори', 'гўшт', 'ҳисобот']
+
+RU_DAYS = ['сегодня', 'завтра', 'послезавтра', 'в понедельник', 'во вторник', 'в среду',
+           'в четверг', 'в пятницу', 'в субботу', 'в воскресенье', 'Завтра', 'понедельник']
+RU_MONTHS = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля', 'августа',
+             'сентября', 'октября', 'ноября', 'декабря']
+RU_WHAT = ['к врачу', 'встреча', 'собрание', 'созвон с командой', 'день рождения', 'экзамен',
+           'тренировка', 'забрать детей']
+RU_ITEMS = ['хлеб и молоко', 'прочитать книгу', 'лекарства', 'оплатить интернет',
+            'отправить отчёт', 'список покупок']
+
+UZ_TEMPLATES = [
+    '{day} soat {h}:{m} da {what}',
+    '{day} soat {h} da {what}',
+    '{d} {month} soat {h}:{m} da {what}',
+    '{d} {month} {what}',
+    '{what} {day} {h}.{m}',
+    '{what} {h}:{m}',
+    'Eslatma: {item}',
+    'eslatma {item}',
+    '{item} sotib olish',
+    '{item} olish kerak',
+    'Unutma: {item}',
+    "Yozib qo'y: {item}",
+    'Eslatib qol, {item}',
+    '{item}',
+    '{what}',
+]
+UZ_CYR_TEMPLATES = [
+    '{day} соат {h}:{m} да {what}',
+    '{day} куни {h} да {what}',
+    '{d} {month} соат {h}:00 {what}',
+    'Эслатма: {item}',
+    '{item} сотиб олиш',
+    '{what}',
+]
+RU_TEMPLATES = [
+    '{day} в {h}:{m} {what}',
+    '{day} в {h} {what}',
+    '{d} {month} в {h}:{m} {what}',
+    '{d} {month} {what}',
+    '{what} {h}.{m}',
+    'Заметка: {item}',
+    'Не забыть {item}',
+    'Запиши {item}',
+    'Напомни {what} {day}',
+    'Купить {item}',
+    'Сделать {item}',
+    '{item}',
+]
+
+LANGUAGES = [
+    (UZ_TEMPLATES, UZ_DAYS, UZ_MONTHS, UZ_WHAT, UZ_ITEMS),
+    (UZ_CYR_TEMPLATES, UZ_CYR_DAYS, UZ_CYR_MONTHS, UZ_CYR_WHAT, UZ_CYR_ITEMS),
+    (RU_TEMPLATES, RU_DAYS, RU_MONTHS, RU_WHAT, RU_ITEMS),
+]
+
+
+def generate_corpus(size: int, seed: int = 0) -> list:
+    """Deterministic mix of calendar, note and free-text messages"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        templates, days, months, whats, items = rng.choice(LANGUAGES)
+        message = rng.choice(templates).format(
+            day=rng.choice(days),
+            month=rng.choice(months),
+            what=rng.choice(whats),
+            item=rng.choice(items),
+            d=rng.randint(1, 31),
+            h=rng.choice([rng.randint(0, 23), rng.randint(0, 23), rng.randint(24, 30)]),
+            m=f"{rng.choice([0, 15, 30, 45, rng.randint(0, 59)]):02d}",
+        )
+        if rng.random() < 0.1:
+            message = message.upper()
+        corpus.append(message)
+    return corpus
+
+
+# ---------------- Golden corpus ----------------
+def golden_result(text: str):
+    try:
+        return parse_uzbek_russian_message(text, now=GOLDEN_NOW)
+    except Exception as e:
+        return {'error': type(e).__name__}
+
+
+def check_golden(update: bool) -> bool:
+    if update:
+        corpus = generate_corpus(500, seed=20251015)
+        golden = [{'text': text, 'expected': golden_result(text)} for text in corpus]
+        with open(GOLDEN_PATH, 'w', encoding='utf-8') as f:
+            json.dump(golden, f, ensure_ascii=False, indent=1)
+        print(f"Wrote {len(golden)} golden cases to {GOLDEN_PATH}")
+        return True
+
+    with open(GOLDEN_PATH, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+
+    failures = [case for case in golden if golden_result(case['text']) != case['expected']]
+    for case in failures[:10]:
+        print(f"  ❌ {case['text']!r}")
+        print(f"     expected: {case['expected']}")
+        print(f"     got:      {golden_result(case['text'])}")
+    print(f"Golden corpus: {len(golden) - len(failures)}/{len(golden)} match")
+    return not failures
+
+
+# ---------------- Benchmark ----------------
+def _call_all(fn, corpus: list):
+    for text in corpus:
+        try:
+            fn(text)
+        except ValueError:
+            pass  # invalid calendar dates ("31 fevral") raise, as they always have
+
+
+def measure(fn, corpus: list, rounds: int) -> dict:
+    # Throughput: best of several tight loops, so a noisy round doesn't count
+    best = min(_timed(fn, corpus) for _ in range(rounds))
+
+    # Latency percentiles from a separate per-call pass
+    latencies = []
+    for text in corpus:
+        t0 = time.perf_counter_ns()
+        _call_all(fn, (text,))
+        latencies.append(time.perf_counter_ns() - t0)
+    latencies.sort()
+
+    return {
+        'msgs_per_sec': round(len(corpus) / best),
+        'p50_us': round(latencies[len(latencies) // 2] / 1000, 2),
+        'p99_us': round(latencies[int(len(latencies) * 0.99)] / 1000, 2),
+    }
+
+
+def _timed(fn, corpus: list) -> float:
+    started = time.perf_counter()
+    _call_all(fn, corpus)
+    return time.perf_counter() - started
+
+
+def run_benchmark(size: int, rounds: int) -> dict:
+    corpus = generate_corpus(size)
+    functions = {
+        'parse_uzbek_russian_message': parse_uzbek_russian_message,
+        'parse_date': parse_date,
+        'parse_time': parse_time,
+        'is_note_intent': is_note_intent,
+    }
+
+    results = {}
+    print(f"\n{'function':<30}{'msgs/s':>12}{'p50 µs':>10}{'p99 µs':>10}")
+    for name, fn in functions.items():
+        measure(fn, corpus[:500], 1)  # warm-up
+        results[name] = measure(fn, corpus, rounds)
+        r = results[name]
+        print(f"{name:<30}{r['msgs_per_sec']:>12}{r['p50_us']:>10}{r['p99_us']:>10}")
+    return results
+
+
+def compare_baseline(results: dict, threshold: float) -> bool:
+    if not os.path.exists(BASELINE_PATH):
+        print("\n⚠️  No baseline stored; run with --update-baseline")
+        return True
+
+    with open(BASELINE_PATH, 'r') as f:
+        baseline = json.load(f)
+
+    ok = True
+    print()
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]['msgs_per_sec']
+        ratio = result['msgs_per_sec'] / expected
+        status = '✅'
+        if ratio < 1 - threshold:
+            status = '❌'
+            ok = False
+        print(f"{status} {name}: {ratio:.2f}x baseline ({result['msgs_per_sec']} vs {expected} msgs/s)")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=20_000, help='generated corpus size')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed throughput drop versus baseline (0.25 = 25%%)')
+    parser.add_argument('--update-golden', action='store_true')
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    golden_ok = check_golden(args.update_golden)
+    results = run_benchmark(args.size, args.rounds)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote baseline to {BASELINE_PATH}")
+        perf_ok = True
+    else:
+        perf_ok = compare_baseline(results, args.threshold)
+
+    return 0 if golden_ok and perf_ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compare query plans for the events/notes hot paths before and after the
+indexes shipped in backend/migrations.py (migration 2).
+
+Runs against the database in DB_PATH inside a throwaway schema, so it never
+touches the real tables:
+
+    DB_PATH=postgresql://... python benchmarks/query_plans.py --rows 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from db_pool import get_pool  # noqa: E402
+from migrations import HOT_PATH_INDEXES, index_ddl  # noqa: E402
+
+SCHEMA = 'bench_query_plans'
+
+QUERIES = {
+    'get_user_events': (
+        'SELECT * FROM events WHERE user_id = %(user_id)s ORDER BY start_time DESC LIMIT 10'
+    ),
+    'get_user_notes': (
+        'SELECT * FROM notes WHERE user_id = %(user_id)s ORDER BY created_at DESC LIMIT 10'
+    ),
+    'cleanup_old_cache': (
+        "SELECT count(*) FROM events WHERE created_at < NOW() - INTERVAL '30 days'"
+    ),
+}
+
+
+def setup(cursor, rows: int, users: int):
+    cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+    cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+    cursor.execute(f'SET search_path TO {SCHEMA}')
+    cursor.execute('''
+        CREATE TABLE events (
+            id SERIAL PRIMARY KEY, user_id BIGINT, event_id TEXT, title TEXT,
+            start_time TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE notes (
+            id SERIAL PRIMARY KEY, user_id BIGINT, note_id TEXT, title TEXT,
+            content TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO events (user_id, event_id, title, start_time, created_at)
+        SELECT g %% %(users)s, md5(g::text), 'event ' || g,
+               NOW() + (g %% 400 - 200) * INTERVAL '1 day',
+               NOW() - (g %% 90) * INTERVAL '1 day'
+        FROM generate_series(1, %(rows)s) g
+    ''', {'rows': rows, 'users': users})
+    cursor.execute('''
+        INSERT INTO notes (user_id, note_id, title, content, created_at)
+        SELECT g %% %(users)s, md5(g::text), 'note ' || g, repeat('x', 64),
+               NOW() - (g %% 90) * INTERVAL '1 day'
+        FROM generate_series(1, %(rows)s) g
+    ''', {'rows': rows, 'users': users})
+    cursor.execute('ANALYZE events')
+    cursor.execute('ANALYZE notes')
+
+
+def explain(cursor, label: str):
+    print(f"\n===== {label} =====")
+    for name, query in QUERIES.items():
+        cursor.execute('EXPLAIN (ANALYZE, BUFFERS) ' + query, {'user_id': 42})
+        plan = [row[0] for row in cursor.fetchall()]
+
+        started = time.perf_counter()
+        for _ in range(20):
+            cursor.execute(query, {'user_id': 42})
+            cursor.fetchall()
+        avg_ms = (time.perf_counter() - started) / 20 * 1000
+
+        print(f"\n--- {name} (avg {avg_ms:.2f} ms over 20 runs)")
+        for line in plan:
+            print(f"    {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    args = parser.parse_args()
+
+    with get_pool().connection() as conn:
+        with conn.cursor() as cursor:
+            try:
+                setup(cursor, args.rows, args.users)
+                explain(cursor, 'before (no indexes)')
+
+                for index in HOT_PATH_INDEXES:
+                    cursor.execute(index_ddl(*index))
+                cursor.execute('ANALYZE events')
+                cursor.execute('ANALYZE notes')
+                explain(cursor, 'after (migration 2 indexes)')
+            finally:
+                cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-call googleapiclient build() versus the cached service
+factory in backend/google_services.py. No network access is needed; both
+paths use static discovery documents and dummy credentials.
+
+    python benchmarks/service_build.py --iterations 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from google.oauth2.credentials import Credentials  # noqa: E402
+from googleapiclient.discovery import build  # noqa: E402
+
+from google_services import get_service  # noqa: E402
+
+APIS = [('calendar', 'v3'), ('tasks', 'v1'), ('oauth2', 'v2')]
+
+
+def timed(fn, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    credentials = Credentials(token='dummy-token')
+
+    print(f"{'api':<14}{'build() ms':>12}{'get_service() ms':>18}{'speedup':>10}")
+    for api, version in APIS:
+        get_service(api, version, credentials)  # warm the template
+
+        built = timed(
+            lambda: build(api, version, credentials=credentials, cache_discovery=False),
+            args.iterations
+        )
+        cached = timed(lambda: get_service(api, version, credentials), args.iterations)
+
+        print(f"{api + '.' + version:<14}{built:>12.3f}{cached:>18.3f}{built / cached:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Shared pytest fixtures
+"""
+
+import pytest
+
+
+class FakeTime:
+    """Stands in for the time module: sleep() just advances monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """
+    Simulated time, patched in as ``time`` of every module listed in the
+    test module's FAKE_TIME_MODULES
+    """
+    fake = FakeTime()
+    for module in getattr(request.module, 'FAKE_TIME_MODULES', ()):
+        monkeypatch.setattr(module, 'time', fake)
+    return fake
@@ -0,0 +1,42 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Seconds to trust a backend /api/auth/status answer
+AUTH_CACHE_TTL = float(os.getenv('BOT_AUTH_CACHE_TTL', '300'))
+# Unauthenticated answers expire quickly so a fresh login is noticed soon
+AUTH_CACHE_NEGATIVE_TTL = float(os.getenv('BOT_AUTH_CACHE_NEGATIVE_TTL', '15'))
+AUTH_CACHE_MAX_SIZE = int(os.getenv('BOT_AUTH_CACHE_SIZE', '50000'))
+
+
+class AuthStatusCache:
+    """TTL cache of backend auth status responses, keyed by Telegram user id"""
+
+    def __init__(self, max_size: int = AUTH_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        status, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return status
+
+    def put(self, user_id: int, status: Dict):
+        ttl = AUTH_CACHE_TTL if status.get('authenticated') else AUTH_CACHE_NEGATIVE_TTL
+        self._entries[user_id] = (status, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+
+auth_cache = AuthStatusCache()
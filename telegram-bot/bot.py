@@ -1,3 +1,4 @@
+import asyncio
 import os
 import logging
 from dotenv import load_dotenv
@@ -6,7 +7,8 @@ load_dotenv()
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 import httpx
-from handlers import parse_uzbek_russian_message
+from auth_cache import auth_cache
+from handlers import parse_many, parse_uzbek_russian_message, split_items
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,17 +17,84 @@ BACKEND_URL = os.getenv('ENV_BACKEND_URL', 'http://localhost:8000')
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 WEBAPP_URL = os.getenv('WEBAPP_URL', 'http://localhost:3000')
 
+# Backend HTTP client (one per process, keep-alive pooled)
+HTTP_MAX_CONNECTIONS = int(os.getenv('BOT_HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('BOT_HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('BOT_HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('BOT_HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_TIMEOUT = float(os.getenv('BOT_HTTP_TIMEOUT', '30'))
+AUTH_CHECK_TIMEOUT = 5.0
+# Following a queued create job until it finishes
+JOB_POLL_INTERVAL = float(os.getenv('BOT_JOB_POLL_INTERVAL', '1'))
+JOB_WAIT_TIMEOUT = float(os.getenv('BOT_JOB_WAIT_TIMEOUT', '120'))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+async def post_init(application: Application):
+    """Create the shared backend client when the application starts"""
+    application.bot_data['http'] = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    )
+
+async def post_shutdown(application: Application):
+    """Close the shared backend client"""
+    client = application.bot_data.pop('http', None)
+    if client is not None:
+        await client.aclose()
+
+def backend_client(context: ContextTypes.DEFAULT_TYPE) -> httpx.AsyncClient:
+    return context.bot_data['http']
+
+def idempotency_headers(update: Update) -> dict:
+    """Same key for a redelivered update, so the backend creates the item once"""
+    return {'Idempotency-Key': f"{update.effective_chat.id}:{update.message.message_id}"}
+
+async def get_auth_status(context: ContextTypes.DEFAULT_TYPE, user_id: int, use_cache: bool = True) -> dict:
+    """Backend auth status for user_id, served from auth_cache when possible"""
+    if use_cache:
+        status = auth_cache.get(user_id)
+        if status is not None:
+            return status
+
+    response = await backend_client(context).get(
+        f'{BACKEND_URL}/api/auth/status/{user_id}', timeout=AUTH_CHECK_TIMEOUT
+    )
+    status = response.json()
+    if response.status_code == 200:
+        auth_cache.put(user_id, status)
+    return status
+
+LOGIN_TEXT = (
+    "⚠️ Avval Google hisobingizni ulang\n"
+    "⚠️ Сначала подключите Google аккаунт"
+)
+
+def login_markup(user_id: int) -> InlineKeyboardMarkup:
+    keyboard = [[InlineKeyboardButton("🔐 Kirish / Войти", url=f"{WEBAPP_URL}?user_id={user_id}")]]
+    return InlineKeyboardMarkup(keyboard)
+
+async def ask_to_login(update: Update, user_id: int):
+    await update.message.reply_text(LOGIN_TEXT, reply_markup=login_markup(user_id))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     user_id = update.effective_user.id
     
     # Check if user is authenticated
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f'{BACKEND_URL}/api/auth/status/{user_id}')
-            is_authenticated = response.json().get('authenticated', False)
-        except:
-            is_authenticated = False
+    try:
+        is_authenticated = (await get_auth_status(context, user_id)).get('authenticated', False)
+    except:
+        is_authenticated = False
     
     if is_authenticated:
         await update.message.reply_text(
@@ -78,6 +147,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def auth_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /auth command"""
     user_id = update.effective_user.id
+    auth_cache.invalidate(user_id)
     keyboard = [[InlineKeyboardButton("🔐 Google bilan kirish / Войти через Google", url=f"{WEBAPP_URL}?user_id={user_id}")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -91,27 +161,25 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /status command"""
     user_id = update.effective_user.id
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f'{BACKEND_URL}/api/auth/status/{user_id}')
-            data = response.json()
-            
-            if data.get('authenticated'):
-                await update.message.reply_text(
-                    f"✅ Ulangan / Подключено\n"
-                    f"📧 Email: {data.get('email', 'N/A')}\n"
-                    f"📅 Calendar: ✅\n"
-                    f"📝 Keep: ✅"
-                )
-            else:
-                await update.message.reply_text(
-                    "❌ Ulanmagan / Не подключено\n"
-                    "/auth buyrug'ini ishga tushiring\n"
-                    "Используйте команду /auth"
-                )
-        except Exception as e:
-            logger.error(f"Status check error: {e}")
-            await update.message.reply_text("⚠️ Xatolik / Ошибка")
+    try:
+        data = await get_auth_status(context, user_id, use_cache=False)
+
+        if data.get('authenticated'):
+            await update.message.reply_text(
+                f"✅ Ulangan / Подключено\n"
+                f"📧 Email: {data.get('email', 'N/A')}\n"
+                f"📅 Calendar: ✅\n"
+                f"📝 Keep: ✅"
+            )
+        else:
+            await update.message.reply_text(
+                "❌ Ulanmagan / Не подключено\n"
+                "/auth buyrug'ini ishga tushiring\n"
+                "Используйте команду /auth"
+            )
+    except Exception as e:
+        logger.error(f"Status check error: {e}")
+        await update.message.reply_text("⚠️ Xatolik / Ошибка")
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming text messages"""
@@ -119,25 +187,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = update.message.text
     
     # Check authentication
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(f'{BACKEND_URL}/api/auth/status/{user_id}')
-            if not response.json().get('authenticated'):
-                keyboard = [[InlineKeyboardButton("🔐 Kirish / Войти", url=f"{WEBAPP_URL}?user_id={user_id}")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                await update.message.reply_text(
-                    "⚠️ Avval Google hisobingizni ulang\n"
-                    "⚠️ Сначала подключите Google аккаунт",
-                    reply_markup=reply_markup
-                )
-                return
-        except Exception as e:
-            logger.error(f"Backend error: {e}")
-            await update.message.reply_text("⚠️ Backend bilan aloqa yo'q / Нет связи с backend")
+    try:
+        if not (await get_auth_status(context, user_id)).get('authenticated'):
+            await ask_to_login(update, user_id)
+            return
+    except Exception as e:
+        logger.error(f"Backend error: {e}")
+        await update.message.reply_text("⚠️ Backend bilan aloqa yo'q / Нет связи с backend")
     
     # Send typing indicator
     await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
     
+    # Several events, one per line, go to the backend as a single batch
+    items = split_items(message_text)
+    if len(items) > 1:
+        parsed_items = list(parse_many(items))
+        if all(p and p['intent'] == 'calendar' for p in parsed_items):
+            await create_events_batch(update, context, user_id, parsed_items)
+            return
+    
     # Parse message
     parsed = parse_uzbek_russian_message(message_text)
     
@@ -150,60 +218,181 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Process based on intent
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            if parsed['intent'] == 'calendar':
-                response = await client.post(
-                    f'{BACKEND_URL}/api/calendar/create',
-                    json={
-                        'user_id': user_id,
-                        'title': parsed['title'],
-                        'datetime': parsed['datetime'],
-                        'description': parsed.get('description', '')
-                    }
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    await update.message.reply_text(
+    client = backend_client(context)
+    try:
+        if parsed['intent'] == 'calendar':
+            response = await client.post(
+                f'{BACKEND_URL}/api/calendar/create',
+                headers=idempotency_headers(update),
+                json={
+                    'user_id': user_id,
+                    'title': parsed['title'],
+                    'datetime': parsed['datetime'],
+                    'description': parsed.get('description', '')
+                }
+            )
+
+            if response.status_code == 401:
+                auth_cache.invalidate(user_id)
+                await ask_to_login(update, user_id)
+                return
+            
+            if response.status_code == 202:
+                await follow_job_in_background(
+                    update, context, user_id, response.json()['job_id'],
+                    lambda result: (
                         f"✅ Calendar'ga qo'shildi / Добавлено в Calendar\n\n"
                         f"📅 {parsed['title']}\n"
                         f"🕐 {parsed['datetime']}\n"
-                        f"🔗 {data.get('link', '')}"
+                        f"🔗 {result.get('link', '')}"
                     )
-                else:
-                    raise Exception("Calendar creation failed")
-                    
-            elif parsed['intent'] == 'note':
-                response = await client.post(
-                    f'{BACKEND_URL}/api/notes/create',
-                    json={
-                        'user_id': user_id,
-                        'title': parsed['title'],
-                        'content': parsed.get('content', '')
-                    }
                 )
+            else:
+                raise Exception("Calendar creation failed")
                 
-                if response.status_code == 200:
-                    await update.message.reply_text(
+        elif parsed['intent'] == 'note':
+            response = await client.post(
+                f'{BACKEND_URL}/api/notes/create',
+                headers=idempotency_headers(update),
+                json={
+                    'user_id': user_id,
+                    'title': parsed['title'],
+                    'content': parsed.get('content', '')
+                }
+            )
+
+            if response.status_code == 401:
+                auth_cache.invalidate(user_id)
+                await ask_to_login(update, user_id)
+                return
+            
+            if response.status_code == 202:
+                await follow_job_in_background(
+                    update, context, user_id, response.json()['job_id'],
+                    lambda result: (
                         f"✅ Keep'ga saqlandi / Сохранено в Keep\n\n"
                         f"📝 {parsed['title']}"
                     )
-                else:
-                    raise Exception("Note creation failed")
-                    
-        except Exception as e:
-            logger.error(f"API Error: {e}")
-            await update.message.reply_text(
+                )
+            else:
+                raise Exception("Note creation failed")
+                
+    except Exception as e:
+        logger.error(f"API Error: {e}")
+        await update.message.reply_text(
+            "❌ Xatolik yuz berdi / Произошла ошибка\n"
+            "Iltimos qayta urinib ko'ring / Попробуйте еще раз"
+        )
+
+async def follow_job_in_background(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, job_id: int, success_text):
+    """Reply "working on it" now and edit that reply when the backend job finishes"""
+    reply = await update.message.reply_text("⏳ Bajarilmoqda... / Выполняется...")
+    context.application.create_task(
+        follow_job(context, reply, user_id, job_id, success_text),
+        update=update
+    )
+
+async def follow_job(context: ContextTypes.DEFAULT_TYPE, reply, user_id: int, job_id: int, success_text):
+    """Poll /api/jobs/{job_id} and put the outcome into the reply message"""
+    client = backend_client(context)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + JOB_WAIT_TIMEOUT
+    delay = JOB_POLL_INTERVAL / 2
+
+    while loop.time() < deadline:
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 5.0)
+        try:
+            response = await client.get(f'{BACKEND_URL}/api/jobs/{job_id}', params={'user_id': user_id})
+        except httpx.HTTPError as e:
+            logger.warning(f"Job {job_id} status check failed: {e}")
+            continue
+        if response.status_code != 200:
+            continue
+
+        job = response.json()
+        if job['status'] == 'succeeded':
+            await reply.edit_text(success_text(job['result']))
+            return
+        if job['status'] == 'dead' and job.get('error_code') == 'unauthenticated':
+            # Tokens went bad after the create was accepted; don't trust the cached status
+            auth_cache.invalidate(user_id)
+            await reply.edit_text(LOGIN_TEXT, reply_markup=login_markup(user_id))
+            return
+        if job['status'] == 'dead':
+            logger.error(f"Job {job_id} failed: {job.get('error')}")
+            await reply.edit_text(
                 "❌ Xatolik yuz berdi / Произошла ошибка\n"
                 "Iltimos qayta urinib ko'ring / Попробуйте еще раз"
             )
+            return
 
-def main():
+    await reply.edit_text(
+        "⏳ Hali bajarilmoqda, birozdan so'ng tekshiring / "
+        "Всё ещё выполняется, проверьте чуть позже"
+    )
+
+async def create_events_batch(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, parsed_items: list):
+    """Create every parsed event with one backend call and reply with a summary"""
+    try:
+        response = await backend_client(context).post(
+            f'{BACKEND_URL}/api/calendar/batch',
+            headers=idempotency_headers(update),
+            json={
+                'user_id': user_id,
+                'events': [
+                    {
+                        'title': parsed['title'],
+                        'datetime': parsed['datetime'],
+                        'description': parsed.get('description', '')
+                    }
+                    for parsed in parsed_items
+                ]
+            }
+        )
+
+        if response.status_code == 401:
+            auth_cache.invalidate(user_id)
+            await ask_to_login(update, user_id)
+            return
+
+        if response.status_code == 409:
+            # Redelivered update; the delivery still running sends the summary
+            return
+
+        if response.status_code != 200:
+            raise Exception("Calendar batch creation failed")
+
+        data = response.json()
+        lines = []
+        for parsed, result in zip(parsed_items, data['results']):
+            mark = '✅' if result['status'] == 'created' else '❌'
+            lines.append(f"{mark} {parsed['title']} — {parsed['datetime']}")
+
+        await update.message.reply_text(
+            f"📅 Calendar: {data['created']}/{len(parsed_items)} qo'shildi / добавлено\n\n"
+            + "\n".join(lines)
+        )
+
+    except Exception as e:
+        logger.error(f"API Error: {e}")
+        await update.message.reply_text(
+            "❌ Xatolik yuz berdi / Произошла ошибка\n"
+            "Iltimos qayta urinib ko'ring / Попробуйте еще раз"
+        )
+
+def build_application() -> Application:
+    """Create the PTB application with all handlers registered"""
     if not BOT_TOKEN:
         raise ValueError("TELEGRAM_BOT_TOKEN not set!")
 
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
@@ -211,9 +400,18 @@ def main():
     application.add_handler(CommandHandler("status", status_command))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
+    return application
+
+def main():
+    if os.getenv('TELEGRAM_WEBHOOK_SECRET'):
+        # Polling would delete the webhook the backend registered
+        raise SystemExit("Webhook mode is enabled (TELEGRAM_WEBHOOK_SECRET); updates are served by the backend.")
+
+    application = build_application()
+
     logger.info("Bot started!")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
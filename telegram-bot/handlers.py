@@ -1,6 +1,9 @@
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
 
 # Uzbek and Russian date/time keywords
 UZBEK_DAYS = {
@@ -29,160 +32,341 @@ RUSSIAN_MONTHS = {
 NOTE_KEYWORDS_UZ = ['eslatma', 'yozib qo', 'qayd et', 'unutma', 'eslatib qol']
 NOTE_KEYWORDS_RU = ['заметка', 'запиши', 'записать', 'не забыть', 'напомни']
 
-def parse_time(text: str) -> Optional[str]:
-    """Extract time from text"""
-    # Pattern: soat 14, 14:30, 14.30, в 14:00, kuni 10
-    time_patterns = [
-        r'(?:soat|в|kuni)\s*(\d{1,2})(?::(\d{2}))?',  # soat 14:30, в 14:00
-        r'(\d{1,2}):(\d{2})',  # 14:30
-        r'(\d{1,2})\.(\d{2})',  # 14.30
-    ]
-    
-    for pattern in time_patterns:
-        match = re.search(pattern, text.lower())
+TASK_INDICATORS = ['olish', 'sotib', 'купить', 'сделать', 'список']
+
+# ---------------- Compiled parser state (built once at import) ----------------
+def _trie_regex(words) -> str:
+    """Regex alternation factored along a character trie (longest match first)"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: Dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        optional = '' in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')' + ('?' if optional else '')
+
+    return emit(trie)
+
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+ALL_DAYS = {**UZBEK_DAYS, **RUSSIAN_DAYS}
+ALL_MONTHS = {**UZBEK_MONTHS, **RUSSIAN_MONTHS}
+NOTE_KEYWORDS = NOTE_KEYWORDS_UZ + NOTE_KEYWORDS_RU
+
+# Lookup order matters: the first listed word present in the text wins
+RELATIVE_DAYS = [(word, offset) for word, offset in ALL_DAYS.items() if isinstance(offset, int)]
+WEEKDAY_WORDS = [(word, WEEKDAYS.index(name)) for word, name in ALL_DAYS.items() if isinstance(name, str)]
+
+NOTE_KEYWORD_SET = frozenset(NOTE_KEYWORDS)
+TASK_INDICATOR_SET = frozenset(TASK_INDICATORS)
+MONTH_SET = frozenset(ALL_MONTHS)
+DAY_SET = frozenset(ALL_DAYS)
+
+TIME_PATTERNS = [
+    re.compile(r'(?:soat|в|kuni)\s*(\d{1,2})(?::(\d{2}))?'),  # soat 14:30, в 14:00
+    re.compile(r'(\d{1,2}):(\d{2})'),  # 14:30
+    re.compile(r'(\d{1,2})\.(\d{2})'),  # 14.30
+]
+# No month or day word is a prefix of another, so trie-factored alternations
+# match exactly what the plain word lists would
+MONTH_REGEX = _trie_regex(ALL_MONTHS)
+DAY_REGEX = _trie_regex(ALL_DAYS)
+
+DATE_PATTERN = re.compile(r'(\d{1,2})\s*(' + MONTH_REGEX + ')')
+DIGIT_PATTERN = re.compile(r'\d')
+
+NOTE_CLEANUP_PATTERNS = [
+    (keyword, re.compile(rf'\b{keyword}\b:?\s*', re.IGNORECASE)) for keyword in NOTE_KEYWORDS
+]
+
+# Title cleanup for calendar events, applied in order
+# (literals one of which must be present for the pattern to match, pattern)
+TITLE_DIGIT_PATTERNS = [
+    (('soat', 'в', 'kuni'), re.compile(r'(?:soat|в|kuni)\s*\d{1,2}(?::\d{2})?', re.IGNORECASE)),
+    ((':',), re.compile(r'\d{1,2}:\d{2}')),
+    (('.',), re.compile(r'\d{1,2}\.\d{2}')),
+]
+TITLE_DAY_PATTERN = re.compile(r'\b(' + DAY_REGEX + r')\b', re.IGNORECASE)
+TITLE_DATE_PATTERN = re.compile(r'\d{1,2}\s*(' + MONTH_REGEX + r')', re.IGNORECASE)
+# Removing a word-bounded token never creates or breaks another word-bounded
+# match, so the three filler words can be stripped by one pattern.
+TITLE_FILLER_PATTERN = re.compile(r'\b(?:da|в|na)\b', re.IGNORECASE)
+FILLER_WORDS = ('da', 'в', 'na')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+KEYWORDS = list(dict.fromkeys(list(ALL_DAYS) + list(ALL_MONTHS) + NOTE_KEYWORDS + TASK_INDICATORS))
+# Zero-width lookahead so overlapping keywords ("shanba" in "yakshanba") are all seen
+KEYWORD_PATTERN = re.compile('(?=(' + _trie_regex(KEYWORDS) + '))')
+# The trie reports the longest keyword at each position; shorter keywords that
+# are prefixes of it start at the same position
+KEYWORD_PREFIXES = {word: [other for other in KEYWORDS if word.startswith(other)] for word in KEYWORDS}
+
+
+def _keywords(text_lower: str) -> set:
+    """All known keywords occurring (as substrings) in the lowercased text"""
+    found = set()
+    for match in KEYWORD_PATTERN.finditer(text_lower):
+        found.update(KEYWORD_PREFIXES[match.group(1)])
+    return found
+
+
+def _time_from(text_lower: str) -> Optional[str]:
+    if not DIGIT_PATTERN.search(text_lower):
+        return None
+
+    for pattern in TIME_PATTERNS:
+        match = pattern.search(text_lower)
         if match:
             hour = int(match.group(1))
             minute = int(match.group(2)) if match.group(2) else 0
-            
+
             if 0 <= hour <= 23 and 0 <= minute <= 59:
                 return f"{hour:02d}:{minute:02d}"
-    
+
     return None
 
-def parse_date(text: str) -> Optional[datetime]:
-    """Extract date from text"""
-    text_lower = text.lower()
-    today = datetime.now()
-    
-    # Check for relative days (today, tomorrow)
-    for word, offset in {**UZBEK_DAYS, **RUSSIAN_DAYS}.items():
-        if isinstance(offset, int) and word in text_lower:
-            return today + timedelta(days=offset)
-    
-    # Check for weekdays
-    for word, day_name in {**UZBEK_DAYS, **RUSSIAN_DAYS}.items():
-        if isinstance(day_name, str) and word in text_lower:
-            target_day = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'].index(day_name)
-            current_day = today.weekday()
-            days_ahead = (target_day - current_day) % 7
-            if days_ahead == 0:
-                days_ahead = 7  # Next week
-            return today + timedelta(days=days_ahead)
-    
+
+def _date_from(text_lower: str, found: set, today: datetime) -> Optional[datetime]:
+    if found & DAY_SET:
+        # Check for relative days (today, tomorrow)
+        for word, offset in RELATIVE_DAYS:
+            if word in found:
+                return today + timedelta(days=offset)
+
+        # Check for weekdays
+        for word, target_day in WEEKDAY_WORDS:
+            if word in found:
+                days_ahead = (target_day - today.weekday()) % 7
+                if days_ahead == 0:
+                    days_ahead = 7  # Next week
+                return today + timedelta(days=days_ahead)
+
     # Check for specific dates (e.g., "25 dekabr", "25 декабря")
-    date_pattern = r'(\d{1,2})\s*(' + '|'.join(list(UZBEK_MONTHS.keys()) + list(RUSSIAN_MONTHS.keys())) + ')'
-    match = re.search(date_pattern, text_lower)
-    if match:
-        day = int(match.group(1))
-        month_word = match.group(2)
-        month = UZBEK_MONTHS.get(month_word) or RUSSIAN_MONTHS.get(month_word)
-        if month and 1 <= day <= 31:
-            year = today.year
-            if month < today.month or (month == today.month and day < today.day):
-                year += 1
-            return datetime(year, month, day)
-    
+    if found & MONTH_SET:
+        match = DATE_PATTERN.search(text_lower)
+        if match:
+            day = int(match.group(1))
+            month = ALL_MONTHS.get(match.group(2))
+            if month and 1 <= day <= 31:
+                year = today.year
+                if month < today.month or (month == today.month and day < today.day):
+                    year += 1
+                return datetime(year, month, day)
+
     return None
 
-def is_note_intent(text: str) -> bool:
-    """Determine if message is intended for notes"""
-    text_lower = text.lower()
-    
-    # Check for explicit note keywords
-    if any(keyword in text_lower for keyword in NOTE_KEYWORDS_UZ + NOTE_KEYWORDS_RU):
-        return True
-    
-    # Check for absence of time indicators (suggests it's a note, not event)
-    has_time = parse_time(text) is not None
-    has_date = parse_date(text) is not None
-    
-    # If no time/date, likely a note
-    if not has_time and not has_date:
-        # But check if it's a shopping list or task
-        task_indicators = ['olish', 'sotib', 'купить', 'сделать', 'список']
-        if any(indicator in text_lower for indicator in task_indicators):
-            return True
-    
-    return False
 
-def parse_uzbek_russian_message(text: str) -> Optional[Dict]:
+def _note_title(text: str, found: set) -> str:
+    """Strip note keywords (and a trailing colon) from the message"""
+    cleaned = text
+    present = found
+    for keyword, pattern in NOTE_CLEANUP_PATTERNS:
+        if keyword in present:
+            stripped = pattern.sub('', cleaned)
+            if stripped != cleaned:
+                # Removal can join text into new keywords; rescan what is left
+                cleaned = stripped
+                present = _keywords(cleaned.lower())
+    return cleaned
+
+
+def _event_title(text: str, text_lower: str, found: set) -> str:
     """
-    Parse Uzbek/Russian message and determine intent
-    Returns dict with intent, title, datetime, etc.
+    Strip date/time phrases from the message
+
+    Patterns run in the same order as they always have; each one is skipped
+    when the scan shows it cannot match. Once something has been removed the
+    scan is stale, so the remaining patterns run unconditionally.
     """
+    title = text
+    changed = False
+    if DIGIT_PATTERN.search(text_lower):
+        for literals, pattern in TITLE_DIGIT_PATTERNS:
+            if not changed and not any(literal in text_lower for literal in literals):
+                continue
+            stripped = pattern.sub('', title)
+            changed = changed or stripped != title
+            title = stripped
+
+    if changed or found & DAY_SET:
+        title = TITLE_DAY_PATTERN.sub('', title)
+    if changed or found & MONTH_SET:
+        title = TITLE_DATE_PATTERN.sub('', title)
+
+    title_lower = title.lower()
+    if any(word in title_lower for word in FILLER_WORDS):
+        title = TITLE_FILLER_PATTERN.sub('', title)
+
+    return WHITESPACE_PATTERN.sub(' ', title).strip()
+
+
+def _parse(text: str, now: datetime) -> Optional[Dict]:
+    """Tokenize once and derive intent, date, time and title from the same scan"""
     if not text or len(text.strip()) == 0:
         return None
-    
+
     text = text.strip()
-    
+    text_lower = text.lower()
+    found = _keywords(text_lower)
+
     # Determine if it's a note or calendar event
-    is_note = is_note_intent(text)
-    
+    if found & NOTE_KEYWORD_SET:
+        date = time = None
+        is_note = True
+    else:
+        time = _time_from(text_lower)
+        date = _date_from(text_lower, found, now)
+        # No time/date but a shopping list or task: likely a note
+        is_note = time is None and date is None and bool(found & TASK_INDICATOR_SET)
+
     if is_note:
         # Extract note title and content
-        # Remove note keywords
-        cleaned = text
-        for keyword in NOTE_KEYWORDS_UZ + NOTE_KEYWORDS_RU:
-            cleaned = re.sub(rf'\b{keyword}\b:?\s*', '', cleaned, flags=re.IGNORECASE)
-        
+        cleaned = _note_title(text, found)
         return {
             'intent': 'note',
             'title': cleaned[:100],  # First 100 chars as title
             'content': cleaned
         }
-    
-    else:
-        # Calendar event
-        date = parse_date(text)
-        time = parse_time(text)
-        
-        if not date and not time:
-            # No date/time found, treat as note
-            return {
-                'intent': 'note',
-                'title': text[:100],
-                'content': text
-            }
-        
-        # Use today if no date specified
-        if not date:
-            date = datetime.now()
-        
-        # Use default time if not specified
-        if not time:
-            time = "09:00"
-        
-        # Combine date and time
-        hour, minute = map(int, time.split(':'))
-        event_datetime = date.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-        # Extract title (remove date/time words)
-        title = text
-        # Remove common time/date phrases
-        remove_patterns = [
-            r'(?:soat|в|kuni)\s*\d{1,2}(?::\d{2})?',
-            r'\d{1,2}:\d{2}',
-            r'\d{1,2}\.\d{2}',
-            r'\b(' + '|'.join(list(UZBEK_DAYS.keys()) + list(RUSSIAN_DAYS.keys())) + r')\b',
-            r'\d{1,2}\s*(' + '|'.join(list(UZBEK_MONTHS.keys()) + list(RUSSIAN_MONTHS.keys())) + r')',
-            r'\bda\b', r'\bв\b', r'\bna\b'
-        ]
-        
-        for pattern in remove_patterns:
-            title = re.sub(pattern, '', title, flags=re.IGNORECASE)
-        
-        title = re.sub(r'\s+', ' ', title).strip()
-        
-        if not title:
-            title = "Voqea / Событие"
-        
+
+    if not date and not time:
+        # No date/time found, treat as note
         return {
-            'intent': 'calendar',
-            'title': title,
-            'datetime': event_datetime.isoformat(),
-            'description': text
+            'intent': 'note',
+            'title': text[:100],
+            'content': text
         }
 
+    # Use today if no date specified
+    if not date:
+        date = now
+
+    # Use default time if not specified
+    if not time:
+        time = "09:00"
+
+    # Combine date and time
+    hour, minute = map(int, time.split(':'))
+    event_datetime = date.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    title = _event_title(text, text_lower, found)
+    if not title:
+        title = "Voqea / Событие"
+
+    return {
+        'intent': 'calendar',
+        'title': title,
+        'datetime': event_datetime.isoformat(),
+        'description': text
+    }
+
+
+def parse_time(text: str) -> Optional[str]:
+    """Extract time from text"""
+    return _time_from(text.lower())
+
+
+def parse_date(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Extract date from text (relative to now, default: current time)"""
+    text_lower = text.lower()
+    return _date_from(text_lower, _keywords(text_lower), now or datetime.now())
+
+
+def is_note_intent(text: str, now: Optional[datetime] = None) -> bool:
+    """Determine if message is intended for notes"""
+    text_lower = text.lower()
+    found = _keywords(text_lower)
+
+    # Check for explicit note keywords
+    if found & NOTE_KEYWORD_SET:
+        return True
+
+    # If no time/date, likely a note (but only if it's a shopping list or task)
+    if _time_from(text_lower) is not None:
+        return False
+    if _date_from(text_lower, found, now or datetime.now()) is not None:
+        return False
+    return bool(found & TASK_INDICATOR_SET)
+
+
+def parse_uzbek_russian_message(text: str, now: Optional[datetime] = None) -> Optional[Dict]:
+    """
+    Parse Uzbek/Russian message and determine intent
+    Returns dict with intent, title, datetime, etc.
+    Relative dates are resolved against now (default: current time).
+    """
+    return _parse(text, now or datetime.now())
+
+def split_items(text: str) -> List[str]:
+    """Split a multi-line message into one item per non-empty line"""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def _parse_safe(text: str, now: datetime) -> Optional[Dict]:
+    try:
+        return _parse(text, now)
+    except ValueError:
+        return None  # impossible date such as "31 fevral"
+
+
+def _parse_chunk(chunk: List[str], now: datetime) -> List[Optional[Dict]]:
+    return [_parse_safe(text, now) for text in chunk]
+
+
+def parse_many(
+    texts: Iterable[str],
+    now: Optional[datetime] = None,
+    split_lines: bool = False,
+    workers: Optional[int] = None,
+    chunk_size: int = 1000
+) -> Iterator[Optional[Dict]]:
+    """
+    Parse a stream of messages, yielding one result per message in order
+
+    Args:
+        texts: Any iterable of messages, including a generator; consumed lazily
+        now: Reference time for relative dates, evaluated once for the whole batch
+        split_lines: Treat every non-empty line as a separate message
+        workers: Fan out across this many processes (for very large inputs)
+        chunk_size: Messages per process-pool task
+
+    Yields:
+        Parsed dict (as parse_uzbek_russian_message), or None for messages that
+        could not be parsed, including ones with an impossible date
+    """
+    now = now or datetime.now()
+    if split_lines:
+        texts = (line for text in texts for line in split_items(text))
+
+    if not workers or workers <= 1:
+        for text in texts:
+            yield _parse_safe(text, now)
+        return
+
+    texts = iter(texts)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            # Keep a bounded number of chunks in flight so huge inputs stream
+            while len(pending) < workers * 2:
+                chunk = list(islice(texts, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_parse_chunk, chunk, now))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
 # Test function
 if __name__ == '__main__':
     test_messages = [
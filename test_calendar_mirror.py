@@ -0,0 +1,75 @@
+"""
+Tests for the calendar mirror state handling in backend/app.py and
+backend/calendar_sync.py, with the database and Google replaced by fakes
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import app as backend  # noqa: E402
+from calendar_sync import is_stale, needs_rebuild, synced_at  # noqa: E402
+
+# What partitions.py leaves behind after retention dropped some of a user's rows
+EXPIRED_STATE = {'user_id': 7, 'sync_token': None, 'synced_at': None, 'full_synced_at': datetime(2026, 1, 1)}
+SYNCED_STATE = {'user_id': 7, 'sync_token': 'token-2', 'synced_at': datetime(2026, 10, 1, 12), 'full_synced_at': None}
+
+
+def test_expired_state_needs_rebuild():
+    assert needs_rebuild(None)
+    assert needs_rebuild(EXPIRED_STATE)
+    assert not needs_rebuild(SYNCED_STATE)
+
+
+def test_expired_state_is_stale_and_has_no_synced_at():
+    assert is_stale(EXPIRED_STATE)
+    assert synced_at(EXPIRED_STATE) is None
+    assert synced_at(SYNCED_STATE) == '2026-10-01T12:00:00Z'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    states = []
+    synced = []
+
+    async def get_state(user_id):
+        return states.pop(0)
+
+    async def get_upcoming(user_id, now, limit):
+        return []
+
+    async def run_blocking(fn, *args, user_id=None, **kwargs):
+        synced.append(fn.__name__)
+        return {'status': 'synced', 'mode': 'full', 'changes': 0}
+
+    monkeypatch.setattr(backend, 'get_calendar_sync_state_async', get_state)
+    monkeypatch.setattr(backend, 'get_upcoming_events_async', get_upcoming)
+    monkeypatch.setattr(backend, 'run_blocking', run_blocking)
+    return TestClient(backend.app), states, synced
+
+
+def test_upcoming_rebuilds_mirror_after_expiry(client):
+    http, states, synced = client
+    states.extend([EXPIRED_STATE, SYNCED_STATE])
+
+    response = http.get('/api/calendar/upcoming/7')
+
+    assert response.status_code == 200
+    assert synced == ['sync_user_calendar']
+    assert response.json() == {'events': [], 'synced_at': '2026-10-01T12:00:00Z'}
+
+
+def test_upcoming_survives_failed_rebuild_after_expiry(client):
+    http, states, synced = client
+    # e.g. the rebuild lost a race and the state is still the reset one
+    states.extend([EXPIRED_STATE, EXPIRED_STATE])
+
+    response = http.get('/api/calendar/upcoming/7')
+
+    assert response.status_code == 200
+    assert response.json()['synced_at'] is None
@@ -0,0 +1,77 @@
+"""
+Tests for the queued create endpoints in backend/app.py, with the database,
+job queue and Google replaced by fakes
+"""
+
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import app as backend  # noqa: E402
+
+EVENT = {'user_id': 7, 'title': 'Meeting', 'datetime': '2026-10-20T10:00:00'}
+NOTE = {'user_id': 7, 'title': 'Milk'}
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    state = {'credentials': object(), 'enqueued': []}
+
+    async def run_blocking(fn, *args, user_id=None, **kwargs):
+        return state['credentials']
+
+    async def enqueue(user_id, kind, payload, max_attempts=5, conn=None):
+        state['enqueued'].append((kind, payload))
+        return len(state['enqueued'])
+
+    async def mark_active(user_id):
+        pass
+
+    monkeypatch.setattr(backend, 'run_blocking', run_blocking)
+    monkeypatch.setattr(backend.job_worker, 'enqueue', enqueue)
+    monkeypatch.setattr(backend, 'mark_notes_active_async', mark_active)
+    state['client'] = TestClient(backend.app)
+    return state
+
+
+@pytest.mark.parametrize('path,body', [('/api/calendar/create', EVENT), ('/api/notes/create', NOTE)])
+def test_create_queues_job(fake, path, body):
+    response = fake['client'].post(path, json=body)
+
+    assert response.status_code == 202
+    assert response.json() == {'status': 'queued', 'job_id': 1}
+
+
+@pytest.mark.parametrize('path,body', [('/api/calendar/create', EVENT), ('/api/notes/create', NOTE)])
+def test_create_without_usable_credentials_is_401(fake, path, body):
+    # Stored tokens exist but can't be refreshed, or lack a scope
+    fake['credentials'] = None
+
+    response = fake['client'].post(path, json=body)
+
+    assert response.status_code == 401
+    assert fake['enqueued'] == []
+
+
+def test_dead_job_exposes_error_code(fake, monkeypatch):
+    async def get_job(job_id):
+        return {
+            'id': job_id, 'user_id': 7, 'kind': 'notes.create', 'status': 'dead', 'attempts': 1,
+            'result': {'error_code': 'unauthenticated'}, 'last_error': 'User not authenticated',
+        }
+
+    monkeypatch.setattr(backend, 'get_job_async', get_job)
+    job = fake['client'].get('/api/jobs/3', params={'user_id': 7}).json()
+
+    assert job['status'] == 'dead'
+    assert job['error_code'] == 'unauthenticated'
+
+
+def test_update_with_invalid_datetime_is_400(fake):
+    response = fake['client'].patch('/api/calendar/events/abc', json={'user_id': 7, 'datetime': 'tomorrow-ish'})
+
+    assert response.status_code == 400
@@ -0,0 +1,103 @@
+"""
+Unit tests for backend/credentials_cache.py and its invalidation by db.py
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import credentials_cache as cache_module  # noqa: E402
+import db  # noqa: E402
+from credentials_cache import CredentialsCache  # noqa: E402
+
+FAKE_TIME_MODULES = (cache_module,)
+
+
+class FakeCredentials:
+    def __init__(self, expires_in=None):
+        self.expiry = datetime.utcnow() + timedelta(seconds=expires_in) if expires_in is not None else None
+
+
+@pytest.fixture(autouse=True)
+def cache_limits(monkeypatch):
+    monkeypatch.setattr(cache_module, 'CACHE_MAX_TTL', 900)
+    monkeypatch.setattr(cache_module, 'CACHE_EXPIRY_SKEW', 60)
+
+
+def lives_for(cache, clock, user_id):
+    """Seconds (to the nearest 10) until user_id's entry goes stale"""
+    start = clock.now
+    while cache.get(user_id) is not None:
+        clock.now += 10
+    lifetime = clock.now - start
+    clock.now = start
+    return lifetime
+
+
+def test_ttl_is_capped_by_max_ttl(clock):
+    cache = CredentialsCache()
+    cache.put(1, FakeCredentials(expires_in=3600))
+    cache.put(2, FakeCredentials())  # no expiry known
+    assert lives_for(cache, clock, 1) == 900
+    assert lives_for(cache, clock, 2) == 900
+
+
+def test_ttl_ends_skew_before_token_expiry(clock):
+    cache = CredentialsCache()
+    cache.put(1, FakeCredentials(expires_in=300))
+    assert 230 <= lives_for(cache, clock, 1) <= 240  # 300 - 60
+
+
+def test_token_expiring_within_skew_is_not_cached(clock):
+    cache = CredentialsCache()
+    cache.put(1, FakeCredentials(expires_in=30))
+    assert cache.get(1) is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = CredentialsCache(max_size=2)
+    for user_id in (1, 2):
+        cache.put(user_id, FakeCredentials(expires_in=3600))
+    cache.get(1)
+    cache.put(3, FakeCredentials(expires_in=3600))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+class FakeConnection:
+    @contextmanager
+    def cursor(self):
+        yield self
+
+    def execute(self, *args):
+        pass
+
+
+@pytest.fixture
+def cached(monkeypatch, clock):
+    cache = CredentialsCache()
+    cache.put(7, FakeCredentials(expires_in=3600))
+    monkeypatch.setattr(db, 'credentials_cache', cache)
+
+    @contextmanager
+    def connection():
+        yield FakeConnection()
+
+    monkeypatch.setattr(db, 'get_db_connection', connection)
+    return cache
+
+
+def test_save_user_tokens_invalidates(cached):
+    db.save_user_tokens(7, {'token': 'new'})
+    assert cached.get(7) is None
+    assert cached.stats()['invalidations'] == 1
+
+
+def test_delete_user_tokens_invalidates(cached):
+    db.delete_user_tokens(7)
+    assert cached.get(7) is None
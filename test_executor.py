@@ -0,0 +1,89 @@
+"""
+Unit tests for backend/executor.py and its 503 mapping in backend/app.py
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import app as backend  # noqa: E402
+from executor import BlockingExecutor, ExecutorSaturated, current_user_id  # noqa: E402
+
+
+def test_calls_for_one_user_run_one_at_a_time_in_arrival_order():
+    executor = BlockingExecutor(workers=4, max_queue=8)
+    order = []
+    overlapping = []
+    running = threading.Lock()
+
+    def call(index):
+        if not running.acquire(blocking=False):
+            overlapping.append(index)
+            return
+        try:
+            time.sleep(0.01)
+            order.append((index, current_user_id.get()))
+        finally:
+            running.release()
+
+    async def main():
+        await asyncio.gather(*(executor.run(call, i, user_id=7) for i in range(6)))
+
+    asyncio.run(main())
+    executor.shutdown()
+
+    assert overlapping == []
+    assert order == [(i, 7) for i in range(6)]
+
+
+def test_different_users_run_in_parallel():
+    executor = BlockingExecutor(workers=2, max_queue=0)
+    barrier = threading.Barrier(2, timeout=2)
+
+    async def main():
+        # Deadlocks (and the barrier times out) unless both calls run at once
+        await asyncio.gather(executor.run(barrier.wait, user_id=1), executor.run(barrier.wait, user_id=2))
+
+    asyncio.run(main())
+    executor.shutdown()
+
+
+def test_admission_cap_rejects_beyond_workers_plus_queue():
+    executor = BlockingExecutor(workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def main():
+        held = [asyncio.ensure_future(executor.run(release.wait, 5)) for _ in range(3)]
+        await asyncio.sleep(0)  # let them register as pending
+        with pytest.raises(ExecutorSaturated) as saturated:
+            await executor.run(lambda: None)
+        release.set()
+        await asyncio.gather(*held)
+        return saturated.value
+
+    error = asyncio.run(main())
+    executor.shutdown()
+
+    assert error.retry_after > 0
+    assert executor.stats()['rejected'] == 1
+    assert executor.stats()['completed'] == 3
+
+
+def test_saturation_becomes_503_with_retry_after(monkeypatch):
+    async def saturated(fn, *args, user_id=None, **kwargs):
+        raise ExecutorSaturated(2)
+
+    monkeypatch.setattr(backend.executor, 'run', saturated)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(backend.run_blocking(lambda: None, user_id=7))
+
+    assert error.value.status_code == 503
+    assert error.value.headers == {'Retry-After': '2'}
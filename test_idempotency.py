@@ -0,0 +1,144 @@
+"""
+Tests for Idempotency-Key handling of the create endpoints in backend/app.py,
+with the database and job queue replaced by fakes
+"""
+
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import app as backend  # noqa: E402
+from idempotency import request_fingerprint  # noqa: E402
+
+NOTE = {'user_id': 7, 'title': 'Milk', 'content': ''}
+
+
+def test_fingerprint_ignores_key_order_but_not_values():
+    assert request_fingerprint({'a': 1, 'b': 2}) == request_fingerprint({'b': 2, 'a': 1})
+    assert request_fingerprint({'a': 1}) != request_fingerprint({'a': 2})
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    state = {'stored': {}, 'enqueued': 0}
+
+    @asynccontextmanager
+    async def connection():
+        yield None
+
+    async def reserve(conn, user_id, endpoint, key, request_hash, ttl, pending_timeout=None):
+        existing = state['stored'].get((user_id, endpoint, key))
+        if existing is None:
+            state['stored'][(user_id, endpoint, key)] = {'request_hash': request_hash, 'response': None}
+        return existing
+
+    async def store(conn, user_id, endpoint, key, response):
+        state['stored'][(user_id, endpoint, key)]['response'] = response
+
+    async def enqueue(user_id, kind, payload, max_attempts=5, conn=None):
+        state['enqueued'] += 1
+        return state['enqueued']
+
+    async def run_blocking(fn, *args, user_id=None, **kwargs):
+        return object()  # usable credentials
+
+    async def mark_active(user_id):
+        pass
+
+    monkeypatch.setattr(backend, 'get_async_db_connection', connection)
+    monkeypatch.setattr(backend, 'reserve_idempotency_key_async', reserve)
+    monkeypatch.setattr(backend, 'store_idempotent_response_async', store)
+    monkeypatch.setattr(backend.job_worker, 'enqueue', enqueue)
+    monkeypatch.setattr(backend, 'run_blocking', run_blocking)
+    monkeypatch.setattr(backend, 'mark_notes_active_async', mark_active)
+    state['client'] = TestClient(backend.app)
+    return state
+
+
+def test_repeated_key_replays_stored_response(keys):
+    headers = {'Idempotency-Key': '100:5'}
+    first = keys['client'].post('/api/notes/create', json=NOTE, headers=headers)
+    second = keys['client'].post('/api/notes/create', json=NOTE, headers=headers)
+
+    assert first.json() == second.json() == {'status': 'queued', 'job_id': 1}
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert keys['enqueued'] == 1
+
+
+def test_key_reused_for_different_request_is_422(keys):
+    headers = {'Idempotency-Key': '100:5'}
+    keys['client'].post('/api/notes/create', json=NOTE, headers=headers)
+
+    response = keys['client'].post('/api/notes/create', json={**NOTE, 'title': 'Eggs'}, headers=headers)
+
+    assert response.status_code == 422
+    assert keys['enqueued'] == 1
+
+
+def test_overlong_key_is_400(keys):
+    response = keys['client'].post('/api/notes/create', json=NOTE, headers={'Idempotency-Key': 'k' * 256})
+
+    assert response.status_code == 400
+    assert keys['enqueued'] == 0
+
+
+BATCH = {'user_id': 7, 'events': [{'title': 'Meeting', 'datetime': '2026-10-20T10:00:00'}]}
+
+
+@pytest.fixture
+def batch(keys, monkeypatch):
+    keys['batches'] = 0
+    keys['released'] = []
+
+    async def create_batch_events(creds, data):
+        keys['batches'] += 1
+        if keys.get('google_down'):
+            raise RuntimeError('backend error')
+        return {'status': 'completed', 'created': 1, 'failed': 0, 'results': []}
+
+    async def release(conn, user_id, endpoint, key):
+        keys['released'].append(key)
+        del keys['stored'][(user_id, endpoint, key)]
+
+    monkeypatch.setattr(backend, 'create_batch_events', create_batch_events)
+    monkeypatch.setattr(backend, 'release_idempotency_key_async', release)
+    return keys
+
+
+def test_batch_repeat_replays_without_creating_again(batch):
+    headers = {'Idempotency-Key': '100:6'}
+    first = batch['client'].post('/api/calendar/batch', json=BATCH, headers=headers)
+    second = batch['client'].post('/api/calendar/batch', json=BATCH, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert batch['batches'] == 1
+
+
+def test_batch_repeat_while_first_runs_is_409(batch):
+    batch['stored'][(7, 'calendar.batch', '100:6')] = {
+        'request_hash': request_fingerprint(backend.CalendarBatchCreate(**BATCH).model_dump()), 'response': None,
+    }
+
+    response = batch['client'].post('/api/calendar/batch', json=BATCH, headers={'Idempotency-Key': '100:6'})
+
+    assert response.status_code == 409
+    assert 'Retry-After' in response.headers
+    assert batch['batches'] == 0
+
+
+def test_failed_batch_releases_key_for_retry(batch):
+    headers = {'Idempotency-Key': '100:6'}
+    batch['google_down'] = True
+    assert batch['client'].post('/api/calendar/batch', json=BATCH, headers=headers).status_code == 500
+    assert batch['released'] == ['100:6']
+
+    batch['google_down'] = False
+    assert batch['client'].post('/api/calendar/batch', json=BATCH, headers=headers).status_code == 200
+    assert batch['batches'] == 2
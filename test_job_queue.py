@@ -0,0 +1,166 @@
+"""
+Tests for the job lease handling in backend/job_queue.py and the retried
+note create in backend/job_handlers.py, with the database and Google
+replaced by fakes
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import db  # noqa: E402
+import job_handlers  # noqa: E402
+import job_queue  # noqa: E402
+from job_queue import JobWorker, current_job, register  # noqa: E402
+
+JOB = {
+    'id': 3, 'user_id': 7, 'kind': 'test.slow', 'payload': {}, 'attempts': 2, 'max_attempts': 5,
+    'created_at': datetime(2026, 10, 17, 12),
+}
+
+
+@register('test.slow')
+def slow_job(user_id, payload):
+    time.sleep(0.1)
+    return {'attempts': current_job.get()['attempts']}
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    state = {'extended': [], 'completed': [], 'failed': [], 'holds_lease': True}
+
+    async def extend(job_id, attempts, lease_seconds):
+        state['extended'].append((job_id, attempts))
+        return state['holds_lease']
+
+    async def complete(job_id, attempts, result):
+        state['completed'].append((job_id, attempts, result))
+        return state['holds_lease']
+
+    async def fail(job_id, attempts, error, retry_at, error_code=None):
+        state['failed'].append((job_id, attempts, error_code))
+        return state['holds_lease']
+
+    monkeypatch.setattr(job_queue, 'JOB_LEASE_SECONDS', 0.06)
+    monkeypatch.setattr(job_queue, 'extend_job_lease_async', extend)
+    monkeypatch.setattr(job_queue, 'complete_job_async', complete)
+    monkeypatch.setattr(job_queue, 'fail_job_async', fail)
+    return state
+
+
+def test_lease_is_extended_while_job_runs(jobs):
+    worker = JobWorker()
+    asyncio.run(worker._run(dict(JOB)))
+
+    assert len(jobs['extended']) >= 2
+    assert set(jobs['extended']) == {(3, 2)}
+    assert jobs['completed'] == [(3, 2, {'attempts': 2})]
+    assert worker.counters['succeeded'] == 1
+
+
+def test_result_of_superseded_attempt_is_not_counted(jobs):
+    jobs['holds_lease'] = False
+    worker = JobWorker()
+    asyncio.run(worker._run(dict(JOB)))
+
+    assert jobs['extended'] == [(3, 2)]  # stops renewing once the lease is lost
+    assert worker.counters['succeeded'] == 0
+    assert worker.counters['superseded'] == 1
+
+
+@pytest.fixture
+def google(monkeypatch):
+    state = {'existing': None, 'created': [], 'searched': []}
+
+    def find_recent_note(creds, title, content, since):
+        state['searched'].append(since)
+        return state['existing']
+
+    def create_keep_note(creds, title, content):
+        state['created'].append(title)
+        return {'name': 'new', 'status': 'needsAction'}
+
+    monkeypatch.setattr(job_handlers, 'get_google_credentials', lambda user_id: object())
+    monkeypatch.setattr(job_handlers, 'find_recent_note', find_recent_note)
+    monkeypatch.setattr(job_handlers, 'create_keep_note', create_keep_note)
+    monkeypatch.setattr(job_handlers.write_behind, 'record_notes', lambda user_id, notes: None)
+    return state
+
+
+def run_note_job(attempts):
+    token = current_job.set({**JOB, 'attempts': attempts})
+    try:
+        return job_handlers.create_note_job(7, {'title': 'Milk'})
+    finally:
+        current_job.reset(token)
+
+
+def test_first_attempt_creates_without_lookup(google):
+    assert run_note_job(1)['note_id'] == 'new'
+    assert google['searched'] == []
+
+
+def test_retried_note_create_reuses_earlier_note(google):
+    google['existing'] = {'name': 'earlier', 'status': 'needsAction'}
+
+    assert run_note_job(2)['note_id'] == 'earlier'
+    assert google['created'] == []
+    assert google['searched'] == [JOB['created_at'] - job_handlers.RETRY_MATCH_SKEW]
+
+
+def test_retried_note_create_creates_when_nothing_found(google):
+    assert run_note_job(2)['note_id'] == 'new'
+    assert google['created'] == ['Milk']
+
+
+class RecordingCursor:
+    """Records statements; answers the dead-letter sweep and the claim with canned rows"""
+
+    def __init__(self, statements, answers):
+        self.statements = statements
+        self.answers = answers
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params):
+        self.statements.append((' '.join(query.split()), params))
+
+    async def fetchall(self):
+        return self.answers.pop(0)
+
+
+def test_claim_dead_letters_jobs_whose_last_attempt_lost_its_lease(monkeypatch):
+    # No database here: check the statements claim_jobs_async sends
+    statements = []
+    answers = [[{'id': 4}], [dict(JOB)]]
+
+    class Connection:
+        def cursor(self, row_factory=None):
+            return RecordingCursor(statements, answers)
+
+    @asynccontextmanager
+    async def connection():
+        yield Connection()
+
+    monkeypatch.setattr(db, 'get_async_db_connection', connection)
+    claimed = asyncio.run(db.claim_jobs_async(8, 120))
+
+    assert claimed == [JOB]
+    (sweep, sweep_params), (claim, _) = statements
+    assert "status = 'dead'" in sweep
+    assert "status = 'running' AND locked_until < %(now)s AND attempts >= max_attempts" in sweep
+    assert json.loads(sweep_params['result']) == {'error_code': 'lease_expired'}
+    # An expired lease is only reclaimed while attempts remain
+    assert "(status = 'running' AND locked_until < %(now)s AND attempts < max_attempts)" in claim
@@ -0,0 +1,163 @@
+"""
+Tests for the note backend registry and circuit breaker in
+backend/note_backends.py, with time and the backends replaced by fakes
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+import httplib2
+import pytest
+from google.auth.exceptions import RefreshError
+from googleapiclient.errors import HttpError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import note_backends  # noqa: E402
+import notes  # noqa: E402
+from note_backends import BackendRegistry, CircuitBreaker, NoBackendAvailable  # noqa: E402
+from rate_limiter import RateLimited  # noqa: E402
+
+FAKE_TIME_MODULES = (note_backends,)
+
+CREDS = SimpleNamespace(scopes=['https://www.googleapis.com/auth/tasks'])
+
+
+class Unsupported(Exception):
+    pass
+
+
+class FakeBackend:
+    def __init__(self, name, errors=()):
+        self.name = name
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, credentials, title, content):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {'name': f'{self.name}-{title}'}
+
+
+def registry(keep, tasks, **keep_options):
+    reg = BackendRegistry(order=['keep', 'tasks'], reprobe_interval=3600)
+    reg.register('keep', keep, is_unsupported=lambda e: isinstance(e, Unsupported), **keep_options)
+    reg.register('tasks', tasks)
+    return reg
+
+
+def test_breaker_opens_after_threshold_and_half_opens_after_cooldown(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=60)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    clock.now += 60
+    assert breaker.allow() and breaker.state == 'half_open'
+    assert not breaker.allow()  # only one trial call
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.failures == 0
+
+
+def test_unsupported_backend_is_skipped_until_reprobe(clock):
+    keep, tasks = FakeBackend('keep', [Unsupported()]), FakeBackend('tasks')
+    reg = registry(keep, tasks)
+
+    assert reg.create(CREDS, 'a', '') == {'name': 'tasks-a'}
+    assert reg.create(CREDS, 'b', '') == {'name': 'tasks-b'}
+    assert keep.calls == 1
+    assert reg.stats()['keep']['available'] is False
+
+    clock.now += 3600
+    assert reg.create(CREDS, 'c', '') == {'name': 'keep-c'}
+    assert reg.stats()['keep']['available'] is True
+
+
+def test_transient_failures_trip_breaker_and_fall_through(clock):
+    keep, tasks = FakeBackend('keep', [RuntimeError('503')] * 5), FakeBackend('tasks')
+    reg = registry(keep, tasks)
+
+    for i in range(6):
+        assert reg.create(CREDS, str(i), '') == {'name': f'tasks-{i}'}
+
+    stats = reg.stats()['keep']
+    assert keep.calls == note_backends.BREAKER_THRESHOLD
+    assert stats['breaker'] == 'open' and stats['available'] is None
+    assert stats['skipped'] == 1
+
+
+def test_backend_rejecting_credentials_is_never_called(clock):
+    keep, tasks = FakeBackend('keep'), FakeBackend('tasks')
+    reg = registry(keep, tasks, supports=notes._has_keep_scope)
+
+    assert reg.create(CREDS, 'a', '') == {'name': 'tasks-a'}
+    assert keep.calls == 0
+
+    keep_creds = SimpleNamespace(scopes=CREDS.scopes + [notes.KEEP_SCOPE])
+    assert reg.create(keep_creds, 'b', '') == {'name': 'keep-b'}
+
+
+def test_last_error_or_no_backend_is_raised(clock):
+    reg = registry(FakeBackend('keep', [Unsupported()]), FakeBackend('tasks', [RuntimeError('down')]))
+    with pytest.raises(RuntimeError):
+        reg.create(CREDS, 'a', '')
+
+    empty = BackendRegistry(order=['keep'])
+    with pytest.raises(NoBackendAvailable):
+        empty.create(CREDS, 'a', '')
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'{}')
+
+
+@pytest.mark.parametrize('error', [RefreshError('invalid_grant'), RateLimited(2.0), http_error(400), http_error(401)])
+def test_per_user_errors_are_raised_without_tripping_breaker(clock, error):
+    tasks = FakeBackend('tasks', [error] * 10)
+    reg = BackendRegistry(order=['tasks'])
+    reg.register('tasks', tasks, is_outage=notes._is_outage)
+
+    for _ in range(10):
+        with pytest.raises(type(error)):
+            reg.create(CREDS, 'a', '')
+
+    assert reg.stats()['tasks']['breaker'] == 'closed'
+    assert reg.create(CREDS, 'b', '') == {'name': 'tasks-b'}
+
+
+def test_outages_trip_breaker(clock):
+    errors = [http_error(503)] * 3 + [TimeoutError()] + [ConnectionResetError()]
+    reg = BackendRegistry(order=['tasks'])
+    reg.register('tasks', FakeBackend('tasks', errors), is_outage=notes._is_outage)
+
+    for _ in errors:
+        with pytest.raises(Exception):
+            reg.create(CREDS, 'a', '')
+
+    assert reg.stats()['tasks']['breaker'] == 'open'
+    with pytest.raises(NoBackendAvailable):
+        reg.create(CREDS, 'b', '')
+
+
+def test_per_user_error_on_trial_call_allows_another_trial(clock):
+    errors = [http_error(503)] * note_backends.BREAKER_THRESHOLD + [RefreshError('invalid_grant')]
+    reg = BackendRegistry(order=['tasks'])
+    reg.register('tasks', FakeBackend('tasks', errors), is_outage=notes._is_outage)
+    for _ in range(note_backends.BREAKER_THRESHOLD):
+        with pytest.raises(HttpError):
+            reg.create(CREDS, 'a', '')
+
+    clock.now += note_backends.BREAKER_COOLDOWN
+    with pytest.raises(RefreshError):
+        reg.create(CREDS, 'a', '')  # the trial call, for a user with a revoked token
+
+    assert reg.create(CREDS, 'b', '') == {'name': 'tasks-b'}
+    assert reg.stats()['tasks']['breaker'] == 'closed'
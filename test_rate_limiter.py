@@ -0,0 +1,143 @@
+"""
+Unit tests for backend/rate_limiter.py and google_services.execute_batch
+
+Time is simulated, so nothing sleeps and no Google call is made.
+"""
+
+import os
+import sys
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import google_services  # noqa: E402
+import rate_limiter  # noqa: E402
+from executor import current_user_id  # noqa: E402
+from rate_limiter import RateLimited, RateLimiter, TokenBucket  # noqa: E402
+
+
+FAKE_TIME_MODULES = (rate_limiter, google_services)
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock):
+    monkeypatch.setattr(rate_limiter, 'USER_RATE', 5.0)
+    monkeypatch.setattr(rate_limiter, 'USER_BURST', 10.0)
+    monkeypatch.setattr(rate_limiter, 'GLOBAL_RATE', 50.0)
+    monkeypatch.setattr(rate_limiter, 'GLOBAL_BURST', 100.0)
+    monkeypatch.setattr(rate_limiter, 'MAX_WAIT', 5.0)
+    token = current_user_id.set(42)
+    yield RateLimiter()
+    current_user_id.reset(token)
+
+
+def test_bucket_rejects_charge_it_could_never_cover(clock):
+    bucket = TokenBucket(rate=5, capacity=10)
+    # A full 50-call batch needs (49 - 10) / 5 = 7.8s, more than max_wait
+    assert bucket.reserve(49, max_wait=5) is None
+    assert bucket.tokens == 10  # nothing taken
+
+
+def test_bucket_paces_batch_sized_charges(clock):
+    bucket = TokenBucket(rate=5, capacity=10)
+    assert bucket.reserve(10, max_wait=5) == 0
+    assert bucket.reserve(10, max_wait=5) == pytest.approx(2.0)
+    # Debt is paid off in order before anyone else gets tokens
+    assert bucket.reserve(10, max_wait=5) == pytest.approx(4.0)
+    assert bucket.reserve(10, max_wait=5) is None
+
+
+def test_max_batch_fits_user_bucket(limiter):
+    assert limiter.max_batch() == 10
+
+
+def test_max_batch_without_user_uses_global_bucket(limiter):
+    token = current_user_id.set(None)
+    try:
+        assert limiter.max_batch() == 100
+    finally:
+        current_user_id.reset(token)
+
+
+def test_acquire_admits_consecutive_max_batches(limiter, clock):
+    for _ in range(5):
+        limiter.acquire(limiter.max_batch())
+    assert sum(clock.slept) == pytest.approx(8.0)  # 40 calls beyond the burst at 5/s
+
+
+def test_acquire_rejects_oversized_charge(limiter):
+    with pytest.raises(RateLimited):
+        limiter.acquire(49)
+
+
+def rate_limit_error():
+    return HttpError(httplib2.Response({'status': 429, 'retry-after': '1'}), b'{}')
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            if self.service.throttled.pop(request, False):
+                self.callback(request_id, None, rate_limit_error())
+            else:
+                self.callback(request_id, {'id': request}, None)
+
+
+class FakeService:
+    def __init__(self, throttled=()):
+        self.batches = []
+        self.throttled = {request: True for request in throttled}
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+def test_execute_batch_chunks_to_max_batch(monkeypatch, limiter):
+    monkeypatch.setattr(google_services, 'rate_limiter', limiter)
+    service = FakeService()
+
+    results = google_services.execute_batch(service, [f'r{i}' for i in range(50)])
+
+    assert service.batches == [10] * 5
+    assert [response['id'] for response, error in results] == [f'r{i}' for i in range(50)]
+
+
+def test_execute_batch_retries_rate_limited_parts(monkeypatch, limiter, clock):
+    monkeypatch.setattr(google_services, 'rate_limiter', limiter)
+    service = FakeService(throttled=['r3', 'r7'])
+
+    results = google_services.execute_batch(service, [f'r{i}' for i in range(8)])
+
+    assert service.batches == [8, 2]
+    assert all(error is None for _, error in results)
+    assert results[3][0] == {'id': 'r3'}
+    assert max(clock.slept) >= 1.0  # honored Retry-After
+
+
+def test_execute_batch_gives_up_after_max_retries(monkeypatch, limiter):
+    monkeypatch.setattr(google_services, 'rate_limiter', limiter)
+    monkeypatch.setattr(google_services, 'MAX_RETRIES', 2)
+
+    class AlwaysThrottled(FakeService):
+        def new_batch_http_request(self, callback):
+            self.throttled = {'r0': True}
+            return FakeBatch(self, callback)
+
+    service = AlwaysThrottled()
+    results = google_services.execute_batch(service, ['r0', 'r1'])
+
+    assert service.batches == [2, 1, 1]
+    assert isinstance(results[0][1], HttpError)
+    assert results[1][1] is None
@@ -0,0 +1,33 @@
+"""
+Tests for the secret check of backend/telegram_webhook.py
+"""
+
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import telegram_webhook  # noqa: E402
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(telegram_webhook, 'WEBHOOK_SECRET', 's3cret')
+    monkeypatch.setattr(telegram_webhook, '_application', object())
+    app = FastAPI()
+    app.include_router(telegram_webhook.router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize('path,header', [
+    ('/telegram/webhook/s%C3%A9cret', 's3cret'),  # non-ASCII path secret
+    ('/telegram/webhook/s3cret', 'sécret'.encode()),  # non-ASCII header
+    ('/telegram/webhook/wrong', 's3cret'),
+])
+def test_wrong_secret_is_403(client, path, header):
+    response = client.post(path, json={}, headers={'X-Telegram-Bot-Api-Secret-Token': header})
+    assert response.status_code == 403
@@ -0,0 +1,64 @@
+"""
+Tests for backend/token_refresher.py with the database and Google replaced
+by fakes
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import auth  # noqa: E402
+import token_refresher  # noqa: E402
+
+
+class FakeCredentials:
+    def __init__(self, expiry):
+        self.expiry = expiry
+        self.valid = expiry > datetime.utcnow()
+
+
+@pytest.fixture
+def refresher(monkeypatch):
+    state = {'claimed': [(1, {'refresh_token': 'a'}), (2, {'refresh_token': 'b'})], 'refreshed': [], 'deferred': []}
+
+    def claim(expires_before, now, claim_until, limit):
+        assert claim_until > now
+        return state['claimed']
+
+    def refresh(user_id, tokens, fresh_until=None, counter='request_path'):
+        state['refreshed'].append((user_id, fresh_until, counter))
+        if user_id == 2:
+            raise RuntimeError('invalid_grant')
+
+    def defer(user_ids, retry_at):
+        state['deferred'].append(list(user_ids))
+
+    monkeypatch.setattr(token_refresher, 'claim_expiring_tokens', claim)
+    monkeypatch.setattr(token_refresher, 'refresh_user_credentials', refresh)
+    monkeypatch.setattr(token_refresher, 'defer_token_refresh', defer)
+    monkeypatch.setattr(token_refresher, 'REFRESH_RATE', 0)
+    return state
+
+
+def test_batch_refreshes_through_single_flight_path_and_defers_failures(refresher):
+    assert token_refresher.refresh_batch() == 2
+
+    assert [(user_id, counter) for user_id, _, counter in refresher['refreshed']] == [
+        (1, 'background'), (2, 'background')
+    ]
+    window = refresher['refreshed'][0][1] - datetime.utcnow()
+    assert timedelta(seconds=token_refresher.REFRESH_WINDOW - 5) < window
+    assert refresher['deferred'] == [[2]]
+
+
+def test_token_inside_refresh_window_is_not_fresh():
+    soon = datetime.utcnow() + timedelta(minutes=8)
+    creds = FakeCredentials(soon)
+
+    assert auth._fresh(creds, None)
+    assert not auth._fresh(creds, datetime.utcnow() + timedelta(minutes=10))
+    assert not auth._fresh(None, None)
@@ -0,0 +1,116 @@
+"""
+Unit tests for backend/write_behind.py with the COPY writers replaced by fakes
+"""
+
+import os
+import sys
+
+import psycopg
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import write_behind as write_behind_module  # noqa: E402
+from write_behind import WriteBehindBuffer  # noqa: E402
+
+
+class FlakyWriter:
+    def __init__(self):
+        self.failing = True
+        self.written = []
+
+    def __call__(self, rows):
+        if self.failing:
+            raise RuntimeError('database is down')
+        self.written.extend(rows)
+        return len(rows)
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    monkeypatch.setattr(write_behind_module, 'WRITE_BEHIND_BATCH_SIZE', 1000)
+    monkeypatch.setattr(write_behind_module, 'WRITE_BEHIND_MAX_ROWS', 5)
+    buffer = WriteBehindBuffer()
+    buffer.writer = FlakyWriter()
+    buffer._writers = {'events': lambda rows: len(rows), 'notes': buffer.writer}
+    return buffer
+
+
+def notes(*titles):
+    return [{'id': title, 'title': title, 'content': '', 'status': 'needsAction'} for title in titles]
+
+
+def test_failed_flush_requeues_rows_for_next_flush(buffer):
+    buffer.record_notes(7, notes('a', 'b'))
+
+    assert buffer.flush() == 0
+    assert buffer.stats()['pending']['notes'] == 2
+    assert buffer.counters['failures'] == 1
+
+    buffer.writer.failing = False
+    assert buffer.flush() == 2
+    assert [row['title'] for row in buffer.writer.written] == ['a', 'b']
+    assert buffer.stats()['pending']['notes'] == 0
+
+
+def test_requeue_keeps_order_ahead_of_newer_rows(buffer):
+    buffer.record_notes(7, notes('a', 'b'))
+    buffer.flush()
+    buffer.record_notes(7, notes('c'))
+
+    buffer.writer.failing = False
+    buffer.flush()
+
+    assert [row['title'] for row in buffer.writer.written] == ['a', 'b', 'c']
+
+
+def test_requeue_drops_oldest_rows_beyond_cap(buffer):
+    buffer.record_notes(7, notes('a', 'b', 'c', 'd'))
+    buffer.flush()
+    buffer.record_notes(7, notes('e', 'f', 'g'))
+    buffer.flush()
+
+    assert buffer.counters['dropped'] == 2
+    assert buffer.stats()['pending']['notes'] == 5
+
+    buffer.writer.failing = False
+    buffer.flush()
+    assert [row['title'] for row in buffer.writer.written] == ['c', 'd', 'e', 'f', 'g']
+
+
+def test_failure_of_one_table_does_not_block_the_other(buffer):
+    buffer.record_notes(7, notes('a'))
+    buffer.record_events(7, [{'id': 'e1', 'summary': 'Meeting', 'start': {'dateTime': '2026-10-20T10:00:00Z'}}])
+
+    assert buffer.flush() == 1
+    assert buffer.stats()['pending'] == {'events': 0, 'notes': 1}
+
+
+class ForeignKeyWriter:
+    """Rejects every batch holding rows of a deleted user, like the users FK"""
+
+    def __init__(self, deleted_user):
+        self.deleted_user = deleted_user
+        self.written = []
+
+    def __call__(self, rows):
+        if any(row['user_id'] == self.deleted_user for row in rows):
+            raise psycopg.errors.ForeignKeyViolation('violates foreign key constraint "notes_user_id_fkey"')
+        self.written.extend(rows)
+        return len(rows)
+
+
+def test_rejected_rows_are_dropped_and_later_rows_still_flush(buffer):
+    buffer.writer = ForeignKeyWriter(deleted_user=9)
+    buffer._writers['notes'] = buffer.writer
+    buffer.record_notes(7, notes('a'))
+    buffer.record_notes(9, notes('revoked'))
+    buffer.record_notes(8, notes('b'))
+
+    assert buffer.flush() == 2
+    assert buffer.counters['rejected'] == 1
+    assert buffer.stats()['pending']['notes'] == 0
+
+    buffer.record_notes(7, notes('c'))
+    assert buffer.flush() == 1
+    assert [row['title'] for row in buffer.writer.written] == ['a', 'b', 'c']